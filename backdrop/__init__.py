@@ -1,4 +1,8 @@
 import os
+import random
+import time
+from collections import defaultdict
+
 import statsd as _statsd
 
 
@@ -23,6 +27,67 @@ class StatsClient(object):
         else:
             return getattr(self._statsd, item)
 
+    def aggregator(self, data_set='unknown'):
+        return StatsAggregator(self, data_set)
+
+
+class StatsAggregator(object):
+
+    """Accumulate counts and times in process and send each as a single
+    stat when flushed, rather than a packet for every call"""
+
+    def __init__(self, client, data_set='unknown'):
+        self._client = client
+        self._data_set = data_set
+        self._counts = defaultdict(int)
+        self._timings = defaultdict(float)
+
+    def incr(self, stat, count=1):
+        self._counts[stat] += count
+
+    def timing(self, stat, delta):
+        self._timings[stat] += delta
+
+    def timer(self, stat, rate=1):
+        """Time a block, adding the milliseconds it took to the total for
+        stat. With a rate below 1 only that fraction of blocks are timed,
+        and their times scaled up to estimate the total."""
+        return _AggregateTimer(self, stat, rate)
+
+    def flush(self):
+        for stat, count in self._counts.items():
+            self._client.incr(stat, count, data_set=self._data_set)
+        for stat, delta in self._timings.items():
+            self._client.timing(stat, int(delta), data_set=self._data_set)
+
+        self._counts.clear()
+        self._timings.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.flush()
+
+
+class _AggregateTimer(object):
+
+    def __init__(self, aggregator, stat, rate):
+        self._aggregator = aggregator
+        self._stat = stat
+        self._rate = rate
+        self._start = None
+
+    def __enter__(self):
+        if self._rate >= 1 or random.random() < self._rate:
+            self._start = time.time()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if self._start is not None:
+            self._aggregator.timing(
+                self._stat, (time.time() - self._start) * 1000 / self._rate)
+
 statsd = StatsClient(
     _statsd.StatsClient(prefix=os.getenv(
         "GOVUK_STATSD_PREFIX", "pp.apps.backdrop")))
@@ -1,6 +1,11 @@
+import os
+import shutil
+import uuid
 from os import getenv
 from functools import wraps
 
+from celery import Celery
+
 from flask import Flask, jsonify, url_for, request, \
     session, render_template, flash, redirect, abort
 
@@ -10,10 +15,12 @@ from backdrop.core.errors import ParseError, ValidationError
 from backdrop.core.storage.mongo import MongoStorageEngine
 from backdrop.core.flaskutils import DataSetConverter
 from backdrop.core.upload import create_parser
+from .batch_upload import UploadInterrupted, UploadSummary, post_batches
+from .clamd import ClamdError, ClamdScanner
+from .dedupe import ChangedRecords, is_repeat_upload, upload_fingerprint
 from .signonotron2 import Signonotron2
 from .uploaded_file import UploadedFile, FileUploadError
 from performanceplatform import client
-from requests.exceptions import RequestException
 
 GOVUK_ENV = getenv("GOVUK_ENV", "development")
 
@@ -38,7 +45,11 @@ admin_api = client.AdminAPI(
     dry_run=False,
 )
 
+celery_app = Celery(broker=app.config['TRANSFORMER_AMQP_URL'])
+
 DEFAULT_UPLOAD_FORMAT = 'csv'
+EXPECTED_UPLOAD_ERRORS = (FileUploadError, ParseError, ValidationError,
+                          ClamdError)
 
 
 # TODO: move this out into a helper
@@ -207,28 +218,193 @@ def upload(data_set_name):
 
 def _store_data(data_set_config):
     parse_file = create_parser(data_set_config)
+    if app.config['UPLOAD_ASYNC']:
+        return _queue_upload(data_set_config)
+
+    try:
+        with UploadedFile(request.files['file'],
+                          app.config['UPLOAD_MAX_FILE_SIZE'],
+                          get_virus_scanner()) as uploaded_file:
+            summary = post_upload(data_set_config, parse_file, uploaded_file)
+    except UploadInterrupted as e:
+        log_upload_error('Upload interrupted', app, e, data_set_config)
+        return render_template('upload_error.html',
+                               message=e.message,
+                               batches=UploadSummary(e.results).failed,
+                               data_set_name=data_set_config['name']), 400
+    except EXPECTED_UPLOAD_ERRORS as e:
+        log_upload_error('Upload error', app, e, data_set_config)
+        return render_template('upload_error.html',
+                               message=upload_error_message(e),
+                               data_set_name=data_set_config['name']), 400
+
+    if summary.failed:
+        app.logger.error(
+            'Error writing to backdrop: {} of {} batches failed'.format(
+                len(summary.failed), len(summary.results)),
+            extra={
+                'data_group': data_set_config['data_group'],
+                'data_type': data_set_config['data_type'],
+            })
+        return render_template('upload_error.html',
+                               message='Some of your data could not be saved',
+                               batches=summary.failed,
+                               data_set_name=data_set_config['name']), 500
+
+    return render_template('upload_ok.html', summary=summary)
+
+
+def post_upload(data_set_config, parse_file, uploaded_file, on_result=None):
+    """Parse, scan and post an uploaded file to the write API and return
+    an UploadSummary
+
+    With UPLOAD_SKIP_UNCHANGED set, a file that is the same as the last
+    one uploaded to the data set isn't processed at all, and records that
+    are already stored aren't posted again.
+    """
+    data_set_name = data_set_config['name']
+    skip_unchanged = app.config['UPLOAD_SKIP_UNCHANGED']
+
+    if skip_unchanged:
+        uploaded_file.validate(scan=False)
+        fingerprint = upload_fingerprint(uploaded_file.server_filename,
+                                         data_set_config)
+        if is_repeat_upload(storage, data_set_name, fingerprint):
+            statsd.incr('admin.upload.repeat', data_set=data_set_name)
+            return UploadSummary(repeat=True)
+
     data_set = client.DataSet.from_group_and_type(
         app.config['BACKDROP_URL'] + '/data',
         data_set_config['data_group'],
         data_set_config['data_type'],
         token=data_set_config.get('bearer_token', None)
     )
-    expected_errors = (FileUploadError, ParseError, ValidationError)
+    records = uploaded_file.parse(
+        parse_file,
+        app.config['UPLOAD_BATCH_SIZE'] * app.config['UPLOAD_WORKERS'])
+    if skip_unchanged:
+        records = ChangedRecords(storage, data_set_config, records,
+                                 app.config['UPLOAD_BATCH_SIZE'])
+
+    summary = UploadSummary(
+        post_batches(
+            data_set, records,
+            app.config['UPLOAD_BATCH_SIZE'],
+            workers=app.config['UPLOAD_WORKERS'],
+            retries=app.config['UPLOAD_RETRIES'],
+            retry_delay=app.config['UPLOAD_RETRY_DELAY'],
+            data_set_name=data_set_name,
+            on_result=on_result),
+        unchanged=getattr(records, 'unchanged', 0))
+
+    if skip_unchanged:
+        statsd.incr('admin.upload.unchanged_records', summary.unchanged,
+                    data_set=data_set_name)
+        if not summary.failed:
+            storage.set_upload_fingerprint(data_set_name, fingerprint)
+
+    return summary
+
+
+def _queue_upload(data_set_config):
+    """Save an upload for backdrop.admin.tasks to process and redirect to
+    the page showing its progress. Files that are empty, too big or of the
+    wrong type are rejected straight away."""
+    job_id = uuid.uuid4().hex
+    directory = os.path.join(app.config['UPLOAD_JOB_DIR'], job_id)
+    os.makedirs(directory)
 
     try:
-        with UploadedFile(request.files['file']) as uploaded_file:
-            raw_data = parse_file(uploaded_file.file_stream())
-            data_set.post(raw_data)
-    except expected_errors as e:
+        uploaded_file = UploadedFile(request.files['file'],
+                                     app.config['UPLOAD_MAX_FILE_SIZE'],
+                                     directory=directory)
+        uploaded_file.validate(scan=False)
+    except FileUploadError as e:
+        shutil.rmtree(directory, ignore_errors=True)
         log_upload_error('Upload error', app, e, data_set_config)
         return render_template('upload_error.html',
                                message=e.message,
                                data_set_name=data_set_config['name']), 400
-    except RequestException as e:
-        log_upload_error('Error writing to backdrop', app, e, data_set_config)
-        abort(500, 'Error saving to datastore: "{}"'.format(e.message))
 
-    return render_template('upload_ok.html')
+    storage.create_job(job_id, {
+        'type': 'upload',
+        'data_set': data_set_config['name'],
+        'user': session['user']['email'],
+        'filename': request.files['file'].filename,
+        'path': uploaded_file.server_filename,
+        'state': 'queued',
+        'records': 0,
+        'batches': 0,
+        'failed_batches': 0,
+        'unchanged': 0,
+        'repeat': False,
+        'errors': [],
+        'message': None,
+    })
+    celery_app.send_task('backdrop.admin.tasks.process_upload',
+                         args=(job_id,),
+                         queue=app.config['UPLOAD_QUEUE'])
+
+    return redirect(url_for('upload_job',
+                            data_set_name=data_set_config['name'],
+                            job_id=job_id), 303)
+
+
+@app.route('/<data_set:data_set_name>/upload/<job_id>', methods=['GET'])
+@protected
+@cache_control.nocache
+def upload_job(data_set_name, job_id):
+    return render_template('upload_job.html',
+                           job=_get_upload_job(data_set_name, job_id),
+                           data_set_name=data_set_name)
+
+
+@app.route('/<data_set:data_set_name>/upload/<job_id>.json',
+           methods=['GET'])
+@protected
+@cache_control.nocache
+def upload_job_status(data_set_name, job_id):
+    job = _get_upload_job(data_set_name, job_id)
+
+    return jsonify(status='ok',
+                   job_id=job_id,
+                   state=job['state'],
+                   finished=job['state'] in ('done', 'failed'),
+                   records=job['records'],
+                   batches=job['batches'],
+                   failed_batches=job['failed_batches'],
+                   unchanged=job.get('unchanged', 0),
+                   repeat=job.get('repeat', False),
+                   errors=job['errors'],
+                   message=job['message'])
+
+
+def _get_upload_job(data_set_name, job_id):
+    user_config = admin_api.get_user(session.get("user").get("email"))
+    if data_set_name not in user_config['data_sets']:
+        abort(404)
+
+    job = storage.get_job(job_id)
+    if job is None or job['type'] != 'upload' \
+            or job['data_set'] != data_set_name:
+        abort(404)
+
+    return job
+
+
+def get_virus_scanner():
+    if app.config.get('CLAMD_ADDRESS'):
+        return ClamdScanner(app.config['CLAMD_ADDRESS'],
+                            app.config['CLAMD_TIMEOUT'])
+    return None
+
+
+def upload_error_message(e):
+    """The message to show for one of the EXPECTED_UPLOAD_ERRORS"""
+    if isinstance(e, ClamdError):
+        # Says where clamd is and why it failed, which is no use to users
+        return 'Virus scanning is unavailable, try again later'
+    return e.message
 
 
 def log_upload_error(message, app, e, data_set_config):
@@ -0,0 +1,178 @@
+"""
+Posting uploaded records to the write API.
+
+Records are read from the upload in batches, which a pool of threads posts
+to the write API while the rest of the file is parsed. Only a few batches
+are held in memory at once however large the file. Batches that fail for a
+reason that might pass are retried, and the outcome of every batch is
+reported back so the admin UI can say which records were not stored.
+
+Batches are posted in no particular order, so records in a file that share
+an _id may be stored in any order.
+"""
+import logging
+import sys
+import threading
+import time
+from Queue import Queue
+
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+from backdrop import statsd
+from backdrop.core.upload.utils import batches
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchResult(object):
+
+    def __init__(self, number, first_record, size):
+        self.number = number
+        self.first_record = first_record
+        self.size = size
+        self.attempts = 0
+        self.error = None
+
+    @property
+    def last_record(self):
+        return self.first_record + self.size - 1
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class UploadSummary(object):
+
+    def __init__(self, results=(), unchanged=0, repeat=False):
+        self.results = list(results)
+        self.unchanged = unchanged
+        self.repeat = repeat
+
+    @property
+    def records(self):
+        return sum(result.size for result in self.results if result.ok)
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.ok]
+
+
+class UploadInterrupted(Exception):
+
+    """Raised when reading records fails part way through an upload, once
+    the batches read before the failure have been posted. results are the
+    BatchResults of those batches, so the records that were saved can be
+    reported along with the error."""
+
+    def __init__(self, error, results):
+        self.error = error
+        self.results = results
+        self.message = _interrupted_message(error, results)
+        super(UploadInterrupted, self).__init__(self.message)
+
+
+def _interrupted_message(error, results):
+    failed = any(not result.ok for result in results)
+    return 'Only part of your data was saved: records 1 to {}{} were ' \
+        'saved and the rest were not. {}'.format(
+            results[-1].last_record,
+            ', apart from the batches listed,' if failed else '',
+            getattr(error, 'message', None) or _describe(error))
+
+
+def post_batches(data_set, records, batch_size, workers=1, retries=0,
+                 retry_delay=1, data_set_name='unknown', on_result=None):
+    """Post records to data_set in batches from a pool of threads and
+    return a BatchResult for each batch, in order.
+
+    on_result is called with the BatchResult of each batch as it finishes,
+    from the thread that posted it.
+
+    Errors raised while reading records stop the upload. Once the batches
+    already read have been posted they are raised as UploadInterrupted, or
+    as they are if no batch had been read.
+    """
+    jobs = Queue(maxsize=workers)
+    results = []
+    interrupted = None
+
+    def work():
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            result, batch = job
+            _post_batch(data_set, batch, result, retries, retry_delay,
+                        data_set_name)
+            if on_result is not None:
+                try:
+                    on_result(result)
+                except Exception:
+                    # The batch has been posted, and this thread is still
+                    # needed to post the rest
+                    logger.exception('Error reporting batch {}'.format(
+                        result.number))
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        first_record = 1
+        for number, batch in enumerate(batches(records, batch_size), 1):
+            result = BatchResult(number, first_record, len(batch))
+            results.append(result)
+            jobs.put((result, batch))
+            first_record += len(batch)
+    except Exception:
+        if not results:
+            raise
+        interrupted = sys.exc_info()
+    finally:
+        for _ in threads:
+            jobs.put(None)
+        for thread in threads:
+            thread.join()
+
+    if interrupted is not None:
+        error_type, error, traceback = interrupted
+        raise UploadInterrupted(error, results), None, traceback
+
+    return results
+
+
+def _post_batch(data_set, batch, result, retries, retry_delay,
+                data_set_name):
+    while True:
+        result.attempts += 1
+        try:
+            data_set.post(batch)
+            return
+        except Exception as e:
+            if result.attempts > retries or not _is_retryable(e):
+                result.error = _describe(e)
+                statsd.incr('admin.upload.batch.failed',
+                            data_set=data_set_name)
+                logger.error('Batch {} of upload to {} failed: {}'.format(
+                    result.number, data_set_name, result.error))
+                return
+
+        statsd.incr('admin.upload.batch.retried', data_set=data_set_name)
+        time.sleep(retry_delay * 2 ** (result.attempts - 1))
+
+
+def _is_retryable(error):
+    """Connection problems and server errors may pass, client errors such
+    as records failing validation won't."""
+    if isinstance(error, (ConnectionError, Timeout)):
+        return True
+    if isinstance(error, HTTPError) and error.response is not None:
+        return error.response.status_code >= 500
+    return False
+
+
+def _describe(error):
+    return str(error) or type(error).__name__
@@ -0,0 +1,138 @@
+"""
+Client for the clamd virus scanning daemon.
+
+Files are streamed to clamd over its socket with the INSTREAM command
+rather than copied somewhere clamd can read them and scanned by a separate
+clamdscan process. clamd rejects streams longer than its StreamMaxLength
+setting, which needs to be at least the largest upload allowed.
+"""
+import socket
+import struct
+import threading
+
+
+class ClamdError(Exception):
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class ClamdScanner(object):
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, address, timeout=60):
+        """address is the path of clamd's unix socket or host:port for a
+        TCP socket"""
+        self.address = address
+        self.timeout = timeout
+
+    def scan(self, stream):
+        """Return the name of the signature clamd finds in stream, or None
+        if the stream is clean"""
+        try:
+            sock = self._connect()
+        except socket.error as e:
+            raise ClamdError('Could not connect to clamd at {}: {}'.format(
+                self.address, e))
+
+        try:
+            sock.sendall('zINSTREAM\0')
+            try:
+                self._send_chunks(sock, stream)
+            except socket.error:
+                # clamd hangs up on streams that are too long, but still
+                # says why
+                pass
+            return _parse_reply(_read_reply(sock))
+        except socket.error as e:
+            raise ClamdError('Error talking to clamd at {}: {}'.format(
+                self.address, e))
+        finally:
+            sock.close()
+
+    def _connect(self):
+        if ':' in self.address:
+            host, port = self.address.rsplit(':', 1)
+            return socket.create_connection((host, int(port)), self.timeout)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.address)
+        except socket.error:
+            sock.close()
+            raise
+        return sock
+
+    def _send_chunks(self, sock, stream):
+        while True:
+            chunk = stream.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            sock.sendall(struct.pack('!L', len(chunk)) + chunk)
+        sock.sendall(struct.pack('!L', 0))
+
+
+class BackgroundScan(object):
+
+    """Scan a file in a thread, so it can be parsed at the same time"""
+
+    def __init__(self, scanner, path):
+        self._signature = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run,
+                                        args=(scanner, path))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, scanner, path):
+        try:
+            with open(path) as stream:
+                self._signature = scanner.scan(stream)
+        except Exception as e:
+            self._error = e
+
+    @property
+    def done(self):
+        return not self._thread.is_alive()
+
+    def result(self):
+        """Wait for the scan to finish and return the name of the signature
+        found, if any"""
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._signature
+
+
+def _read_reply(sock):
+    reply = ''
+    while not reply.endswith('\0'):
+        data = sock.recv(4096)
+        if not data:
+            break
+        reply += data
+    return reply.rstrip('\0')
+
+
+def _parse_reply(reply):
+    """
+    >>> _parse_reply('stream: OK') is None
+    True
+    >>> _parse_reply('stream: Eicar-Test-Signature FOUND')
+    'Eicar-Test-Signature'
+    >>> _parse_reply('INSTREAM size limit exceeded. ERROR')
+    Traceback (most recent call last):
+    ...
+    ClamdError: clamd could not scan the file: INSTREAM size limit exceeded.
+    """
+    if reply.endswith(' FOUND'):
+        return reply.split(': ', 1)[-1][:-len(' FOUND')]
+    if reply.endswith(': OK'):
+        return None
+    raise ClamdError('clamd could not scan the file: {}'.format(
+        reply[:-len(' ERROR')] if reply.endswith(' ERROR') else reply))
@@ -11,4 +11,17 @@ MONGO_PORT = 27017
 from test_environment import *
 
 from development import (STAGECRAFT_URL, STAGECRAFT_DATA_SET_QUERY_TOKEN,
-                         BACKDROP_URL, SIGNON_API_USER_TOKEN)
+                         BACKDROP_URL, SIGNON_API_USER_TOKEN,
+                         UPLOAD_BATCH_SIZE, UPLOAD_WORKERS, UPLOAD_RETRIES,
+                         CLAMD_TIMEOUT, UPLOAD_JOB_DIR, UPLOAD_QUEUE)
+
+# Tests start a fake clamd on a socket of their own
+CLAMD_ADDRESS = None
+
+UPLOAD_RETRY_DELAY = 0
+# Small enough for the file too large feature to write quickly
+UPLOAD_MAX_FILE_SIZE = 1000000
+
+UPLOAD_ASYNC = False
+UPLOAD_SKIP_UNCHANGED = False
+TRANSFORMER_AMQP_URL = 'memory://'
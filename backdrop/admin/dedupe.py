@@ -0,0 +1,74 @@
+"""
+Skipping the work of uploading the same data again.
+
+An upload's fingerprint is a hash of the file and of the data set config
+that decides how it is parsed. When it matches the last upload to the data
+set, and nothing has been written to the data set since, the upload is
+skipped altogether. Otherwise records already stored with the same _id and
+the same values are not posted again.
+"""
+import hashlib
+import json
+
+from backdrop.core.records import content_hash, record_id
+from backdrop.core.upload.utils import batches
+
+CHUNK_SIZE = 64 * 1024
+
+
+def upload_fingerprint(path, data_set_config):
+    fingerprint = hashlib.sha1(json.dumps([
+        data_set_config['name'],
+        data_set_config.get('upload_format'),
+        data_set_config.get('upload_filters'),
+        data_set_config.get('schema'),
+        data_set_config.get('auto_ids'),
+    ], sort_keys=True))
+
+    with open(path, 'rb') as stream:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), ''):
+            fingerprint.update(chunk)
+
+    return fingerprint.hexdigest()
+
+
+def is_repeat_upload(storage, data_set_name, fingerprint):
+    """Whether an upload is the same as the last one to the data set, and
+    the data set hasn't changed since"""
+    last_upload = storage.get_upload_fingerprint(data_set_name)
+    if last_upload is None or last_upload['fingerprint'] != fingerprint:
+        return False
+
+    last_updated = storage.get_last_updated(data_set_name)
+    return last_updated is not None \
+        and last_updated <= last_upload['uploaded_at']
+
+
+class ChangedRecords(object):
+
+    """Iterate over the records that aren't already stored with the same
+    values, looking stored records up batch_size at a time. Only the keys
+    of the uploaded record are compared, as stored records have more."""
+
+    def __init__(self, storage, data_set_config, records, batch_size):
+        self._storage = storage
+        self._data_set_config = data_set_config
+        self._records = records
+        self._batch_size = batch_size
+        self.unchanged = 0
+
+    def __iter__(self):
+        auto_ids = self._data_set_config.get('auto_ids')
+
+        for batch in batches(self._records, self._batch_size):
+            ids = [record_id(record, auto_ids) for record in batch]
+            known_ids = [_id for _id in ids if _id is not None]
+            stored = self._storage.find_records(
+                self._data_set_config['name'], known_ids) if known_ids else {}
+
+            for _id, record in zip(ids, batch):
+                if _id in stored and content_hash(record) == content_hash(
+                        stored[_id], record.keys()):
+                    self.unchanged += 1
+                else:
+                    yield record
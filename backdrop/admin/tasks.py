@@ -0,0 +1,92 @@
+"""
+Background processing of uploads.
+
+When UPLOAD_ASYNC is set the admin app saves each upload to UPLOAD_JOB_DIR
+and queues a job on UPLOAD_QUEUE of the transformer broker, so files are
+scanned, parsed and posted outside the web request. The job records its
+progress as each batch is posted, for the upload job pages to show.
+
+Workers for the queue need to read the saved files, so run on the admin
+hosts:
+
+    celery -A backdrop.admin.tasks worker -Q admin.uploads
+"""
+import os
+import shutil
+
+from celery import Celery
+
+from backdrop.core.upload import create_parser
+
+from .app import (app as admin_app, admin_api, storage, post_upload,
+                  get_virus_scanner, log_upload_error, upload_error_message,
+                  EXPECTED_UPLOAD_ERRORS)
+from .batch_upload import UploadInterrupted
+from .uploaded_file import UploadedFile
+
+
+app = Celery('uploads', broker=admin_app.config['TRANSFORMER_AMQP_URL'])
+app.conf.update(CELERY_DEFAULT_QUEUE=admin_app.config['UPLOAD_QUEUE'])
+
+
+@app.task(ignore_result=True)
+def process_upload(job_id):
+    job = storage.get_job(job_id)
+    if job is None:
+        # Expired, or already processed and redelivered
+        admin_app.logger.warning('Upload job {} not found'.format(job_id))
+        return
+    storage.update_job(job_id, state='running')
+
+    def record_batch(result):
+        if result.ok:
+            storage.update_job(
+                job_id, increment={'batches': 1, 'records': result.size})
+        else:
+            storage.update_job(
+                job_id,
+                increment={'batches': 1, 'failed_batches': 1},
+                append={'errors': {
+                    'batch': result.number,
+                    'first_record': result.first_record,
+                    'last_record': result.last_record,
+                    'attempts': result.attempts,
+                    'message': result.error,
+                }})
+
+    data_set_config = None
+    try:
+        data_set_config = admin_api.get_data_set_by_name(job['data_set'])
+        parse_file = create_parser(data_set_config)
+        with UploadedFile.from_saved(
+                job['path'], job['filename'],
+                max_file_size=admin_app.config['UPLOAD_MAX_FILE_SIZE'],
+                scanner=get_virus_scanner()) as uploaded_file:
+            summary = post_upload(data_set_config, parse_file, uploaded_file,
+                                  on_result=record_batch)
+    except UploadInterrupted as e:
+        # The batches posted before the error are counted in the job
+        log_upload_error('Upload interrupted', admin_app, e, data_set_config)
+        storage.update_job(job_id, state='failed', message=e.message)
+        return
+    except EXPECTED_UPLOAD_ERRORS as e:
+        log_upload_error('Upload error', admin_app, e, data_set_config)
+        storage.update_job(job_id, state='failed',
+                           message=upload_error_message(e))
+        return
+    except Exception as e:
+        admin_app.logger.exception(e)
+        storage.update_job(job_id, state='failed',
+                           message='The upload could not be processed')
+        return
+    finally:
+        shutil.rmtree(os.path.dirname(job['path']), ignore_errors=True)
+
+    if summary.failed:
+        storage.update_job(job_id, state='failed',
+                           unchanged=summary.unchanged,
+                           message='Some of your data could not be saved')
+    else:
+        storage.update_job(job_id, state='done',
+                           unchanged=summary.unchanged,
+                           repeat=summary.repeat)
@@ -1,8 +1,11 @@
+from .clamd import BackgroundScan
 from .scanned_file import ScannedFile, VirusSignatureError
 from backdrop import statsd
 
+import itertools
 import mimetypes
 import os
+from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 
 
@@ -17,37 +20,101 @@ def _size_of_file_on_disk(filename):
 
 
 class UploadedFile(object):
-    # This is ~ 1mb in octets
-    MAX_FILE_SIZE = 1000000  # exclusive, so anything >= to this is invalid
-
-    def __init__(self, file_storage):
-        self.server_filename = os.path.join(
-            'tmp',
-            secure_filename(file_storage.filename))
+    # This is ~ 50mb in octets
+    MAX_FILE_SIZE = 50000000  # exclusive, so anything >= to this is invalid
+
+    def __init__(self, file_storage, max_file_size=None, scanner=None,
+                 directory='tmp', server_filename=None):
+        """scanner streams the file to a virus scanner, without it the file
+        is scanned by clamdscan. The file is saved in directory unless
+        server_filename says where it has already been saved."""
+        self.max_file_size = max_file_size or self.MAX_FILE_SIZE
+        self._scanner = scanner
+        self._scan = None
+        # Files opened here, closed before the file is removed
+        self._opened = []
         self.file_storage = file_storage
-        try:
-            self.file_storage.save(self.server_filename)
-        except IOError as e:
-            raise FileUploadError(e.message)
+        if server_filename is None:
+            self.server_filename = os.path.join(
+                directory,
+                secure_filename(file_storage.filename))
+            try:
+                self.file_storage.save(self.server_filename)
+            except IOError as e:
+                raise FileUploadError(e.message)
+        else:
+            self.server_filename = server_filename
         # we don't trust the browser's content_length or content_type
         self.file_size = _size_of_file_on_disk(self.server_filename)
         self.guessed_mimetype, _ = mimetypes.guess_type(self.server_filename)
 
+    @classmethod
+    def from_saved(cls, server_filename, filename, **kwargs):
+        """Open a file saved by an earlier UploadedFile, such as one being
+        processed in the background"""
+        stream = open(server_filename)
+        try:
+            uploaded_file = cls(FileStorage(stream, filename=filename),
+                                server_filename=server_filename, **kwargs)
+        except Exception:
+            stream.close()
+            raise
+        uploaded_file._opened.append(stream)
+        return uploaded_file
+
     def __enter__(self):
         return self
 
     def __exit__(self, type, value, traceback):
+        for opened in self._opened:
+            opened.close()
         os.remove(self.server_filename)
 
+    def _open(self):
+        opened = open(self.server_filename)
+        self._opened.append(opened)
+        return opened
+
     def file_stream(self):
         self.validate()
         return open(self.server_filename)
 
+    def parse(self, parse_file, buffer_size=0):
+        """Return the records parse_file reads from the file once it has
+        been checked
+
+        The file is parsed while it is being scanned, holding on to up to
+        buffer_size records until the scan is finished, so that no record
+        is returned from a file that may contain a virus.
+        """
+        self.validate(scan=False)
+        self._start_scan()
+        records = iter(parse_file(self._open()))
+        buffered = []
+        while len(buffered) < buffer_size and not self._scan_done():
+            try:
+                buffered.append(next(records))
+            except StopIteration:
+                break
+
+        if self._is_potential_virus():
+            raise self._error(['file may contain a virus'])
+
+        return itertools.chain(buffered, records)
+
+    def _start_scan(self):
+        if self._scanner is not None and self._scan is None \
+                and not os.getenv('SKIP_VIRUS_SCAN'):
+            self._scan = BackgroundScan(self._scanner, self.server_filename)
+
+    def _scan_done(self):
+        return self._scan is None or self._scan.done
+
     def _is_empty(self):
         return self.file_size == 0
 
     def _is_too_big(self):
-        return self.file_size >= self.MAX_FILE_SIZE
+        return self.file_size >= self.max_file_size
 
     def _is_strange_content_type(self):
         return self.guessed_mimetype not in [
@@ -63,9 +130,13 @@ class UploadedFile(object):
         if os.getenv('SKIP_VIRUS_SCAN'):
             return False
 
-        return ScannedFile(self.file_storage).has_virus_signature
+        if self._scanner is None:
+            return ScannedFile(self.file_storage).has_virus_signature
+
+        self._start_scan()
+        return self._scan.result() is not None
 
-    def validate(self):
+    def _problems(self, scan=True):
         problems = []
         if self._is_empty():
             problems += ['file is empty']
@@ -74,12 +145,19 @@ class UploadedFile(object):
         if self._is_strange_content_type():
             problems += ['strange content type of {}'.format(
                 self.guessed_mimetype)]
-        if self._is_potential_virus():
+        if scan and self._is_potential_virus():
             problems += ['file may contain a virus']
+        return problems
+
+    def _error(self, problems):
+        return FileUploadError('Invalid file upload {0} - {1}'.format(
+            self.file_storage.filename,
+            ' and '.join(problems)))
+
+    def validate(self, scan=True):
+        problems = self._problems(scan)
         if problems:
-            raise FileUploadError('Invalid file upload {0} - {1}'.format(
-                self.file_storage.filename,
-                ' and '.join(problems)))
+            raise self._error(problems)
 
     @property
     def valid(self):
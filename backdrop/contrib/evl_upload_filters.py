@@ -1,8 +1,64 @@
-from datetime import datetime
-import itertools
-from backdrop.contrib.evl_volumetrics import remove_summary_columns, \
-    extract_transaction_rows, create_transaction_data
-from backdrop.core.timeutils import parse_time_as_utc, as_utc
+from backdrop.contrib.evl_volumetrics import TRANSACTIONS, transaction_data
+from backdrop.core.timeutils import parse_time_as_utc
+from backdrop.core.upload.extraction import (SheetTemplate, RowRecords,
+                                             ColumnRecords, Melt, nth_sheet)
+
+
+CEG_VOLUMES = SheetTemplate(
+    records=ColumnRecords(first_column=3, rows={
+        "date": 3,
+        "relicensing_web": 5,
+        "relicensing_ivr": 6,
+        "relicensing_agent": 9,
+        "sorn_web": 11,
+        "sorn_ivr": 12,
+        "sorn_agent": 13,
+        "agent_automated_dupes": 15,
+        "calls_answered_by_advisor": 17,
+    }))
+
+SERVICE_VOLUMETRICS = SheetTemplate(cells={
+    "timestamp": (2, 1),
+    "successful_tax_disc": (24, 2),
+    "successful_sorn": (25, 2),
+})
+
+SERVICE_FAILURES = SheetTemplate(
+    cells={"timestamp": (1, 1)},
+    records=RowRecords(
+        first_row=6,
+        columns={"description": 0, "reason": 1},
+        until=lambda record: record["description"] is None),
+    melt=Melt({"tax-disc": 2, "sorn": 4}, "type", "count"))
+
+CHANNEL_VOLUMETRICS = SheetTemplate(
+    records=ColumnRecords(
+        first_column=1,
+        last_column=7,
+        rows={
+            "date": 1,
+            "successful_agent": 2,
+            "successful_ivr": 3,
+            "successful_web": 4,
+            "successful_all": 5,
+            "total_agent": 6,
+            "total_ivr": 7,
+            "total_web": 8,
+        },
+        until=lambda record: record["successful_all"] == 0))
+
+CUSTOMER_SATISFACTION = SheetTemplate(
+    records=RowRecords(
+        first_row=4,
+        columns={"date": 0, "tax_disc": 1, "sorn": 2},
+        until=lambda record: _date_or_none(record["date"]) is None))
+
+
+def _date_or_none(string):
+    try:
+        return parse_time_as_utc(string)
+    except (TypeError, ValueError):
+        return None
 
 
 def ceg_volumes(rows):
@@ -12,62 +68,29 @@ def ceg_volumes(rows):
 
     http://goo.gl/52VcMe
     """
-    RELICENSING_WEB_INDEX = 5
-    RELICENSING_IVR_INDEX = 6
-    RELICENSING_AGENT_INDEX = 9
-    SORN_WEB_INDEX = 11
-    SORN_IVR_INDEX = 12
-    SORN_AGENT_INDEX = 13
-    AGENT_AUTOMATED_DUPES_INDEX = 15
-    CALLS_ANSWERED_BY_ADVISOR_INDEX = 17
-
     ceg_keys = [
         "_timestamp", "_id", "timeSpan", "relicensing_web", "relicensing_ivr",
         "relicensing_agent", "sorn_web", "sorn_ivr", "sorn_agent",
         "agent_automated_dupes", "calls_answered_by_advisor"
     ]
 
-    def ceg_rows(rows):
-        rows = list(rows)
-        for column in itertools.count(3):
-            date = ceg_date(rows, column)
-            if not isinstance(date, datetime):
-                return
-            yield [
-                date.isoformat(), date.date().isoformat(), "month",
-                rows[RELICENSING_WEB_INDEX][column],
-                rows[RELICENSING_IVR_INDEX][column],
-                rows[RELICENSING_AGENT_INDEX][column],
-                rows[SORN_WEB_INDEX][column],
-                rows[SORN_IVR_INDEX][column],
-                rows[SORN_AGENT_INDEX][column],
-                rows[AGENT_AUTOMATED_DUPES_INDEX][column],
-                rows[CALLS_ANSWERED_BY_ADVISOR_INDEX][column],
-            ]
-
-    def ceg_date(rows, column):
-        try:
-            return parse_time_as_utc(rows[3][column])
-        except IndexError:
-            return None
-
     yield ceg_keys
 
-    for row in ceg_rows(rows):
-        yield row
+    for record in CEG_VOLUMES.extract(rows):
+        date = parse_time_as_utc(record["date"])
+        yield [date.isoformat(), date.date().isoformat(), "month"] + \
+            [record[key] for key in ceg_keys[3:]]
 
 
 def service_volumetrics(rows):
-    rows = list(rows)
     yield ["_timestamp", "_id", "timeSpan", "successful_tax_disc",
            "successful_sorn"]
 
-    timestamp = rows[2][1]
-    taxDiskApplications = rows[24][2]
-    sornApplications = rows[25][2]
-
-    yield [timestamp, parse_time_as_utc(timestamp).date().isoformat(), "day",
-           taxDiskApplications, sornApplications]
+    for record in SERVICE_VOLUMETRICS.extract(rows):
+        timestamp = record["timestamp"]
+        yield [timestamp, parse_time_as_utc(timestamp).date().isoformat(),
+               "day", record["successful_tax_disc"],
+               record["successful_sorn"]]
 
 
 def _to_int(value, value_if_empty=0):
@@ -98,87 +121,40 @@ def _to_int(value, value_if_empty=0):
 
 
 def service_failures(sheets):
-    rows = list(list(sheets)[1])
-    timestamp = rows[1][1]
-
     yield ["_timestamp", "_id", "type", "reason", "count", "description"]
 
-    def failure(service_type, reason, failures, description, timestamp):
+    for record in SERVICE_FAILURES.extract(nth_sheet(sheets, 1)):
+        timestamp = record["timestamp"]
         date = parse_time_as_utc(timestamp).date()
-        id = "%s.%s.%s" % (date.isoformat(), service_type, reason)
-        return [timestamp, id, service_type, reason, failures, description]
-
-    for row in rows[6:]:
-        description = row[0]
-        if description is None:
-            return
-
-        reason_code = int(row[1])
-        tax_disc_failures = _to_int(row[2], value_if_empty=0)
-        sorn_failures = _to_int(row[4], value_if_empty=0)
-
-        yield failure("tax-disc", reason_code, tax_disc_failures, description,
-                      timestamp)
-        yield failure("sorn", reason_code, sorn_failures, description,
-                      timestamp)
+        reason = int(record["reason"])
+        id = "%s.%s.%s" % (date.isoformat(), record["type"], reason)
+        yield [timestamp, id, record["type"], reason,
+               _to_int(record["count"], value_if_empty=0),
+               record["description"]]
 
 
 def channel_volumetrics(rows):
-    rows = list(rows)
-    yield ["_timestamp", "_id",
-           "successful_agent", "successful_ivr", "successful_web",
-           "total_agent", "total_ivr", "total_web"]
-
-    for column in range(1, 8):
-        all = rows[5][column]
+    keys = ["successful_agent", "successful_ivr", "successful_web",
+            "total_agent", "total_ivr", "total_web"]
+    yield ["_timestamp", "_id"] + keys
 
-        if all == 0:
-            return
-
-        date = rows[1][column]
-
-        agent_successful = rows[2][column]
-        ivr_successful = rows[3][column]
-        web_successful = rows[4][column]
-
-        agent_total = rows[6][column]
-        ivr_total = rows[7][column]
-        web_total = rows[8][column]
-
-        yield [date, parse_time_as_utc(date).date().isoformat(),
-               agent_successful, ivr_successful, web_successful,
-               agent_total, ivr_total, web_total]
+    for record in CHANNEL_VOLUMETRICS.extract(rows):
+        date = record["date"]
+        yield [date, parse_time_as_utc(date).date().isoformat()] + \
+            [record[key] for key in keys]
 
 
 def customer_satisfaction(rows):
-    rows = list(rows)
     yield ["_timestamp", "_id", "satisfaction_tax_disc", "satisfaction_sorn"]
 
-    def date_or_none(string):
-        try:
-            return parse_time_as_utc(string)
-        except (TypeError, ValueError):
-            return None
-
-    for row_number in itertools.count(4):
-        row = rows[row_number]
-        date_string, tax_disc_satisfaction, sorn_satisfaction = row
-        date = date_or_none(date_string)
-
-        if date is None:
-            return
-        else:
-            yield [date.isoformat(), date.date().isoformat(),
-                   tax_disc_satisfaction, sorn_satisfaction]
+    for record in CUSTOMER_SATISFACTION.extract(rows):
+        date = parse_time_as_utc(record["date"])
+        yield [date.isoformat(), date.date().isoformat(),
+               record["tax_disc"], record["sorn"]]
 
 
 def volumetrics(sheets):
-    sheet = list(list(sheets)[2])
-
     yield ["_timestamp", "service", "channel", "transaction", "volume"]
 
-    header, rows = extract_transaction_rows(remove_summary_columns(sheet))
-
-    for row in rows:
-        for data in create_transaction_data(header, row):
-            yield data
+    for record in TRANSACTIONS.extract(nth_sheet(sheets, 2)):
+        yield transaction_data(record)
@@ -3,6 +3,7 @@ from .records import add_auto_ids, parse_timestamps, validate_record,\
     add_period_keys
 from .validation import validate_record_schema
 from .nested_merge import nested_merge, flat_merge
+from .deadline import Deadline
 from .errors import InvalidSortError
 from backdrop.core.response import (FlatData, GroupedData, PeriodData,
                                     PeriodGroupedData, PeriodFlatData,
@@ -23,6 +24,7 @@ class DataSet(object):
         self.config = config
 
         self._last_updated = None
+        self._last_updated_given = False
 
     @property
     def name(self):
@@ -38,11 +40,15 @@ class DataSet(object):
                                DEFAULT_MAX_AGE_EXPECTED)
 
     def get_last_updated(self):
-        if self._last_updated is not None:
-            return self._last_updated
-        else:
+        if self._last_updated is None and not self._last_updated_given:
             self._last_updated = self.storage.get_last_updated(self.name)
-            return self._last_updated
+        return self._last_updated
+
+    def set_last_updated(self, last_updated):
+        """Set when the data set was last updated, when that has been
+        looked up along with other data sets"""
+        self._last_updated = last_updated
+        self._last_updated_given = True
 
     def get_seconds_out_of_date(self):
         now = timeutils.now()
@@ -107,25 +113,38 @@ class DataSet(object):
             # Add period data
             records = map(add_period_keys, records)
 
-            for record in records:
-                self.storage.save_record(self.name, record)
+            self.storage.save_records(self.name, records)
             # errors should be empty
             return errors
 
-    def execute_query(self, query):
-        results = self.storage.execute_query(self.name, query)
+    def get_query_time_limit(self, default=None):
+        return self.config.get('query_time_limit', default)
 
-        data = build_data(results, query)
+    def execute_query(self, query, time_limit=None, primary=False):
+        """Run a query, raising QueryTimeoutError if answering it takes
+        longer than the data set's query time limit, or time_limit if it
+        doesn't have one. primary reads from the replica set primary."""
+        return self._execute_query(
+            query, Deadline(self.get_query_time_limit(time_limit)), primary)
+
+    def _execute_query(self, query, deadline, primary=False):
+        results = self.storage.execute_query(
+            self.name, query, deadline, primary=primary)
+
+        data = build_data(results, query, deadline)
 
         if query.delta:
             shift = data.amount_to_shift(query.delta)
             if shift != 0:
-                return self.execute_query(query.get_shifted_query(shift))
+                return self._execute_query(
+                    query.get_shifted_query(shift), deadline, primary)
 
         return data.data()
 
 
-def build_data(results, query):
+def build_data(results, query, deadline=None):
+    deadline = deadline or Deadline()
+
     if not query.is_grouped:
         # TODO: strip internal fields
         return SimpleData(results)
@@ -142,14 +161,17 @@ def build_data(results, query):
         period_presenter = PeriodData
 
     results = merge_fn(query.group_keys, query.collect, results)
+    deadline.check()
     results = _sort_grouped_results(results, query.sort_by)
     results = _limit_grouped_results(results, query.limit)
+    deadline.check()
 
     if query.group_by and query.period:
         data = group_period_presenter(results, period=query.period)
         if query.start_at and query.end_at:
             data.fill_missing_periods(
                 query.start_at, query.end_at, collect=query.collect, group_by=query.group_by)
+            deadline.check()
         return data
     elif query.group_by:
         return group_presenter(results)
@@ -158,6 +180,7 @@ def build_data(results, query):
         if query.start_at and query.end_at:
             data.fill_missing_periods(
                 query.start_at, query.end_at, collect=query.collect)
+            deadline.check()
         return data
     else:
         raise AssertionError("A query claiming to be a grouped query was not.")
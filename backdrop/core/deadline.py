@@ -0,0 +1,40 @@
+"""
+Time limits for work done to answer a request.
+
+A query can be slow in the database and then again in Python while its
+results are merged, sorted and have missing periods filled in. A Deadline
+is started once for the whole query: the time left is given to the
+database as maxTimeMS and checked between each step afterwards.
+"""
+import time
+
+from .errors import QueryTimeoutError
+
+
+class Deadline(object):
+
+    def __init__(self, seconds=None):
+        """Without seconds there is no time limit"""
+        self.seconds = seconds
+        self._expires_at = None
+        if seconds:
+            self._expires_at = time.time() + seconds
+
+    def remaining_ms(self):
+        """Return the milliseconds left, or None without a time limit
+
+        >>> Deadline().remaining_ms() is None
+        True
+        >>> 0 < Deadline(2).remaining_ms() <= 2000
+        True
+        """
+        if self._expires_at is None:
+            return None
+        self.check()
+        return max(1, int((self._expires_at - time.time()) * 1000))
+
+    def check(self):
+        """Raise QueryTimeoutError if the deadline has passed"""
+        if self._expires_at is not None and time.time() >= self._expires_at:
+            raise QueryTimeoutError(
+                'Query took longer than {} seconds'.format(self.seconds))
@@ -14,6 +14,26 @@ class DataSetCreationError(BackdropError):
     pass
 
 
+class StorageUnavailableError(BackdropError):
+
+    """Raised when the database can't be reached, or while it is being
+    left alone after repeatedly failing, to be tried again after
+    retry_after seconds"""
+
+    def __init__(self, retry_after, cause=None):
+        super(StorageUnavailableError, self).__init__(
+            'Storage unavailable: {}'.format(cause or 'circuit open'))
+        self.retry_after = retry_after
+        self.cause = cause
+
+
+class QueryTimeoutError(BackdropError):
+
+    """Raised when a query runs past its deadline, in the database or
+    while its results are being put together"""
+    pass
+
+
 class InvalidSortError(ValueError):
     pass
 
@@ -1,7 +1,12 @@
+import datetime
+import hashlib
+import json
 from base64 import b64encode
 
+from bson import ObjectId
+
 from backdrop.core.timeseries import PERIODS
-from backdrop.core.timeutils import parse_time_as_utc
+from backdrop.core.timeutils import as_utc, parse_time_as_utc
 from backdrop.core.validation import validate_record_data
 from .errors import ParseError, ValidationError
 
@@ -58,6 +63,26 @@ def _generate_auto_id(record, auto_id_keys):
         str(record[key]) for key in auto_id_keys))
 
 
+def record_id(record, auto_ids=None):
+    """Return the _id a record will be stored with, or None if that can't
+    be known before it is stored
+
+    >>> record_id({'_id': 'a', 'foo': 'foo'})
+    'a'
+    >>> record_id({'_id': 'a', 'foo': 'foo'}, ['foo'])
+    'Zm9v'
+    >>> record_id({'foo': 'foo'}, ['bar']) is None
+    True
+    """
+    if not auto_ids:
+        return record.get('_id')
+
+    try:
+        return _generate_auto_id(record, auto_ids)
+    except (ValidationError, UnicodeError):
+        return None
+
+
 def parse_timestamps(record):
     """Parses a timestamp in a record
 
@@ -141,3 +166,45 @@ def validate_record(record):
     if not result.is_valid:
         return result.message
     return None
+
+
+def to_json_types(value):
+    """Convert a query result to the types the read API would have
+    returned it as.
+
+    >>> to_json_types({'_timestamp': datetime.datetime(2014, 1, 1)})
+    {'_timestamp': '2014-01-01T00:00:00+00:00'}
+    >>> to_json_types({'_id': ObjectId('54b6b3b6e4b0b8d5e3c8f8a1')})
+    {'_id': '54b6b3b6e4b0b8d5e3c8f8a1'}
+    >>> to_json_types({'values': [{'count': 1}]})
+    {'values': [{'count': 1}]}
+    """
+    if isinstance(value, dict):
+        return dict((k, to_json_types(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [to_json_types(v) for v in value]
+    if isinstance(value, datetime.datetime):
+        return as_utc(value).isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+def content_hash(record, keys=None):
+    """Return a hash of the given keys of a record, or all of them.
+
+    Records compare equal whether their timestamps are strings or datetimes,
+    so computed records can be compared with stored ones.
+
+    >>> stored = {'_timestamp': datetime.datetime(2014, 1, 1)}
+    >>> computed = {'_timestamp': '2014-01-01T00:00:00+00:00'}
+    >>> content_hash(computed) == content_hash(stored)
+    True
+    >>> content_hash({'a': 1, 'b': 2}, ['a']) == content_hash({'a': 1})
+    True
+    """
+    if keys is not None:
+        record = dict((key, record.get(key)) for key in keys)
+
+    return hashlib.sha1(
+        json.dumps(to_json_types(record), sort_keys=True)).hexdigest()
@@ -0,0 +1,168 @@
+"""
+Riding out replica set elections and failing fast when the database is down.
+
+Operations that are safe to repeat are retried when the connection to the
+database drops, after a backoff with jitter so that every worker doesn't
+come back at once. When operations keep failing the circuit opens: for a
+while every operation fails straight away with StorageUnavailableError,
+which the APIs turn into a 503 with a Retry-After header, instead of each
+request waiting on a database that isn't there. After that one operation
+at a time is let through to see if the database is back.
+"""
+import functools
+import math
+import random
+import threading
+import time
+
+from pymongo.errors import ConnectionFailure
+
+from backdrop import statsd
+
+from ..errors import StorageUnavailableError
+
+
+RETRIES = 3
+BASE_DELAY = 0.1
+MAX_DELAY = 2
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 10
+
+
+class CircuitBreaker(object):
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD,
+                 reset_timeout=RESET_TIMEOUT):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trying = False
+
+    def before_call(self):
+        """Raise StorageUnavailableError if operations should fail fast"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            waited = time.time() - self._opened_at
+            if waited >= self._reset_timeout and not self._trying:
+                # Let one operation through to see if the database is back
+                self._trying = True
+                return
+
+        statsd.incr('storage.circuit.rejected')
+        raise StorageUnavailableError(self.retry_after())
+
+    def retry_after(self):
+        """Return how many seconds until operations will be tried again"""
+        opened_at = self._opened_at
+        if opened_at is None:
+            return 1
+        waited = time.time() - opened_at
+        return max(1, int(math.ceil(self._reset_timeout - waited)))
+
+    def succeeded(self):
+        with self._lock:
+            if self._opened_at is not None:
+                statsd.timing('storage.circuit.open_time',
+                              int((time.time() - self._opened_at) * 1000))
+            self._failures = 0
+            self._opened_at = None
+            self._trying = False
+
+    def failed(self):
+        with self._lock:
+            self._failures += 1
+            if self._trying or (self._opened_at is None and
+                                self._failures >= self._failure_threshold):
+                if self._opened_at is None:
+                    statsd.incr('storage.circuit.opened')
+                self._opened_at = time.time()
+                self._trying = False
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+
+class Availability(object):
+
+    """How operations on the database are retried and when they fail fast"""
+
+    def __init__(self, retries=RETRIES, base_delay=BASE_DELAY,
+                 max_delay=MAX_DELAY, breaker=None):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._calls = threading.local()
+
+    def call(self, function, retry):
+        """Call function, retrying it if retry is set and the connection to
+        the database drops.
+
+        Operations made by an operation already being called are left to
+        it, so they are not retried or counted twice.
+        """
+        if getattr(self._calls, 'depth', 0):
+            return function()
+
+        self._calls.depth = 1
+        try:
+            return self._call(function, retry)
+        finally:
+            self._calls.depth = 0
+
+    def _call(self, function, retry):
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                result = function()
+            except ConnectionFailure as e:
+                self.breaker.failed()
+                if not retry or attempt >= self.retries \
+                        or self.breaker.is_open:
+                    raise StorageUnavailableError(
+                        self.breaker.retry_after(), e)
+            except Exception:
+                # Any other error came from a database that answered
+                self.breaker.succeeded()
+                raise
+            else:
+                self.breaker.succeeded()
+                return result
+
+            statsd.incr('storage.retries')
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def backoff(self, attempt):
+        """Return how long to wait before retrying, chosen at random up to
+        a limit that doubles with each attempt
+
+        >>> 0 <= Availability(base_delay=1, max_delay=3).backoff(5) <= 3
+        True
+        """
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+def retried(method):
+    """Retry a storage engine method that is safe to repeat"""
+    @functools.wraps(method)
+    def wrapped(self, *args, **kwargs):
+        return self._availability.call(
+            lambda: method(self, *args, **kwargs), retry=True)
+    return wrapped
+
+
+def guarded(method):
+    """Fail a storage engine method that isn't safe to repeat fast while
+    the database is unavailable, without retrying it"""
+    @functools.wraps(method)
+    def wrapped(self, *args, **kwargs):
+        return self._availability.call(
+            lambda: method(self, *args, **kwargs), retry=False)
+    return wrapped
@@ -4,11 +4,15 @@ import datetime
 import itertools
 
 import pymongo
-from pymongo.errors import AutoReconnect, CollectionInvalid
+from pymongo.errors import (AutoReconnect, CollectionInvalid,
+                            DuplicateKeyError, ExecutionTimeout)
+from pymongo.read_preferences import mongos_enum
 from bson import Code
 
 from .. import timeutils
-from ..errors import DataSetCreationError
+from ..deadline import Deadline
+from ..errors import DataSetCreationError, QueryTimeoutError
+from .availability import Availability, retried, guarded
 
 
 logger = logging.getLogger(__name__)
@@ -70,42 +74,87 @@ def reconnecting_save(collection, record, tries=3):
             raise
 
 
-LAST_UPDATED_COMBINED_JS = """
-function(collection_names) {
-    return collection_names.map(function(name) {
-        return db[name];
-    }).filter(function(collection) {
-        return collection !== undefined;
-    }).map(function(collection, i) {
-        query = collection.find().sort({_timestamp:-1}).limit(1);
-        return {
-            name: collection_names[i],
-            last_updated: query.hasNext() ? query.next()['_timestamp'] : undefined
-        }
-    });
+PERIOD_LAST_UPDATED_JS = """
+function (current, previous) {
+    if (previous._updated_at === null ||
+            current._updated_at > previous._updated_at) {
+        previous._updated_at = current._updated_at;
+    }
 }
 """
 
+TRANSFORM_WATERMARKS_COLLECTION = 'transform_watermarks'
+JOBS_COLLECTION = 'jobs'
+TASK_CLAIMS_COLLECTION = 'task_claims'
+UPLOAD_FINGERPRINTS_COLLECTION = 'upload_fingerprints'
+DATA_SET_META_COLLECTION = 'data_set_meta'
+# Jobs are removed this many seconds after they were last updated
+JOB_TTL = 7 * 24 * 60 * 60
+
 
 class MongoStorageEngine(object):
 
     @classmethod
-    def create(cls, hosts, port, database):
-        return cls(get_mongo_client(hosts, port), database)
-
-    def __init__(self, mongo, database):
+    def create(cls, hosts, port, database, query_read_preference=None,
+               secondary_acceptable_latency_ms=None, availability=None):
+        return cls(get_mongo_client(hosts, port), database,
+                   query_read_preference, secondary_acceptable_latency_ms,
+                   availability)
+
+    def __init__(self, mongo, database, query_read_preference=None,
+                 secondary_acceptable_latency_ms=None, availability=None):
+        """query_read_preference is the name of the read preference, such as
+        'secondaryPreferred', for queries of data sets and of when they were
+        last updated. Everything else, including reads that need to see
+        what has just been written, goes to the primary.
+
+        availability says how operations are retried when the connection
+        to the database drops and when they fail fast instead."""
         self._mongo = mongo
+        self._availability = availability or Availability()
         self._db = mongo[database]
+        self._query_read_preference = None
+        if query_read_preference is not None:
+            self._query_read_preference = mongos_enum(query_read_preference)
+        self._secondary_acceptable_latency_ms = \
+            secondary_acceptable_latency_ms
+        # Names of the collections in the database, listed when first
+        # needed and kept up to date as data sets are created and deleted
+        self._collection_names = None
+        # Whether each data set written to is capped
+        self._capped = {}
 
     def _collection(self, data_set_id):
         return self._db[data_set_id]
 
+    def _query_collection(self, name, primary=False):
+        """Return a collection to read from with the query read preference,
+        for reads that can be a little behind the latest writes, or from
+        the primary if they can't"""
+        collection = self._db[name]
+        if primary:
+            return collection
+        if self._query_read_preference is not None:
+            collection.read_preference = self._query_read_preference
+        if self._secondary_acceptable_latency_ms is not None:
+            collection.secondary_acceptable_latency_ms = \
+                self._secondary_acceptable_latency_ms
+        return collection
+
     def alive(self):
         return self._mongo.alive()
 
+    @retried
     def data_set_exists(self, data_set_id):
-        return data_set_id in self._db.collection_names()
-
+        """Whether a data set exists, without listing the collections in
+        the database unless it might have been created by another process
+        since they were last listed"""
+        names = self._collection_names
+        if names is None or data_set_id not in names:
+            names = self._collection_names = set(self._db.collection_names())
+        return data_set_id in names
+
+    @guarded
     def create_data_set(self, data_set_id, size):
         try:
             if size > 0:
@@ -116,62 +165,387 @@ class MongoStorageEngine(object):
             self._collection(data_set_id).create_index(
                 [('_timestamp', pymongo.DESCENDING)])
         except CollectionInvalid as e:
+            # Whatever was known about the collections is out of date
+            self._collection_names = None
             raise DataSetCreationError(e.message)
 
+        names = self._collection_names
+        if names is not None:
+            names.add(data_set_id)
+        self._capped[data_set_id] = size > 0
+        self._reset_meta(data_set_id)
+
+    @retried
     def delete_data_set(self, data_set_id):
         self._db.drop_collection(data_set_id)
+        names = self._collection_names
+        if names is not None:
+            names.discard(data_set_id)
+        self._capped.pop(data_set_id, None)
+        self._db[DATA_SET_META_COLLECTION].remove({'_id': data_set_id})
 
+    @retried
     def get_last_updated(self, data_set_id):
-        last_updated = self._collection(data_set_id).find_one(
-            sort=[("_updated_at", pymongo.DESCENDING)])
-        if last_updated and last_updated.get('_updated_at') is not None:
-            return timeutils.utc(last_updated['_updated_at'])
+        return self.get_data_set_meta(data_set_id)['last_updated']
 
+    @retried
     def batch_last_updated(self, data_sets):
-        all_last_updated = self._db.eval(
-            LAST_UPDATED_COMBINED_JS,
-            [ds.name for ds in data_sets]
-        )
-
-        for i, last_updated in enumerate(all_last_updated):
-            data_sets[i]._last_updated = time_as_utc(
-                last_updated.get('last_updated', datetime.datetime.min))
-
+        """Set the latest _timestamp of each data set's records, reading the
+        metadata of all of them with a single query. Data sets without
+        records are given the earliest possible time, so they are reported
+        as out of date."""
+        meta = dict(
+            (doc['_id'], doc) for doc
+            in self._query_collection(DATA_SET_META_COLLECTION)
+            .find({'_id': {'$in': [ds.name for ds in data_sets]}}))
+
+        for data_set in data_sets:
+            data_set_meta = meta.get(data_set.name)
+            if not _is_tracked(data_set_meta):
+                data_set_meta = self.get_data_set_meta(data_set.name)
+            data_set.set_last_updated(time_as_utc(
+                data_set_meta.get('latest_timestamp') or datetime.datetime.min))
+
+    @retried
+    def get_data_set_meta(self, data_set_id):
+        """Return when a data set was last written to, how many records it
+        holds, the earliest and latest _timestamp of its records and a
+        version that goes up with every write.
+
+        The metadata is kept up to date as records are saved. The
+        timestamps are bounds: they aren't narrowed when a record is
+        replaced, or dropped from a capped data set, until the data set is
+        emptied. Data sets written to
+        before the metadata was kept have it worked out from their records
+        the first time it's asked for.
+        """
+        meta = self._db[DATA_SET_META_COLLECTION].find_one(
+            {'_id': data_set_id})
+        if not _is_tracked(meta):
+            meta = self._work_out_meta(data_set_id)
+
+        return convert_datetimes_to_utc(dict(
+            _empty_meta(),
+            version=meta['version'],
+            **dict((key, meta[key]) for key in META_FIELDS if key in meta)))
+
+    def _work_out_meta(self, data_set_id):
+        collection = self._collection(data_set_id)
+        meta = _empty_meta()
+        meta['record_count'] = collection.count()
+
+        if meta['record_count']:
+            last_updated = collection.find_one(
+                sort=[('_updated_at', pymongo.DESCENDING)])
+            meta['last_updated'] = last_updated.get('_updated_at')
+            earliest = collection.find_one(
+                {'_timestamp': {'$ne': None}},
+                sort=[('_timestamp', pymongo.ASCENDING)])
+            latest = collection.find_one(
+                {'_timestamp': {'$ne': None}},
+                sort=[('_timestamp', pymongo.DESCENDING)])
+            if earliest is not None:
+                meta['earliest_timestamp'] = earliest['_timestamp']
+                meta['latest_timestamp'] = latest['_timestamp']
+
+        update = {'$set': dict(
+            (key, value) for key, value in meta.items() if value is not None)}
+        update['$inc'] = {'version': 1}
+        return self._db[DATA_SET_META_COLLECTION].find_and_modify(
+            {'_id': data_set_id}, update, upsert=True, new=True)
+
+    @retried
+    def get_period_last_updated(self, data_set_id, period, start_at, end_at):
+        """Return the latest `_updated_at` of the records in each period
+        between start_at and end_at, keyed by the start of the period
+        """
+        spec = time_range_to_mongo_query(start_at, end_at)
+        keys = [period.start_at_key]
+
+        results = self._collection(data_set_id).group(
+            key=keys,
+            condition=build_group_condition(keys, spec),
+            initial={'_updated_at': None},
+            reduce=Code(PERIOD_LAST_UPDATED_JS))
+
+        return dict(
+            (time_as_utc(result[period.start_at_key]),
+             time_as_utc(result['_updated_at']))
+            for result in results if result['_updated_at'] is not None)
+
+    @retried
+    def get_transform_watermarks(self, transform_id, data_set_id):
+        """Return the `_updated_at` of the input data last processed by a
+        transform for each period, keyed by the start of the period
+        """
+        watermarks = self._db[TRANSFORM_WATERMARKS_COLLECTION].find_one(
+            {'_id': watermark_id(transform_id, data_set_id)})
+
+        if watermarks is None:
+            return {}
+
+        return dict(
+            (watermark['_start_at'], watermark['_updated_at'])
+            for watermark in map(convert_datetimes_to_utc,
+                                 watermarks['periods'].values()))
+
+    @retried
+    def set_transform_watermarks(self, transform_id, data_set_id, watermarks):
+        if not watermarks:
+            return
+
+        periods = dict(
+            ('periods.{}'.format(start_at.strftime('%Y%m%d%H')),
+             {'_start_at': start_at, '_updated_at': updated_at})
+            for start_at, updated_at in watermarks.items())
+
+        self._db[TRANSFORM_WATERMARKS_COLLECTION].update(
+            {'_id': watermark_id(transform_id, data_set_id)},
+            {'$set': periods},
+            upsert=True)
+
+    @guarded
+    def create_job(self, job_id, job):
+        """Store the state of a long running job, such as a transform
+        backfill, so that its progress can be shared between processes
+        """
+        job = dict(job, _id=job_id, _updated_at=timeutils.now())
+        jobs = self._db[JOBS_COLLECTION]
+        # Cached by the client, so only sent to the database now and then
+        jobs.ensure_index('_updated_at', expireAfterSeconds=JOB_TTL)
+        jobs.insert(job)
+
+    @retried
+    def get_job(self, job_id):
+        job = self._db[JOBS_COLLECTION].find_one({'_id': job_id})
+        if job is not None:
+            return convert_datetimes_to_utc(job)
+
+    @guarded
+    def update_job(self, job_id, increment=None, append=None, **fields):
+        """Atomically update a job and return its new state
+
+        `increment` maps fields to amounts to add to them and `append`
+        maps list fields to a value to push on to them; any other keyword
+        arguments are set on the job.
+        """
+        fields['_updated_at'] = timeutils.now()
+        update = {'$set': fields}
+        if increment:
+            update['$inc'] = increment
+        if append:
+            update['$push'] = append
+
+        job = self._db[JOBS_COLLECTION].find_and_modify(
+            {'_id': job_id}, update, new=True)
+        if job is not None:
+            return convert_datetimes_to_utc(job)
+
+    @guarded
+    def claim_task(self, key, ttl):
+        """Claim a task key for ttl seconds, returning False if it is
+        already claimed
+
+        The upsert only matches an expired claim, so claiming a key that
+        is held inserts a second document with the same _id and fails.
+        """
+        now = timeutils.now()
+        try:
+            self._db[TASK_CLAIMS_COLLECTION].update(
+                {'_id': key, 'expires_at': {'$lte': now}},
+                {'$set': {
+                    'expires_at': now + datetime.timedelta(seconds=ttl)}},
+                upsert=True)
+        except DuplicateKeyError:
+            return False
+        return True
+
+    @retried
+    def release_task(self, key):
+        self._db[TASK_CLAIMS_COLLECTION].remove({'_id': key})
+
+    @retried
+    def get_upload_fingerprint(self, data_set_id):
+        """Return the fingerprint of the last upload to a data set and
+        when it was uploaded"""
+        fingerprint = self._db[UPLOAD_FINGERPRINTS_COLLECTION].find_one(
+            {'_id': data_set_id})
+        if fingerprint is not None:
+            return convert_datetimes_to_utc(fingerprint)
+
+    @retried
+    def set_upload_fingerprint(self, data_set_id, fingerprint):
+        self._db[UPLOAD_FINGERPRINTS_COLLECTION].update(
+            {'_id': data_set_id},
+            {'$set': {
+                'fingerprint': fingerprint,
+                'uploaded_at': timeutils.now(),
+            }},
+            upsert=True)
+
+    @retried
     def empty_data_set(self, data_set_id):
         self._collection(data_set_id).remove({})
-
+        self._reset_meta(data_set_id)
+
+    def _is_capped(self, data_set_id):
+        if data_set_id not in self._capped:
+            options = self._collection(data_set_id).options()
+            self._capped[data_set_id] = bool(options.get('capped'))
+        return self._capped[data_set_id]
+
+    def _reset_meta(self, data_set_id):
+        # Unset rather than null, as $min keeps a null timestamp
+        self._db[DATA_SET_META_COLLECTION].update(
+            {'_id': data_set_id},
+            {'$set': {'record_count': 0},
+             '$unset': {'last_updated': '',
+                        'earliest_timestamp': '',
+                        'latest_timestamp': ''},
+             '$inc': {'version': 1}},
+            upsert=True)
+
+    @guarded
     def save_record(self, data_set_id, record):
-        record['_updated_at'] = timeutils.now()
-        self._collection(data_set_id).save(record)
+        self.save_records(data_set_id, [record])
+
+    @guarded
+    def save_records(self, data_set_id, records):
+        """Save records, replacing any with the same _id, and update the
+        data set's metadata once for all of them"""
+        now = timeutils.now()
+        collection = self._collection(data_set_id)
+        inserted = 0
+        timestamps = []
+
+        for record in records:
+            record['_updated_at'] = now
+            if '_id' in record:
+                result = collection.update(
+                    {'_id': record['_id']}, record, upsert=True)
+                if not (result or {}).get('updatedExisting'):
+                    inserted += 1
+            else:
+                collection.insert(record)
+                inserted += 1
+            if record.get('_timestamp') is not None:
+                timestamps.append(record['_timestamp'])
 
-    def execute_query(self, data_set_id, query):
-        return map(convert_datetimes_to_utc,
-                   self._execute_query(data_set_id, query))
+        if not records:
+            return
 
-    def _execute_query(self, data_set_id, query):
+        update = {
+            '$set': {'last_updated': now},
+            '$inc': {'version': 1},
+        }
+        if self._is_capped(data_set_id):
+            # Capped collections drop their oldest records to make room,
+            # so counting what was inserted would drift above what's held
+            update['$set']['record_count'] = collection.count()
+        else:
+            update['$inc']['record_count'] = inserted
+        if timestamps:
+            update['$min'] = {'earliest_timestamp': min(timestamps)}
+            update['$max'] = {'latest_timestamp': max(timestamps)}
+
+        meta = self._db[DATA_SET_META_COLLECTION]
+        result = meta.update(
+            {'_id': data_set_id, 'version': {'$exists': True}}, update)
+        if not (result or {}).get('n'):
+            # The rest is worked out from the records when it's first asked
+            # for, counting these ones
+            meta.update({'_id': data_set_id},
+                        {'$set': {'last_updated': now}}, upsert=True)
+
+    @retried
+    def find_records(self, data_set_id, record_ids):
+        """Return the stored records with the given ids, keyed by id"""
+        records = self._collection(data_set_id).find(
+            {'_id': {'$in': list(record_ids)}})
+
+        return dict((record['_id'], convert_datetimes_to_utc(record))
+                    for record in records)
+
+    @retried
+    def execute_query(self, data_set_id, query, deadline=None, primary=False):
+        """Run a query, giving the database whatever time is left before
+        the deadline. primary sends it to the primary whatever the query
+        read preference, for reads that need to see the latest writes."""
+        deadline = deadline or Deadline()
+        try:
+            return map(convert_datetimes_to_utc,
+                       self._execute_query(data_set_id, query, deadline,
+                                           primary))
+        except ExecutionTimeout:
+            raise QueryTimeoutError(
+                'Query took longer than {} seconds'.format(deadline.seconds))
+
+    def _execute_query(self, data_set_id, query, deadline, primary):
         if query.is_grouped:
-            return self._group_query(data_set_id, query)
+            return self._group_query(data_set_id, query, deadline, primary)
         else:
-            return self._basic_query(data_set_id, query)
+            return self._basic_query(data_set_id, query, deadline, primary)
 
-    def _group_query(self, data_set_id, query):
+    def _group_query(self, data_set_id, query, deadline, primary):
         # flatten the list of key combos to form a flat list of keys
         keys = list(itertools.chain.from_iterable(query.group_keys))
         spec = get_mongo_spec(query)
         collect_fields = query.collect_fields
+        options = {}
+        max_time_ms = deadline.remaining_ms()
+        if max_time_ms is not None:
+            options['maxTimeMS'] = max_time_ms
 
-        return self._collection(data_set_id).group(
+        return self._query_collection(data_set_id, primary).group(
             key=keys,
             condition=build_group_condition(keys, spec),
             initial=build_group_initial_state(collect_fields),
-            reduce=Code(build_group_reducer(collect_fields)))
+            reduce=Code(build_group_reducer(collect_fields)),
+            **options)
 
-    def _basic_query(self, data_set_id, query):
+    def _basic_query(self, data_set_id, query, deadline, primary):
         spec = get_mongo_spec(query)
         sort = get_mongo_sort(query)
         limit = get_mongo_limit(query)
 
-        return self._collection(data_set_id).find(spec, sort=sort, limit=limit)
+        cursor = self._query_collection(data_set_id, primary).find(
+            spec, sort=sort, limit=limit)
+        max_time_ms = deadline.remaining_ms()
+        if max_time_ms is not None:
+            cursor = cursor.max_time_ms(max_time_ms)
+        return cursor
+
+
+META_FIELDS = ['last_updated', 'record_count',
+               'earliest_timestamp', 'latest_timestamp']
+
+
+def _empty_meta():
+    """
+    >>> sorted(_empty_meta().items())
+    [('earliest_timestamp', None), ('last_updated', None), \
+('latest_timestamp', None), ('record_count', 0)]
+    """
+    return {
+        'last_updated': None,
+        'record_count': 0,
+        'earliest_timestamp': None,
+        'latest_timestamp': None,
+    }
+
+
+def _is_tracked(meta):
+    """Whether a data set's metadata has been kept as it was written to,
+    rather than just when it was last updated"""
+    return meta is not None and 'version' in meta
+
+
+def watermark_id(transform_id, data_set_id):
+    """
+    >>> watermark_id('abc-123', 'some_data_set')
+    'abc-123:some_data_set'
+    """
+    return '{}:{}'.format(transform_id, data_set_id)
 
 
 def get_mongo_spec(query):
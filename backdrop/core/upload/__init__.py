@@ -1,3 +1,7 @@
+from functools import partial
+
+from backdrop import statsd
+
 from .utils import make_dicts
 from .parse_csv import parse_csv
 from .parse_excel import parse_excel
@@ -7,23 +11,41 @@ DEFAULT_UPLOAD_FILTERS = ["backdrop.core.upload.filters.first_sheet_filter"]
 
 
 def create_parser(data_set_config):
-    format_parser = load_format_parser(data_set_config['upload_format'])
+    format_parser = load_format_parser(data_set_config['upload_format'],
+                                       data_set_config.get('schema'))
     upload_filters = map(load_filter, data_set_config.get('upload_filters',
                                                           DEFAULT_UPLOAD_FILTERS))
 
     def parser(file_stream):
-        data = format_parser(file_stream)
+        """Return an iterator of records read from file_stream
+
+        Records are parsed as they are consumed, so errors in the file are
+        raised while iterating rather than when this is called. Parsing
+        stats are sent once iterating stops.
+        """
+        stats = statsd.aggregator(
+            data_set=data_set_config.get('name', 'unknown'))
+        data = format_parser(file_stream, stats=stats)
         for upload_filter in upload_filters:
             data = upload_filter(data)
 
-        return list(make_dicts(data))
+        return _flush_when_done(make_dicts(data), stats)
 
     return parser
 
 
-def load_format_parser(upload_format):
+def _flush_when_done(records, stats):
+    try:
+        for record in records:
+            stats.incr('upload.records')
+            yield record
+    finally:
+        stats.flush()
+
+
+def load_format_parser(upload_format, schema=None):
     return {
-        "csv": parse_csv,
+        "csv": partial(parse_csv, schema=schema),
         "excel": parse_excel,
     }[upload_format]
 
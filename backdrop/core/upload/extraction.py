@@ -0,0 +1,261 @@
+"""
+Declarative extraction of records from spreadsheets laid out for people.
+
+Upload filters for sheets with titles, summary rows and blocks of figures
+describe where the values are with a SheetTemplate rather than picking
+cells out of the whole sheet in loops. A template is built once, when the
+filter module is imported, and reads a sheet in a single pass, keeping
+only the rows it needs and stopping as soon as it has all its records, so
+the rest of the sheet is never read.
+
+A template has cells read once from fixed positions, optionally a header
+row, and records that are either rows (RowRecords) or columns
+(ColumnRecords) of the sheet. Every record is a dict holding its own
+fields and the template's cells. Melt unpivots each record, giving one
+record per column it names, like the sheet's date columns.
+
+    >>> template = SheetTemplate(
+    ...     cells={'date': (0, 1)},
+    ...     header_row=1,
+    ...     records=RowRecords(first_row=2, columns={'name': 0},
+    ...                        until=lambda record: record['name'] is None),
+    ...     melt=Melt(HeaderColumns(first_column=1), 'fruit', 'count'))
+    >>> rows = [['Date', '2014-01-01'],
+    ...         ['Name', 'Apples', 'Pears'],
+    ...         ['Ann', 1, 2],
+    ...         [None, 3, 4]]
+    >>> for record in template.extract(rows):
+    ...     print sorted(record.items())
+    [('count', 1), ('date', '2014-01-01'), ('fruit', 'Apples'), ('name', 'Ann')]
+    [('count', 2), ('date', '2014-01-01'), ('fruit', 'Pears'), ('name', 'Ann')]
+"""
+import itertools
+
+
+class HeaderColumns(object):
+
+    """The columns from first_column on whose header matches, named by
+    their header"""
+
+    def __init__(self, first_column, match=None):
+        self.first_column = first_column
+        self.match = match
+
+    def resolve(self, header):
+        """Return (name, column) pairs for a header row
+
+        >>> HeaderColumns(1, lambda name: name != 'Total').resolve(
+        ...     ['', 'Apr', 'Total', 'May'])
+        [('Apr', 1), ('May', 3)]
+        """
+        return [(name, column) for column, name
+                in enumerate(header[self.first_column:], self.first_column)
+                if self.match is None or self.match(name)]
+
+
+class RowRecords(object):
+
+    """Records that are rows of the sheet, either the rows from first_row
+    until one is found for which until is true, or the given rows.
+
+    columns maps field names to the columns they are read from. Given
+    rows, a dict of row index to fields added to the record read from
+    that row, like labels for the block of the sheet a row is in.
+    """
+
+    def __init__(self, columns, first_row=None, until=None, rows=None):
+        if (first_row is None) == (rows is None):
+            raise ValueError('RowRecords needs one of first_row and rows')
+        self.columns = _pairs(columns)
+        self.first_row = min(rows) if rows else first_row
+        self.until = until
+        self.rows = rows
+        self._last_row = max(rows) if rows else None
+
+    def _extract(self, indexed_rows, fields):
+        for index, row in indexed_rows:
+            if self.rows is not None:
+                if index not in self.rows:
+                    continue
+                record = dict(self.rows[index])
+            elif index < self.first_row:
+                continue
+            else:
+                record = {}
+
+            record.update(fields)
+            record.update((name, row[column])
+                          for name, column in self.columns)
+            if self.until is not None and self.until(record):
+                return
+            yield row, record
+            if index == self._last_row:
+                return
+
+
+class ColumnRecords(object):
+
+    """Records that are columns of the sheet from first_column, up to
+    last_column if given, until one is found for which until is true or
+    the rows run out.
+
+    rows maps field names to the rows they are read from. Only those rows
+    are kept while the sheet is read.
+    """
+
+    def __init__(self, rows, first_column, last_column=None, until=None):
+        self.rows = _pairs(rows)
+        self.first_row = min(row for _, row in self.rows)
+        self.first_column = first_column
+        self.last_column = last_column
+        self.until = until
+
+    def _extract(self, indexed_rows, fields):
+        wanted = set(row for _, row in self.rows)
+        kept = {}
+        for index, row in indexed_rows:
+            if index in wanted:
+                kept[index] = row
+                if len(kept) == len(wanted):
+                    break
+        else:
+            raise _missing_rows(wanted - set(kept))
+
+        width = min(len(row) for row in kept.values())
+        if self.last_column is not None:
+            width = min(width, self.last_column + 1)
+
+        for column in range(self.first_column, width):
+            record = dict(fields)
+            record.update((name, kept[row][column])
+                          for name, row in self.rows)
+            if self.until is not None and self.until(record):
+                return
+            yield None, record
+
+
+class Melt(object):
+
+    """Unpivot records, giving one record per column, with the name of the
+    column in variable and its value in value.
+
+    columns maps names to columns, or is HeaderColumns. Melting
+    ColumnRecords isn't supported, as their values are read from rows.
+    """
+
+    def __init__(self, columns, variable, value):
+        self.columns = columns
+        self.variable = variable
+        self.value = value
+
+    def _resolve(self, header):
+        if isinstance(self.columns, HeaderColumns):
+            return self.columns.resolve(header)
+        return _pairs(self.columns)
+
+    def _apply(self, columns, row, record):
+        for name, column in columns:
+            melted = dict(record)
+            melted[self.variable] = name
+            melted[self.value] = row[column]
+            yield melted
+
+
+class SheetTemplate(object):
+
+    """Where the values are in a sheet, checked when the template is built
+    and read from a sheet with extract.
+
+    cells maps names to (row, column) positions of values read once and
+    added to every record. Without records, extract gives a single record
+    of the cells.
+    """
+
+    def __init__(self, cells=None, header_row=None, records=None, melt=None):
+        self.cells = _pairs(cells or {})
+        self.header_row = header_row
+        self.records = records
+        self.melt = melt
+
+        if melt is not None and not isinstance(records, RowRecords):
+            raise ValueError('Only RowRecords can be melted')
+        if isinstance(melt, Melt) and \
+                isinstance(melt.columns, HeaderColumns) and header_row is None:
+            raise ValueError('HeaderColumns need a header_row')
+
+        # Everything read once must come before the first record, so that
+        # records can be given out as the sheet is read
+        self._preamble = set(row for _, (row, _) in self.cells)
+        if header_row is not None:
+            self._preamble.add(header_row)
+        if records is not None and self._preamble and \
+                max(self._preamble) >= records.first_row:
+            raise ValueError(
+                'Cells and the header row must come before the records')
+
+    def extract(self, rows):
+        """Return an iterator of the records in rows"""
+        indexed_rows = enumerate(rows)
+        fields, header = self._read_preamble(indexed_rows)
+
+        if self.records is None:
+            yield fields
+            return
+
+        melt_columns = None
+        if self.melt is not None:
+            melt_columns = self.melt._resolve(header)
+
+        for row, record in self.records._extract(indexed_rows, fields):
+            if self.melt is None:
+                yield record
+            else:
+                for melted in self.melt._apply(melt_columns, row, record):
+                    yield melted
+
+    def _read_preamble(self, indexed_rows):
+        fields = {}
+        header = None
+        if not self._preamble:
+            return fields, header
+
+        kept = {}
+        last_row = max(self._preamble)
+        for index, row in indexed_rows:
+            if index in self._preamble:
+                kept[index] = row
+            if index == last_row:
+                break
+        else:
+            raise _missing_rows(self._preamble - set(kept))
+
+        for name, (row, column) in self.cells:
+            fields[name] = kept[row][column]
+        if self.header_row is not None:
+            header = kept[self.header_row]
+
+        return fields, header
+
+
+def _pairs(mapping):
+    """Return the (name, position) pairs of a dict or list of pairs, in
+    order of position"""
+    if isinstance(mapping, dict):
+        mapping = mapping.items()
+    return sorted(mapping, key=lambda pair: pair[1])
+
+
+def _missing_rows(indexes):
+    return IndexError('The sheet has no row {}'.format(min(indexes)))
+
+
+def nth_sheet(sheets, index):
+    """Return a sheet of a workbook without reading the sheets before it
+
+    >>> nth_sheet(iter(['a', 'b', 'c']), 1)
+    'b'
+    """
+    try:
+        return next(itertools.islice(sheets, index, None))
+    except StopIteration:
+        raise IndexError('The workbook has no sheet {}'.format(index))
@@ -1,15 +1,41 @@
 import csv
 import itertools
+import re
+from backdrop import statsd
 from ..errors import ParseError
 
+# Rows read to decide the type of each column
+SAMPLE_SIZE = 100
+# Fraction of rows whose conversion is timed
+TIMING_SAMPLE_RATE = 0.01
 
-def parse_csv(incoming_data):
+# int() accepts these and nothing else
+INTEGER = re.compile(r'\s*[-+]?\d+\s*$', re.UNICODE)
+# Anything int() or float() accepts starts like this
+NUMBER_START = re.compile(r'\s*[-+]?(\d|\.\d|inf|nan)',
+                          re.UNICODE | re.IGNORECASE)
+
+
+def parse_csv(incoming_data, schema=None, stats=None):
+    """Return the rows of a CSV file as a single sheet
+
+    Rows are read from the stream as the sheet is iterated over, so a file
+    is never held in memory in full. Columns declared as integers, numbers
+    or strings in the data set's JSON schema are converted to that type,
+    and the type of other columns is inferred from the first rows.
+
+    Counts of the rows read and an estimate of the time spent converting
+    them are added to stats, to be sent once the upload has been read.
+    Without stats they are sent once the sheet has been read.
+    """
     reader = unicode_csv_reader(
         ignore_comment_lines(lines(incoming_data)), "utf-8")
     return [
-        parse_cells_as_numbers(
+        parse_columns(
             ignore_empty_rows(
-                ignore_comment_column(reader)))]
+                ignore_comment_column(reader)),
+            schema,
+            stats)]
 
 
 def lines(stream):
@@ -33,8 +59,126 @@ def is_empty_row(row):
     return not any(row)
 
 
-def parse_cells_as_numbers(rows):
-    return [[parse_as_number(cell) for cell in row] for row in rows]
+def parse_columns(rows, schema=None, stats=None):
+    """Convert the cells of each column with a single converter
+
+    >>> list(parse_columns([["a", "b"], ["1", "x"], ["2.5", "3"]]))
+    [['a', 'b'], [1, 'x'], [2.5, 3]]
+    """
+    if stats is None:
+        with statsd.aggregator() as stats:
+            for row in parse_columns(rows, schema, stats):
+                yield row
+        return
+
+    rows = iter(rows)
+    keys = next(rows)
+    yield [parse_as_number(key) for key in keys]
+
+    sample = list(itertools.islice(rows, SAMPLE_SIZE))
+    converters = [
+        schema_converter(schema, key) or infer_converter(cells)
+        for key, cells in zip(keys, _columns(sample, len(keys)))]
+
+    for row in itertools.chain(sample, rows):
+        with stats.timer('parse_csv.convert_row', rate=TIMING_SAMPLE_RATE):
+            if len(row) == len(converters):
+                values = [convert(cell)
+                          for convert, cell in zip(converters, row)]
+            else:
+                # make_dicts rejects these, but with the right error
+                values = [parse_as_number(cell) for cell in row]
+        stats.incr('parse_csv.rows')
+        yield values
+
+
+def _columns(rows, width):
+    return [[row[index] for row in rows if len(row) == width]
+            for index in range(width)]
+
+
+def schema_converter(schema, key):
+    """Return the converter for the type a JSON schema gives a column, if
+    it gives it a single one
+
+    >>> schema = {"properties": {"a": {"type": ["integer", "null"]}}}
+    >>> schema_converter(schema, "a") is parse_as_integer
+    True
+    >>> schema_converter(schema, "b") is None
+    True
+    """
+    if not schema:
+        return None
+
+    types = schema.get("properties", {}).get(key, {}).get("type", [])
+    if isinstance(types, basestring):
+        types = [types]
+    types = [type_name for type_name in types if type_name != "null"]
+
+    if len(types) == 1:
+        return SCHEMA_CONVERTERS.get(types[0])
+
+
+def infer_converter(cells):
+    """Return the cheapest converter giving the same result as
+    parse_as_number for every cell in the sample
+
+    >>> infer_converter(["1", "", "2"]) is parse_as_integer
+    True
+    >>> infer_converter(["1", "2.5"]) is parse_as_float
+    True
+    >>> infer_converter(["a", "", "1"]) is parse_as_text
+    True
+    """
+    numbers = [parse_as_number(cell) for cell in cells if cell != '']
+
+    if numbers and all(isinstance(number, int) for number in numbers):
+        return parse_as_integer
+    if numbers and all(isinstance(number, (int, float))
+                       for number in numbers):
+        return parse_as_float
+    return parse_as_text
+
+
+def parse_as_integer(cell):
+    try:
+        return int(cell)
+    except ValueError:
+        return parse_as_number(cell)
+
+
+def parse_as_float(cell):
+    """
+    >>> parse_as_float("1.5"), parse_as_float("1"), parse_as_float("a")
+    (1.5, 1, 'a')
+    """
+    try:
+        value = float(cell)
+    except ValueError:
+        return cell
+
+    return int(cell) if INTEGER.match(cell) else value
+
+
+def parse_as_text(cell):
+    """
+    >>> parse_as_text("foo"), parse_as_text("12")
+    ('foo', 12)
+    """
+    if NUMBER_START.match(cell):
+        return parse_as_number(cell)
+    return cell
+
+
+def parse_as_string(cell):
+    return cell
+
+
+SCHEMA_CONVERTERS = {
+    "integer": parse_as_integer,
+    "number": parse_as_float,
+    "string": parse_as_string,
+}
 
 
 def parse_as_number(cell):
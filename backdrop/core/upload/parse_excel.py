@@ -4,6 +4,7 @@ import datetime
 from backdrop import statsd
 from backdrop.core.errors import ParseError
 from backdrop.core.timeutils import utc
+from . import parse_xlsx
 
 
 class ExcelError(object):
@@ -21,26 +22,54 @@ class ExcelError(object):
 EXCEL_ERROR = ExcelError("error in cell")
 
 
-@statsd.timer('parse_excel.parse_excel')
-def parse_excel(incoming_data):
-    book = xlrd.open_workbook(file_contents=incoming_data.read())
+# Fraction of rows whose conversion is timed
+TIMING_SAMPLE_RATE = 0.01
+
+
+def parse_excel(incoming_data, stats=None):
+    """Return the sheets of a workbook, each an iterator of rows
+
+    Counts of the sheets, rows and cells read and an estimate of the time
+    spent converting them are added to stats, to be sent once the upload
+    has been read rather than for every cell. Without stats they are sent
+    as each sheet is finished.
+    """
+    if parse_xlsx.is_xlsx(incoming_data):
+        book = parse_xlsx.open_workbook(incoming_data)
+    else:
+        book = xlrd.open_workbook(file_contents=incoming_data.read())
 
     for sheet in book.sheets():
-        yield _extract_rows(sheet, book)
+        yield _extract_rows(sheet, book, stats)
+
+
+def _extract_rows(sheet, book, stats):
+    if stats is None:
+        with statsd.aggregator() as stats:
+            for values in _extract_rows(sheet, book, stats):
+                yield values
+        return
+
+    stats.incr('parse_excel.sheets')
+    for row in _rows(sheet):
+        with stats.timer('parse_excel.extract_values',
+                         rate=TIMING_SAMPLE_RATE):
+            values = _extract_values(row, book)
+        stats.incr('parse_excel.rows')
+        stats.incr('parse_excel.cells', len(values))
+        yield values
 
 
-@statsd.timer('parse_excel._extract_rows')
-def _extract_rows(sheet, book):
-    for i in range(sheet.nrows):
-        yield _extract_values(sheet.row(i), book)
+def _rows(sheet):
+    if isinstance(sheet, parse_xlsx.Sheet):
+        return sheet.rows()
+    return (sheet.row(i) for i in range(sheet.nrows))
 
 
-@statsd.timer('parse_excel._extract_values')
 def _extract_values(row, book):
     return [_extract_cell_value(cell, book) for cell in row]
 
 
-@statsd.timer('parse_excel._extract_cell_value')
 def _extract_cell_value(cell, book):
     if cell.ctype == xlrd.XL_CELL_DATE:
         time_tuple = xlrd.xldate_as_tuple(cell.value, book.datemode)
@@ -0,0 +1,230 @@
+"""
+Streaming reader for Excel 2007 (.xlsx) workbooks.
+
+xlrd builds every sheet of a workbook in memory before returning any of
+it. This reads the workbook, its styles and its shared strings up front as
+xlrd does, but only reads a sheet when its rows are iterated over, and then
+one row at a time. Sheets that no upload filter asks for are never parsed.
+
+Cells are parsed by xlrd's own xlsx code, so rows come out exactly as they
+would from xlrd: padded to the width of the sheet, with empty rows where
+the file has none.
+"""
+import sys
+import zipfile
+
+from xlrd import xlsx
+from xlrd.biffh import XL_CELL_EMPTY
+from xlrd.book import Book
+from xlrd.sheet import Cell
+
+ROW_TAG = xlsx.U_SSML12 + 'row'
+MERGE_CELL_TAG = xlsx.U_SSML12 + 'mergeCell'
+V_TAG = xlsx.V_TAG
+EMPTY_CELL = Cell(XL_CELL_EMPTY, '')
+
+
+def is_xlsx(incoming_data):
+    """Whether a seekable stream holds an xlsx workbook, leaving it at the
+    start"""
+    incoming_data.seek(0)
+    try:
+        if not zipfile.is_zipfile(incoming_data):
+            return False
+        incoming_data.seek(0)
+        return 'xl/workbook.xml' in zipfile.ZipFile(incoming_data).namelist()
+    finally:
+        incoming_data.seek(0)
+
+
+def open_workbook(incoming_data):
+    xlsx.ensure_elementtree_imported(0, None)
+    return Workbook(zipfile.ZipFile(incoming_data))
+
+
+class Workbook(object):
+
+    def __init__(self, zip_file):
+        self._zip_file = zip_file
+        names = zip_file.namelist()
+
+        # Set up as xlrd.xlsx.open_workbook_2007_xml does
+        self._book = Book()
+        self._book.logfile = sys.stdout
+        self._book.verbosity = 0
+        self._book.formatting_info = 0
+        self._book.use_mmap = False
+        self._book.on_demand = False
+        self._book.ragged_rows = 0
+
+        x12book = xlsx.X12Book(self._book)
+        x12book.process_rels(zip_file.open('xl/_rels/workbook.xml.rels'))
+        x12book.process_stream(zip_file.open('xl/workbook.xml'))
+
+        if 'xl/styles.xml' in names:
+            xlsx.X12Styles(self._book).process_stream(
+                zip_file.open('xl/styles.xml'))
+        if 'xl/sharedStrings.xml' in names:
+            xlsx.X12SST(self._book).process_stream(
+                zip_file.open('xl/sharedStrings.xml'))
+
+        self._sheets = [
+            Sheet(self, name, target) for name, target
+            in zip(self._book._sheet_names, x12book.sheet_targets)]
+
+    @property
+    def datemode(self):
+        return self._book.datemode
+
+    def sheets(self):
+        return self._sheets
+
+    def _open(self, target):
+        return self._zip_file.open(target)
+
+
+class Sheet(object):
+
+    def __init__(self, workbook, name, target):
+        self._workbook = workbook
+        self.name = name
+        self._target = target
+
+    def rows(self):
+        """Return an iterator of the rows of the sheet as lists of xlrd
+        cells"""
+        nrows, ncols, in_order = self._dimensions()
+
+        if in_order:
+            rows = self._parse_rows()
+        else:
+            rows = sorted(_merge_rows(self._parse_rows()).items())
+
+        next_rowx = 0
+        for rowx, cells in rows:
+            if rowx >= nrows:
+                break
+            for _ in range(next_rowx, rowx):
+                yield _empty_row(ncols)
+            yield _pad_row(cells, ncols)
+            next_rowx = rowx + 1
+
+        for _ in range(next_rowx, nrows):
+            yield _empty_row(ncols)
+
+    def _dimensions(self):
+        """Work out the size of the sheet the way xlrd does, from the cells
+        holding values and any merged cells, without parsing the cells."""
+        nrows = ncols = 0
+        rowx = -1
+        in_order = True
+
+        for _, elem in xlsx.ET.iterparse(self._workbook._open(self._target)):
+            if elem.tag == ROW_TAG:
+                row_number = elem.get('r')
+                next_rowx = int(row_number) - 1 if row_number else rowx + 1
+                if next_rowx <= rowx:
+                    in_order = False
+                rowx = next_rowx
+
+                width = _row_width(elem)
+                if width is None:
+                    width = self._parsed_row_width(elem)
+                if width:
+                    nrows = max(nrows, rowx + 1)
+                    ncols = max(ncols, width)
+                elem.clear()
+            elif elem.tag == MERGE_CELL_TAG and elem.get('ref'):
+                last_rowx, last_colx = xlsx.cell_name_to_rowx_colx(
+                    elem.get('ref').split(':')[-1])
+                if last_rowx + 1 > nrows:
+                    nrows = last_rowx + 1
+                    ncols = max(ncols, 1)
+                ncols = max(ncols, last_colx + 1)
+
+        return nrows, ncols, in_order
+
+    def _parsed_row_width(self, elem):
+        collector = _RowCollector(self._workbook._book)
+        xlsx.X12Sheet(collector).do_row(elem)
+        cells = collector.take()
+        return max(cells) + 1 if cells else 0
+
+    def _parse_rows(self):
+        """Return an iterator of the index of each row element in the sheet
+        and the cells in it, keyed by column index"""
+        collector = _RowCollector(self._workbook._book)
+        x12sheet = xlsx.X12Sheet(collector)
+
+        for _, elem in xlsx.ET.iterparse(self._workbook._open(self._target)):
+            if elem.tag == ROW_TAG:
+                x12sheet.do_row(elem)
+                elem.clear()
+                yield x12sheet.rowx, collector.take()
+
+
+class _RowCollector(object):
+    """Stands in for an xlrd sheet, collecting the cells of one row at a
+    time as xlrd's xlsx code puts them"""
+
+    def __init__(self, book):
+        self.book = book
+        self.merged_cells = []
+        self._cells = {}
+
+    def put_cell(self, rowx, colx, ctype, value, xf_index):
+        if ctype is None:
+            ctype = self.book._xf_index_to_xl_type_map[xf_index]
+        self._cells[colx] = Cell(ctype, value)
+
+    def take(self):
+        cells, self._cells = self._cells, {}
+        return cells
+
+
+def _row_width(row_elem):
+    """Return one more than the column index of the last cell in a row that
+    xlrd would give a value, or None if the cells don't name their columns
+
+    Number and shared string cells without a value are left empty by xlrd,
+    other types of cell never are. Cells are stored in column order, so
+    only the cells after the last with a value are looked at.
+    """
+    for cell_elem in reversed(row_elem):
+        if cell_elem.get('t', 'n') in ('n', 's') and \
+                not cell_elem.findtext(V_TAG):
+            continue
+        cell_name = cell_elem.get('r')
+        if cell_name is None:
+            return None
+        return _column_index(cell_name) + 1
+    return 0
+
+
+def _column_index(cell_name):
+    """
+    >>> _column_index('A1'), _column_index('$AB$12')
+    (0, 27)
+    """
+    colx = 0
+    for char in cell_name:
+        if char.isdigit():
+            break
+        if char != '$':
+            colx = colx * 26 + ord(char) - ord('A') + 1
+    return colx - 1
+
+
+def _merge_rows(rows):
+    merged = {}
+    for rowx, cells in rows:
+        merged.setdefault(rowx, {}).update(cells)
+    return merged
+
+
+def _pad_row(cells, ncols):
+    return [cells.get(colx, EMPTY_CELL) for colx in range(ncols)]
+
+
+def _empty_row(ncols):
+    return [EMPTY_CELL] * ncols
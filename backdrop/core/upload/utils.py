@@ -1,10 +1,10 @@
-from itertools import ifilter
+from itertools import ifilter, islice
 import logging
 from backdrop.core.errors import ParseError
 
 
 def remove_blanks(rows):
-    return filter(lambda r: not all(v is None or len(v) == 0 for v in r), rows)
+    return ifilter(lambda r: not all(v is None or v == '' for v in r), rows)
 
 
 def make_dicts(rows):
@@ -28,3 +28,22 @@ def make_dicts(rows):
                 'Some rows in the CSV file contain fewer values than columns')
 
         yield dict(zip(keys, row))
+
+
+def batches(iterable, size):
+    """Return an iterator of lists of at most size items from iterable
+
+    There is always at least one list, so an empty upload is still posted.
+
+    >>> list(batches(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    >>> list(batches([], 2))
+    [[]]
+    """
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while True:
+        yield batch
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
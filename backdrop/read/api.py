@@ -6,11 +6,13 @@ from bson import ObjectId
 from flask import Flask, jsonify, request
 from flask_featureflags import FeatureFlag
 
+from .health import DataSetHealth
 from .query import parse_query_from_request
 from .validation import validate_request_args
 from ..core import log_handler, cache_control, http_validation
 from ..core.data_set import DataSet
-from ..core.errors import InvalidOperationError
+from ..core.errors import (InvalidOperationError, StorageUnavailableError,
+                           QueryTimeoutError)
 from ..core.flaskutils import generate_request_id
 from ..core.timeutils import as_utc
 from ..core.response import crossdomain
@@ -35,7 +37,9 @@ app.config.from_object(
 storage = MongoStorageEngine.create(
     app.config['MONGO_HOSTS'],
     app.config['MONGO_PORT'],
-    app.config['DATABASE_NAME'])
+    app.config['DATABASE_NAME'],
+    app.config['MONGO_QUERY_READ_PREFERENCE'],
+    app.config['MONGO_SECONDARY_ACCEPTABLE_LATENCY_MS'])
 
 admin_api = client.AdminAPI(
     app.config['STAGECRAFT_URL'],
@@ -44,6 +48,11 @@ admin_api = client.AdminAPI(
     request_id_fn=generate_request_id,
 )
 
+data_set_health_report = DataSetHealth(
+    storage,
+    admin_api.list_data_sets,
+    app.config['DATA_SET_HEALTH_REFRESH_INTERVAL'])
+
 DEFAULT_DATA_SET_QUERYABLE = True
 DEFAULT_DATA_SET_RAW_QUERIES = False
 DEFAULT_DATA_SET_PUBLISHED = True
@@ -80,6 +89,15 @@ def uncaught_error_handler(e):
     return (jsonify(status='error', message=error_message), 500)
 
 
+@app.errorhandler(StorageUnavailableError)
+@crossdomain(origin='*')
+def storage_unavailable_handler(e):
+    app.logger.warning(e)
+    return (jsonify(status='error', message='Storage is unavailable'),
+            503,
+            [('Retry-After', str(e.retry_after))])
+
+
 @app.errorhandler(404)
 @app.errorhandler(405)
 @crossdomain(origin='*')
@@ -108,17 +126,7 @@ def health_check():
 @statsd.timer('read.route.heath_check.data_set')
 def data_set_health():
 
-    failing_data_sets = []
-    data_set_configs = admin_api.list_data_sets()
-    data_sets = [DataSet(storage, config) for config in data_set_configs]
-
-    storage.batch_last_updated(data_sets)
-
-    for data_set in data_sets:
-        if not data_set.is_recent_enough():
-            failing_data_sets.append(
-                _data_set_object(data_set)
-            )
+    failing_data_sets = data_set_health_report.report()
 
     if len(failing_data_sets):
         if len(failing_data_sets) > 1:
@@ -137,15 +145,6 @@ def data_set_health():
                        message='All data_sets are in date')
 
 
-def _data_set_object(data_set):
-    return {
-        "name": data_set.name,
-        "seconds-out-of-date": data_set.get_seconds_out_of_date(),
-        "last-updated": data_set.get_last_updated(),
-        "max-age-expected": data_set.get_max_age_expected(),
-    }
-
-
 def log_error_and_respond(data_set, message, status_code):
     app.logger.error('%s: %s' % (data_set, message))
     return jsonify(status='error', message=message), status_code
@@ -217,12 +216,22 @@ def fetch(data_set_config):
 
         try:
             query = parse_query_from_request(request)
-            data = data_set.execute_query(query)
+            # Transformers read what has just been written, so can't be
+            # answered by a secondary that is behind
+            data = data_set.execute_query(
+                query, app.config['QUERY_TIME_LIMIT'],
+                primary=request.args.get('read_from_primary') == 'true')
 
         except InvalidOperationError:
             return log_error_and_respond(
                 data_set.name, 'invalid collect function',
                 400)
+        except QueryTimeoutError as e:
+            statsd.incr('read.query.timeout', data_set=data_set.name)
+            return log_error_and_respond(
+                data_set.name,
+                '{}; try a shorter time range or a limit'.format(e),
+                503)
 
         data_set_is_published = data_set_config.get('published',
                                                     DEFAULT_DATA_SET_PUBLISHED)
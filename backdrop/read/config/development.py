@@ -1,9 +1,20 @@
 DATABASE_NAME = "backdrop"
 MONGO_HOSTS = ['localhost']
 MONGO_PORT = 27017
+# Queries can be answered by secondaries, picking from those within this
+# many milliseconds of the nearest
+MONGO_QUERY_READ_PREFERENCE = 'secondaryPreferred'
+MONGO_SECONDARY_ACCEPTABLE_LATENCY_MS = 15
+# Seconds a query may take, in the database and putting its results
+# together, unless its data set has a query_time_limit of its own
+QUERY_TIME_LIMIT = 20
 LOG_LEVEL = "DEBUG"
 
 STAGECRAFT_URL = 'http://localhost:3204'
 STAGECRAFT_DATA_SET_QUERY_TOKEN = 'dev-data-set-query-token'
 
 SIGNON_API_USER_TOKEN = 'development-oauth-access-token'
+
+# How often, in seconds, each process works out which data sets are out of
+# date for /_status/data-sets
+DATA_SET_HEALTH_REFRESH_INTERVAL = 60
@@ -5,4 +5,7 @@ LOG_LEVEL = "ERROR"
 
 DATA_SET_RATE_LIMIT = '10000/second'
 
-from development import STAGECRAFT_URL, STAGECRAFT_DATA_SET_QUERY_TOKEN, SIGNON_API_USER_TOKEN
+from development import STAGECRAFT_URL, STAGECRAFT_DATA_SET_QUERY_TOKEN, SIGNON_API_USER_TOKEN, \
+    MONGO_QUERY_READ_PREFERENCE, MONGO_SECONDARY_ACCEPTABLE_LATENCY_MS, QUERY_TIME_LIMIT
+
+DATA_SET_HEALTH_REFRESH_INTERVAL = 0
@@ -0,0 +1,90 @@
+"""
+The report of which data sets are out of date, for /_status/data-sets.
+
+Working the report out means listing every data set in Stagecraft and
+looking up when each was last written to, which is too slow to do on every
+health probe. A DataSetHealth keeps the latest report and, given a refresh
+interval, works out a new one in a background thread that often.
+"""
+import logging
+import os
+import threading
+import time
+
+from ..core.data_set import DataSet
+
+
+logger = logging.getLogger(__name__)
+
+
+def health_report(storage, data_set_configs):
+    """Return the data sets that are out of date, each as a dict"""
+    data_sets = [DataSet(storage, config) for config in data_set_configs]
+
+    storage.batch_last_updated(data_sets)
+
+    return [_data_set_object(data_set) for data_set in data_sets
+            if not data_set.is_recent_enough()]
+
+
+def _data_set_object(data_set):
+    return {
+        "name": data_set.name,
+        "seconds-out-of-date": data_set.get_seconds_out_of_date(),
+        "last-updated": data_set.get_last_updated(),
+        "max-age-expected": data_set.get_max_age_expected(),
+    }
+
+
+class DataSetHealth(object):
+
+    def __init__(self, storage, list_data_sets, interval):
+        """Without an interval the report is worked out every time it is
+        asked for"""
+        self._storage = storage
+        self._list_data_sets = list_data_sets
+        self._interval = interval
+        self._report = None
+        self._lock = threading.Lock()
+        self._thread_pid = None
+
+    def refresh(self):
+        self._report = health_report(self._storage, self._list_data_sets())
+        return self._report
+
+    def report(self):
+        """Return the latest list of out of date data sets"""
+        if not self._interval:
+            return self.refresh()
+
+        self._start()
+        if self._report is None:
+            # Nothing has been worked out yet in this process
+            with self._lock:
+                if self._report is None:
+                    self.refresh()
+        return self._report
+
+    def _start(self):
+        # Threads don't survive the fork into each web server worker, so
+        # each worker process starts its own the first time it's asked
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            thread = threading.Thread(target=self._run)
+            thread.daemon = True
+            thread.start()
+            self._thread_pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            try:
+                with self._lock:
+                    self.refresh()
+            except Exception:
+                # Keep giving out the last report rather than failing the
+                # health check because Stagecraft or the database blipped
+                logger.exception('Could not refresh the data set health')
@@ -55,6 +55,7 @@ class ParameterValidator(Validator):
             'collect',
             'flatten',
             'inclusive',
+            'read_from_primary',
         ])
         super(ParameterValidator, self).__init__(request_args)
 
@@ -354,6 +355,7 @@ def validate_request_args(request_args, raw_queries_allowed=False):
         CollectValidator(request_args),
         BooleanValidator(request_args, param_name='flatten'),
         BooleanValidator(request_args, param_name='inclusive'),
+        BooleanValidator(request_args, param_name='read_from_primary'),
         ParamDependencyValidator(request_args, param_name='inclusive',
                                  depends_on=['start_at', 'end_at']),
     ]
@@ -3,3 +3,39 @@ STAGECRAFT_URL = 'http://localhost:3204'
 STAGECRAFT_OAUTH_TOKEN = 'development-oauth-access-token'
 BACKDROP_READ_URL = 'http://localhost:3038/data'
 BACKDROP_WRITE_URL = 'http://localhost:3039/data'
+
+DATABASE_NAME = 'backdrop'
+MONGO_HOSTS = ['localhost']
+MONGO_PORT = 27017
+
+# Read and write data sets through the storage engine in-process rather
+# than through the read and write APIs.
+TRANSFORMER_DIRECT_STORAGE = False
+
+# Seconds to cache data set, transform and dashboard config from Stagecraft
+STAGECRAFT_CACHE_TTL = 60
+
+# Routine runs triggered by writes and full recomputes requested through
+# the transform endpoint are sent to separate queues, so that workers can
+# be dedicated to each and a large backfill can't hold routine runs up.
+TRANSFORMER_REALTIME_QUEUE = 'celery'
+TRANSFORMER_BACKFILL_QUEUE = 'transformations.backfill'
+
+# Seconds for which a queued transform run suppresses identical runs of the
+# same transform over the same window. 0 disables deduplication.
+TRANSFORMER_DEDUPE_TTL = 600
+
+# Call transform functions in a child process, each call limited
+# to TRANSFORMER_SANDBOX_CPU_SECONDS of CPU time, TRANSFORMER_SANDBOX_TIMEOUT
+# seconds of wall clock time and TRANSFORMER_SANDBOX_MEMORY_MB of address
+# space. The process is replaced after TRANSFORMER_SANDBOX_MAX_TASKS calls.
+TRANSFORMER_SANDBOX = True
+TRANSFORMER_SANDBOX_MAX_TASKS = 50
+TRANSFORMER_SANDBOX_CPU_SECONDS = 300
+TRANSFORMER_SANDBOX_MEMORY_MB = 2048
+TRANSFORMER_SANDBOX_TIMEOUT = 600
+
+# Seconds for which each worker process remembers the input it computed a
+# window of a transform from, skipping routine runs over the same window
+# until that input changes. 0 disables this.
+TRANSFORMER_COMPUTED_WINDOW_TTL = 300
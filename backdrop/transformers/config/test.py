@@ -3,3 +3,24 @@ STAGECRAFT_URL = 'http://stagecraft'
 STAGECRAFT_OAUTH_TOKEN = 'development-oauth-access-token'
 BACKDROP_READ_URL = 'http://backdrop/data'
 BACKDROP_WRITE_URL = 'http://backdrop/data'
+
+DATABASE_NAME = 'backdrop_test'
+MONGO_HOSTS = ['localhost']
+MONGO_PORT = 27017
+
+TRANSFORMER_DIRECT_STORAGE = False
+
+STAGECRAFT_CACHE_TTL = 0
+
+TRANSFORMER_REALTIME_QUEUE = 'celery'
+TRANSFORMER_BACKFILL_QUEUE = 'transformations.backfill'
+
+TRANSFORMER_DEDUPE_TTL = 0
+
+TRANSFORMER_SANDBOX = False
+TRANSFORMER_SANDBOX_MAX_TASKS = 50
+TRANSFORMER_SANDBOX_CPU_SECONDS = 300
+TRANSFORMER_SANDBOX_MEMORY_MB = 2048
+TRANSFORMER_SANDBOX_TIMEOUT = 600
+
+TRANSFORMER_COMPUTED_WINDOW_TTL = 0
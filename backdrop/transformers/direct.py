@@ -0,0 +1,86 @@
+"""
+In-process access to data sets for transform workers.
+
+When TRANSFORMER_DIRECT_STORAGE is set, workers read their input and write
+their output through the storage engine instead of going through the read
+and write APIs over HTTP. DirectDataSet mirrors the parts of the
+performanceplatform client DataSet that the transformers use (`get` and
+`post`), so the two can be used interchangeably.
+"""
+import os
+
+from werkzeug.datastructures import MultiDict
+
+from backdrop.core.data_set import DataSet
+from backdrop.core.errors import ValidationError
+from backdrop.core.query import Query
+from backdrop.core.records import content_hash, to_json_types
+from backdrop.core.storage.mongo import MongoStorageEngine
+from backdrop.read.query import parse_request_args
+
+from .worker import config
+
+
+_storage = None
+_storage_pid = None
+
+
+def get_storage():
+    """Return the storage engine for this worker process, connecting
+    on first use.
+
+    The mongo client isn't safe to use across a fork, so each forked
+    worker process, and each transform sandbox, connects again.
+    """
+    global _storage, _storage_pid
+    if _storage is None or _storage_pid != os.getpid():
+        _storage = MongoStorageEngine.create(
+            config.MONGO_HOSTS,
+            config.MONGO_PORT,
+            config.DATABASE_NAME)
+        _storage_pid = os.getpid()
+    return _storage
+
+
+class DirectDataSet(object):
+
+    def __init__(self, storage, data_set_config):
+        self._data_set = DataSet(storage, data_set_config)
+
+    @classmethod
+    def from_config(cls, data_set_config):
+        return cls(get_storage(), data_set_config)
+
+    @property
+    def name(self):
+        return self._data_set.name
+
+    def get(self, query_parameters={}):
+        query = Query.create(
+            **parse_request_args(MultiDict(query_parameters)))
+
+        return {
+            'data': to_json_types(self._data_set.execute_query(query)),
+        }
+
+    def post(self, records):
+        self._data_set.create_if_not_exists()
+
+        errors = self._data_set.store(records)
+        if errors:
+            raise ValidationError(
+                'Could not store records in {}: {}'.format(
+                    self.name, ', '.join(errors)))
+
+    def changed(self, records):
+        """Return the records that differ from the stored record with the
+        same _id. Records without an _id can't be compared so are always
+        returned."""
+        record_ids = [record['_id'] for record in records if '_id' in record]
+        stored = self._data_set.storage.find_records(
+            self.name, record_ids) if record_ids else {}
+
+        return [record for record in records
+                if record.get('_id') not in stored or
+                content_hash(record) != content_hash(
+                    stored[record['_id']], record.keys())]
@@ -1,13 +1,23 @@
 import importlib
 import logging
+import uuid
 
 from os import getenv
 
+from backdrop import statsd
 from backdrop.core.log_handler import get_log_file_handler
+from backdrop.core.timeutils import parse_time_as_utc
 
 from worker import app, config
+from direct import DirectDataSet, content_hash, get_storage
+from incremental import (ComputedWindows, get_window_last_updated,
+                         changed_periods, changed_windows, get_transform_id,
+                         get_transform_period, save_watermarks, snap_window)
+from sandbox import call_transform_function
+from scheduler import build_transform_graph, get_output_group_and_type
+from stagecraft import get_admin_api
 
-from performanceplatform.client import AdminAPI, DataSet
+from performanceplatform.client import DataSet
 
 GOVUK_ENV = getenv("GOVUK_ENV", "development")
 logger = logging.getLogger()
@@ -15,32 +25,264 @@ logger.setLevel(logging.DEBUG)
 logger.addHandler(
     get_log_file_handler("log/{}.log".format(GOVUK_ENV), logging.DEBUG))
 
+computed_windows = ComputedWindows(config.TRANSFORMER_COMPUTED_WINDOW_TTL)
+
 
 @app.task(ignore_result=True)
-def entrypoint(dataset_id, earliest, latest):
+def entrypoint(dataset_id, earliest, latest, incremental=True):
     """
     For the given parameters, query stagecraft for transformations
     to run, and dispatch tasks to the appropriate workers.
     """
 
-    admin_api = AdminAPI(
-        config.STAGECRAFT_URL,
-        config.STAGECRAFT_OAUTH_TOKEN,
-    )
+    admin_api = get_admin_api()
 
     transforms = admin_api.get_data_set_transforms(dataset_id)
     data_set_config = admin_api.get_data_set_by_name(dataset_id)
 
+    # Writing through the write API triggers the transforms of the output
+    # data set, so only direct storage needs to order downstream steps.
+    if config.TRANSFORMER_DIRECT_STORAGE:
+        return schedule_transforms(admin_api, data_set_config, transforms,
+                                   earliest, latest, incremental)
+
     for transform in transforms:
+        send_run_transform(data_set_config, transform, earliest, latest,
+                           incremental)
+
+
+def get_queue(incremental):
+    """
+    Routine runs triggered by writes go to the realtime queue and full
+    recomputes requested through the transform endpoint to the backfill
+    queue.
+    """
+    if incremental:
+        return config.TRANSFORMER_REALTIME_QUEUE
+    return config.TRANSFORMER_BACKFILL_QUEUE
+
+
+def get_task_key(data_set_config, transform, earliest, latest, incremental):
+    """
+    >>> import datetime
+    >>> print get_task_key({'name': 'foo_bar'}, {'id': 'abc'},
+    ...                    datetime.datetime(2014, 1, 1),
+    ...                    '2014-01-02T00:00:00+00:00', True)
+    run_transform:foo_bar:abc:2014-01-01T00:00:00+00:00:2014-01-02T00:00:00+00:00:incremental
+    """
+    return 'run_transform:{}:{}:{}:{}:{}'.format(
+        data_set_config['name'],
+        get_transform_id(transform),
+        parse_time_as_utc(earliest).isoformat(),
+        parse_time_as_utc(latest).isoformat(),
+        'incremental' if incremental else 'full')
+
+
+def claim_run(data_set_config, transform, earliest, latest, incremental):
+    """
+    Claim the key of a run of a transform until it starts, returning False
+    if an identical run is already queued and hasn't started yet. Without
+    TRANSFORMER_DEDUPE_TTL every run is queued and the key is None.
+    """
+    if not config.TRANSFORMER_DEDUPE_TTL:
+        return None
+
+    earliest, latest = snap_window(transform, earliest, latest)
+    task_key = get_task_key(data_set_config, transform, earliest, latest,
+                            incremental)
+    if not get_storage().claim_task(task_key, config.TRANSFORMER_DEDUPE_TTL):
+        logger.info('Skipping duplicate task {}'.format(task_key))
+        statsd.incr('transformers.dedupe.skipped',
+                    data_set=data_set_config['name'])
+        return False
+    return task_key
+
+
+def send_run_transform(data_set_config, transform, earliest, latest,
+                       incremental):
+    """
+    Queue a run of a transform, unless an identical run is already queued
+    and hasn't started yet.
+    """
+    earliest, latest = snap_window(transform, earliest, latest)
+    kwargs = {'incremental': incremental}
+
+    task_key = claim_run(data_set_config, transform, earliest, latest,
+                         incremental)
+    if task_key is False:
+        return
+    if task_key is not None:
+        kwargs['task_key'] = task_key
+
+    app.send_task(
+        'backdrop.transformers.dispatch.run_transform',
+        args=(data_set_config, transform, earliest, latest),
+        kwargs=kwargs,
+        queue=get_queue(incremental)
+    )
+
+
+def schedule_transforms(admin_api, data_set_config, transforms,
+                        earliest, latest, incremental):
+    """
+    Build the graph of the transforms and everything downstream of them
+    and start the steps that don't depend on any others. Remaining steps
+    are started by run_scheduled_step as their inputs finish.
+    """
+    steps = build_transform_graph(admin_api, data_set_config, transforms)
+    if not steps:
+        return
+
+    storage = get_storage()
+    job_id = uuid.uuid4().hex
+    storage.create_job(job_id, {
+        'type': 'transform-schedule',
+        'data_set': data_set_config['name'],
+        'incremental': incremental,
+        'steps': steps,
+    })
+
+    for index, step in enumerate(steps):
+        if step['pending'] == 0:
+            send_scheduled_step(storage, job_id, index, step,
+                                earliest, latest, incremental)
+
+    return job_id
+
+
+def send_scheduled_step(storage, job_id, index, step, earliest, latest,
+                        incremental):
+    """
+    Queue a step of a scheduled job, unless an identical run is already
+    queued. The step is then skipped along with the steps downstream of
+    it, which the queued run's own job goes on to run.
+    """
+    task_key = claim_run(step['data_set'], step['transform'],
+                         earliest, latest, incremental)
+    if task_key is False:
+        finish_scheduled_step(storage, job_id, index, 'skipped', None)
+        return
+
+    app.send_task(
+        'backdrop.transformers.dispatch.run_scheduled_step',
+        args=(job_id, index, earliest, latest),
+        kwargs={'task_key': task_key},
+        queue=get_queue(incremental)
+    )
+
+
+@app.task(ignore_result=True)
+def run_scheduled_step(job_id, index, earliest, latest, task_key=None):
+    """
+    `task_key` is the deduplication claim taken when the step was queued,
+    released by run_transform as soon as it starts.
+    """
+    storage = get_storage()
+    job = storage.get_job(job_id)
+    if job is None:
+        logger.warning('Job {} has expired, not running step {}'.format(
+            job_id, index))
+        if task_key is not None:
+            storage.release_task(task_key)
+        return
+    step = job['steps'][index]
+
+    try:
+        output_window = run_transform(step['data_set'], step['transform'],
+                                      earliest, latest,
+                                      incremental=job['incremental'],
+                                      trigger_downstream=False,
+                                      task_key=task_key)
+    except Exception as e:
+        logger.exception(e)
+        finish_scheduled_step(storage, job_id, index, 'failed', None)
+    else:
+        finish_scheduled_step(storage, job_id, index, 'done', output_window)
+
+
+def finish_scheduled_step(storage, job_id, index, status, output_window):
+    """
+    Record the outcome of a step and start any children for which this
+    was the last parent to finish. A child runs over the range covered by
+    its parents' output, and is skipped if a parent failed or none of them
+    wrote anything.
+    """
+    job = storage.update_job(job_id, **{
+        'steps.{}.status'.format(index): status,
+        'steps.{}.output_window'.format(index): output_window,
+    })
+    if job is None:
+        logger.warning('Job {} has expired'.format(job_id))
+        return
+
+    for child in job['steps'][index]['children']:
+        job = storage.update_job(
+            job_id, increment={'steps.{}.pending'.format(child): -1})
+        if job['steps'][child]['pending'] > 0:
+            continue
+
+        parents = [job['steps'][parent]
+                   for parent in job['steps'][child]['parents']]
+        windows = [map(parse_time_as_utc, parent['output_window'])
+                   for parent in parents if parent['output_window']]
+
+        if windows and all(parent['status'] == 'done'
+                           for parent in parents):
+            send_scheduled_step(storage, job_id, child, job['steps'][child],
+                                min(start for start, _ in windows),
+                                max(end for _, end in windows),
+                                job['incremental'])
+        else:
+            finish_scheduled_step(storage, job_id, child, 'skipped', None)
+
+
+@app.task(ignore_result=True)
+def run_backfill_chunk(job_id, index):
+    """
+    Run every transform for a data set over one chunk of a backfill job.
+
+    Once the chunk is done the next pending chunk is claimed and
+    dispatched, so no more chunks run at once than were initially sent.
+    """
+    storage = get_storage()
+    job = storage.get_job(job_id)
+    if job is None:
+        logger.warning('Job {} has expired, not running chunk {}'.format(
+            job_id, index))
+        return
+    earliest, latest = map(parse_time_as_utc, job['chunks'][index])
+
+    admin_api = get_admin_api()
+
+    try:
+        data_set_config = admin_api.get_data_set_by_name(job['data_set'])
+        for transform in admin_api.get_data_set_transforms(job['data_set']):
+            run_transform(data_set_config, transform, earliest, latest,
+                          incremental=False)
+    except Exception as e:
+        logger.exception(e)
+        storage.update_job(
+            job_id,
+            increment={'failed': 1},
+            append={'errors': {'chunk': index, 'message': repr(e)}})
+    else:
+        storage.update_job(job_id, increment={'completed': 1})
+
+    job = storage.update_job(job_id, increment={'next_chunk': 1})
+    next_index = job['next_chunk'] - 1
+    if next_index < job['total']:
         app.send_task(
-            'backdrop.transformers.dispatch.run_transform',
-            args=(data_set_config, transform, earliest, latest)
+            'backdrop.transformers.dispatch.run_backfill_chunk',
+            args=(job_id, next_index),
+            queue=config.TRANSFORMER_BACKFILL_QUEUE
         )
 
 
 def get_query_parameters(transform, earliest, latest):
-    query_parameters = transform.get('query-parameters', {})
+    query_parameters = dict(transform.get('query-parameters', {}))
     query_parameters['flatten'] = 'true'
+    # The input has just been written, which secondaries may not have seen
+    query_parameters['read_from_primary'] = 'true'
 
     if earliest == latest:
         if 'period' in query_parameters:
@@ -67,14 +309,10 @@ def get_transform_function(transform):
 
 
 def get_or_get_and_create_output_dataset(transform, input_dataset):
-    output_group = transform['output'].get(
-        'data-group', input_dataset['data_group'])
-    output_type = transform['output']['data-type']
+    output_group, output_type = get_output_group_and_type(
+        transform, input_dataset)
 
-    admin_api = AdminAPI(
-        config.STAGECRAFT_URL,
-        config.STAGECRAFT_OAUTH_TOKEN,
-    )
+    admin_api = get_admin_api()
     output_data_set_config = admin_api.get_data_set(output_group, output_type)
     if not output_data_set_config:
         data_set_config = dict(input_dataset.items() + {
@@ -84,6 +322,9 @@ def get_or_get_and_create_output_dataset(transform, input_dataset):
         del(data_set_config['name'])
         output_data_set_config = admin_api.create_data_set(data_set_config)
 
+    if config.TRANSFORMER_DIRECT_STORAGE:
+        return DirectDataSet.from_config(output_data_set_config)
+
     return DataSet.from_group_and_type(
         config.BACKDROP_WRITE_URL,
         output_group,
@@ -92,24 +333,167 @@ def get_or_get_and_create_output_dataset(transform, input_dataset):
     )
 
 
-@app.task(ignore_result=True)
-def run_transform(data_set_config, transform, earliest, latest):
-    data_set = DataSet.from_group_and_type(
+def get_input_data_set(data_set_config):
+    if config.TRANSFORMER_DIRECT_STORAGE:
+        return DirectDataSet.from_config(data_set_config)
+
+    return DataSet.from_group_and_type(
         config.BACKDROP_READ_URL,
         data_set_config['data_group'],
         data_set_config['data_type'],
     )
 
+
+def get_changed_records(output_data_set, records):
+    """Return the records that differ from those already stored, so that
+    unchanged output is neither rewritten nor triggers downstream
+    transforms."""
+    changed = output_data_set.changed(records)
+
+    statsd.incr('transformers.output.written', len(changed),
+                data_set=output_data_set.name)
+    statsd.incr('transformers.output.unchanged', len(records) - len(changed),
+                data_set=output_data_set.name)
+
+    return changed
+
+
+def get_output_window(records):
+    """Return the earliest and latest timestamps in records, or None if
+    none have a timestamp."""
+    timestamps = [parse_time_as_utc(record['_timestamp'])
+                  for record in records if '_timestamp' in record]
+
+    if timestamps:
+        return min(timestamps), max(timestamps)
+
+
+def merge_windows(windows):
+    windows = filter(None, windows)
+    if windows:
+        return (min(start for start, _ in windows),
+                max(end for _, end in windows))
+
+
+def trigger_downstream_transforms(output_data_set, output_window):
+    """
+    Writes through the write API trigger the transforms of the data set
+    being written to. Writing directly to storage bypasses that, so the
+    equivalent entrypoint task is sent here instead.
+    """
+    if output_window:
+        app.send_task(
+            'backdrop.transformers.dispatch.entrypoint',
+            args=(output_data_set.name,) + output_window
+        )
+
+
+@app.task(ignore_result=True)
+def run_transform(data_set_config, transform, earliest, latest,
+                  incremental=True, trigger_downstream=True, task_key=None):
+    """
+    Run a transform over the input between earliest and latest and return
+    the range of timestamps written to the output.
+
+    When reading directly from storage, only the periods whose input has
+    changed since the transform last processed them are recomputed, unless
+    `incremental` is False.
+
+    `task_key` is the deduplication claim taken when the run was queued.
+    It is released as soon as the run starts, so that changes made while
+    it runs queue another run.
+
+    The window is widened to whole periods of the transform's `period`
+    query parameter.
+    """
+    if task_key is not None:
+        get_storage().release_task(task_key)
+
+    earliest, latest = snap_window(transform, earliest, latest)
+
+    if not config.TRANSFORMER_DIRECT_STORAGE:
+        return transform_window(data_set_config, transform, earliest, latest,
+                                trigger_downstream, incremental=incremental)
+
+    storage = get_storage()
+    last_updated = get_window_last_updated(
+        storage, transform, data_set_config, earliest, latest)
+
+    if incremental:
+        processed = changed_periods(
+            storage, transform, data_set_config, last_updated)
+        if not processed:
+            logger.info('Skipping transform of {}: no changes'.format(
+                data_set_config['name']))
+            return
+        windows = changed_windows(
+            get_transform_period(transform), processed, earliest, latest)
+    else:
+        processed = last_updated
+        windows = [(earliest, latest)]
+
+    output_windows = [
+        transform_window(data_set_config, transform,
+                         window_earliest, window_latest, trigger_downstream,
+                         incremental=incremental)
+        for window_earliest, window_latest in windows]
+
+    save_watermarks(storage, transform, data_set_config, processed)
+
+    return merge_windows(output_windows)
+
+
+def get_window_key(data_set_config, transform, earliest, latest):
+    return content_hash({
+        'data_set': data_set_config.get('name'),
+        'transform': transform,
+        'earliest': earliest,
+        'latest': latest,
+    })
+
+
+def transform_window(data_set_config, transform, earliest, latest,
+                     trigger_downstream=True, incremental=True):
+    """
+    Transform the input between earliest and latest and write the output.
+
+    Incremental runs are skipped if this process computed the same window
+    from the same input within the last TRANSFORMER_COMPUTED_WINDOW_TTL
+    seconds.
+    """
+    data_set = get_input_data_set(data_set_config)
+
     data = data_set.get(
         query_parameters=get_query_parameters(transform, earliest, latest)
     )
 
+    window_key = get_window_key(data_set_config, transform, earliest, latest)
+    input_version = content_hash({'data': data['data']})
+    if incremental and computed_windows.is_current(window_key, input_version):
+        logger.info('Skipping transform of {}: already computed'.format(
+            data_set_config.get('name')))
+        statsd.incr('transformers.computed_window.skipped',
+                    data_set=data_set_config.get('name', 'unknown'))
+        return
+
     transform_function = get_transform_function(transform)
-    transformed_data = transform_function(data['data'],
-                                          transform,
-                                          data_set_config)
+    transformed_data = call_transform_function(transform_function,
+                                               data['data'],
+                                               transform,
+                                               data_set_config)
 
     output_data_set = get_or_get_and_create_output_dataset(
         transform,
         data_set_config)
+    if config.TRANSFORMER_DIRECT_STORAGE:
+        transformed_data = get_changed_records(output_data_set,
+                                               transformed_data)
     output_data_set.post(transformed_data)
+
+    output_window = get_output_window(transformed_data)
+    if config.TRANSFORMER_DIRECT_STORAGE and trigger_downstream:
+        trigger_downstream_transforms(output_data_set, output_window)
+
+    computed_windows.record(window_key, input_version)
+
+    return output_window
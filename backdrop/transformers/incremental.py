@@ -0,0 +1,176 @@
+"""
+Incremental transforms.
+
+For each transform and input data set we keep a watermark per period: the
+latest `_updated_at` of the input records in that period when the transform
+last ran successfully. Comparing those against the current state of the
+input tells us which periods actually need recomputing.
+
+Windows are snapped to the boundaries of the periods a transform reads, so
+writes landing in the same periods produce the same window, and each worker
+process remembers the input it recently computed each window from.
+"""
+import time
+
+from backdrop.core.timeseries import parse_period, DAY
+
+
+def get_transform_id(transform):
+    """
+    >>> get_transform_id({'id': 'abc-123'})
+    'abc-123'
+    >>> get_transform_id({
+    ...     'type': {'function': 'backdrop.transformers.tasks.rate.compute'},
+    ...     'output': {'data-group': 'group', 'data-type': 'rate'}})
+    'backdrop.transformers.tasks.rate.compute:group:rate'
+    """
+    if 'id' in transform:
+        return transform['id']
+
+    return ':'.join([
+        transform['type']['function'],
+        transform['output'].get('data-group', ''),
+        transform['output']['data-type'],
+    ])
+
+
+def get_transform_period(transform):
+    """Return the period the transform reads its input in, or a day for
+    transforms reading raw data.
+
+    >>> get_transform_period({'query-parameters': {'period': 'week'}}).name
+    'week'
+    >>> get_transform_period({}).name
+    'day'
+    """
+    period_name = transform.get('query-parameters', {}).get('period')
+    return parse_period(period_name) or DAY
+
+
+def snap_window(transform, earliest, latest):
+    """Widen a window out to the boundaries of the periods the transform
+    reads its input in. Windows of transforms reading raw data are left
+    as they are.
+
+    >>> from datetime import datetime
+    >>> transform = {'query-parameters': {'period': 'week'}}
+    >>> snap_window(transform, datetime(2014, 12, 3, 12), datetime(2014, 12, 9))
+    ...     # doctest: +NORMALIZE_WHITESPACE
+    (datetime.datetime(2014, 12, 1, 0, 0),
+     datetime.datetime(2014, 12, 15, 0, 0))
+    >>> snap_window(transform, datetime(2014, 12, 8), datetime(2014, 12, 8))
+    ...     # doctest: +NORMALIZE_WHITESPACE
+    (datetime.datetime(2014, 12, 8, 0, 0),
+     datetime.datetime(2014, 12, 15, 0, 0))
+    >>> snap_window({}, datetime(2014, 12, 3, 12), datetime(2014, 12, 9))
+    ...     # doctest: +NORMALIZE_WHITESPACE
+    (datetime.datetime(2014, 12, 3, 12, 0),
+     datetime.datetime(2014, 12, 9, 0, 0))
+    """
+    period_name = transform.get('query-parameters', {}).get('period')
+    period = parse_period(period_name)
+    if period is None:
+        return earliest, latest
+
+    start = period.start(earliest)
+    end = period.end(latest)
+    if end <= start:
+        # A single instant on a boundary covers the period it starts
+        end = start + period.delta
+
+    return start, end
+
+
+class ComputedWindows(object):
+    """
+    The version of the input each window of a transform was last computed
+    from in this process, kept for `ttl` seconds so that a window isn't
+    recomputed from input that hasn't changed since.
+
+    >>> windows = ComputedWindows(60, clock=lambda: 0)
+    >>> windows.record('window', 'v1')
+    >>> windows.is_current('window', 'v1'), windows.is_current('window', 'v2')
+    (True, False)
+    """
+    MAX_SIZE = 1000
+
+    def __init__(self, ttl, clock=time.time):
+        self._ttl = ttl
+        self._clock = clock
+        self._versions = {}
+
+    def is_current(self, key, version):
+        entry = self._versions.get(key)
+        return (entry is not None and entry[0] > self._clock()
+                and entry[1] == version)
+
+    def record(self, key, version):
+        if self._ttl <= 0:
+            return
+
+        now = self._clock()
+        if len(self._versions) >= self.MAX_SIZE:
+            self._versions = dict(
+                (key, entry) for key, entry in self._versions.items()
+                if entry[0] > now)
+        self._versions[key] = (now + self._ttl, version)
+
+
+def get_window_last_updated(storage, transform, data_set_config,
+                            earliest, latest):
+    """Return the latest input `_updated_at` for each period overlapping
+    the window, keyed by the start of the period."""
+    period = get_transform_period(transform)
+
+    return storage.get_period_last_updated(
+        data_set_config['name'],
+        period,
+        period.start(earliest),
+        period.start(latest) + period.delta)
+
+
+def changed_periods(storage, transform, data_set_config, last_updated):
+    """Filter `last_updated` down to the periods whose input has changed
+    since they were last processed."""
+    watermarks = storage.get_transform_watermarks(
+        get_transform_id(transform), data_set_config['name'])
+
+    return dict(
+        (start_at, updated_at)
+        for start_at, updated_at in last_updated.items()
+        if start_at not in watermarks or updated_at > watermarks[start_at])
+
+
+def changed_windows(period, changed, earliest, latest):
+    """Split the changed periods into contiguous windows, clamped to the
+    original window.
+
+    >>> from datetime import datetime
+    >>> from backdrop.core.timeseries import WEEK
+    >>> changed = {
+    ...     datetime(2014, 12, 1): None,
+    ...     datetime(2014, 12, 8): None,
+    ...     datetime(2014, 12, 22): None}
+    >>> changed_windows(
+    ...     WEEK, changed, datetime(2014, 12, 1), datetime(2015, 1, 5))
+    ...     # doctest: +NORMALIZE_WHITESPACE
+    [(datetime.datetime(2014, 12, 1, 0, 0),
+      datetime.datetime(2014, 12, 15, 0, 0)),
+     (datetime.datetime(2014, 12, 22, 0, 0),
+      datetime.datetime(2014, 12, 29, 0, 0))]
+    """
+    windows = []
+    for start_at in sorted(changed.keys()):
+        end_at = start_at + period.delta
+        if windows and windows[-1][1] == start_at:
+            windows[-1] = (windows[-1][0], end_at)
+        else:
+            windows.append((start_at, end_at))
+
+    return [(max(earliest, start_at), min(latest, end_at))
+            for start_at, end_at in windows]
+
+
+def save_watermarks(storage, transform, data_set_config, processed):
+    storage.set_transform_watermarks(
+        get_transform_id(transform), data_set_config['name'], processed)
@@ -0,0 +1,207 @@
+"""
+Isolated execution of transform functions.
+
+Transform functions are named in Stagecraft config and run over whatever
+a data set holds. When TRANSFORMER_SANDBOX is set they are called in a
+child process rather than in the Celery worker itself. Each call is
+limited in CPU time, memory and wall clock time, and the child is replaced
+after a number of calls so memory it holds on to is given back.
+
+Celery worker processes run one task at a time, so each has a single
+child talking to it over a pipe rather than a pool sharing queues.
+"""
+import math
+import os
+import resource
+import signal
+import time
+
+import billiard
+
+from billiard.exceptions import TimeLimitExceeded, WorkerLostError
+
+from backdrop import statsd
+
+from .worker import config
+
+
+class CPUTimeLimitExceeded(Exception):
+    pass
+
+
+def _cpu_time_limit_exceeded(signum, frame):
+    raise CPUTimeLimitExceeded()
+
+
+def _cpu_seconds_used():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _reset_peak_memory():
+    """Start measuring the peak memory use of the process again, returning
+    False where the kernel doesn't allow it"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except IOError:
+        return False
+    return True
+
+
+def _peak_memory():
+    """Return the peak resident memory of the process in bytes since it was
+    last reset"""
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                # Given in kilobytes
+                return int(line.split()[1]) * 1024
+
+
+def _call(function, cpu_seconds, args):
+    """Call function and return its result along with how long it took and
+    the peak memory use of the process during the call in bytes, or None
+    if that can't be measured.
+
+    The process makes many calls, so ru_maxrss would give the peak of the
+    heaviest call so far rather than this one.
+    """
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_CPU)
+    if cpu_seconds:
+        # CPU time is counted over the life of the process, which makes
+        # many calls
+        resource.setrlimit(
+            resource.RLIMIT_CPU,
+            (int(math.ceil(_cpu_seconds_used())) + cpu_seconds, hard_limit))
+
+    measure_memory = _reset_peak_memory()
+    start = time.time()
+    try:
+        result = function(*args)
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (hard_limit, hard_limit))
+    runtime = time.time() - start
+
+    peak_memory = _peak_memory() if measure_memory else None
+
+    return result, runtime, peak_memory
+
+
+def _serve(connection, max_tasks, cpu_seconds, memory_bytes):
+    """Run calls sent over connection in the child process until
+    max_tasks have been made."""
+    signal.signal(signal.SIGXCPU, _cpu_time_limit_exceeded)
+    if memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+    for _ in range(max_tasks):
+        function, args = connection.recv()
+        try:
+            connection.send((True, _call(function, cpu_seconds, args)))
+        except Exception as e:
+            try:
+                connection.send((False, e))
+            except Exception:
+                # The exception itself couldn't be sent back
+                connection.send((False, Exception(repr(e))))
+
+
+class Sandbox(object):
+
+    def __init__(self, max_tasks, cpu_seconds, memory_mb, timeout):
+        self._max_tasks = max_tasks
+        self._cpu_seconds = cpu_seconds
+        self._memory_bytes = memory_mb * 1024 * 1024
+        self._timeout = timeout
+        self._process = None
+
+    def _start(self):
+        self._connection, child_connection = billiard.Pipe()
+        self._process = billiard.Process(
+            target=_serve,
+            args=(child_connection, self._max_tasks, self._cpu_seconds,
+                  self._memory_bytes))
+        self._process.daemon = True
+        self._process.start()
+        child_connection.close()
+        self._tasks = 0
+
+    def terminate(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._connection.close()
+            self._process = None
+
+    def run(self, function, *args):
+        """Call a module level function in the child process and return
+        its result, runtime and peak memory during the call.
+
+        Raises CPUTimeLimitExceeded, MemoryError or TimeLimitExceeded if
+        the call goes over its limits.
+        """
+        if self._process is None or not self._process.is_alive():
+            self._start()
+
+        self._connection.send((function, args))
+        if not self._connection.poll(self._timeout):
+            self.terminate()
+            raise TimeLimitExceeded(self._timeout)
+        try:
+            succeeded, value = self._connection.recv()
+        except EOFError:
+            self.terminate()
+            raise WorkerLostError('Transform process exited unexpectedly')
+
+        self._tasks += 1
+        if self._tasks >= self._max_tasks:
+            self.terminate()
+
+        if not succeeded:
+            raise value
+        return value
+
+
+_sandbox = None
+_sandbox_pid = None
+
+
+def get_sandbox():
+    """Return the sandbox for this worker process.
+
+    Like the admin API client, each forked worker process has its own.
+    """
+    global _sandbox, _sandbox_pid
+    if _sandbox is None or _sandbox_pid != os.getpid():
+        _sandbox = Sandbox(
+            config.TRANSFORMER_SANDBOX_MAX_TASKS,
+            config.TRANSFORMER_SANDBOX_CPU_SECONDS,
+            config.TRANSFORMER_SANDBOX_MEMORY_MB,
+            config.TRANSFORMER_SANDBOX_TIMEOUT,
+        )
+        _sandbox_pid = os.getpid()
+    return _sandbox
+
+
+def call_transform_function(function, data, transform, data_set_config):
+    """Call a transform function, in the sandbox if it is enabled, and
+    record its runtime and peak memory use."""
+    stat = 'transformers.{}'.format(transform['type']['function'])
+    data_set = data_set_config.get('name', 'unknown')
+
+    if config.TRANSFORMER_SANDBOX:
+        result, runtime, peak_memory = get_sandbox().run(
+            function, data, transform, data_set_config)
+        if peak_memory is not None:
+            statsd.gauge(stat + '.peak_memory', peak_memory,
+                         data_set=data_set)
+    else:
+        start = time.time()
+        result = function(data, transform, data_set_config)
+        runtime = time.time() - start
+
+    statsd.timing(stat + '.runtime', int(runtime * 1000),
+                  data_set=data_set)
+
+    return result
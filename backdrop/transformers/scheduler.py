@@ -0,0 +1,93 @@
+"""
+Dependency ordering of transforms.
+
+A transform's output data set can itself have transforms, so the
+transforms triggered by a write form a graph. Each step in the graph is a
+transform applied to an input data set; a step depends on the steps whose
+output is its input.
+"""
+
+
+def get_output_group_and_type(transform, input_data_set_config):
+    """
+    >>> get_output_group_and_type(
+    ...     {'output': {'data-group': 'other', 'data-type': 'rate'}},
+    ...     {'data_group': 'group'})
+    ('other', 'rate')
+    >>> get_output_group_and_type(
+    ...     {'output': {'data-type': 'rate'}}, {'data_group': 'group'})
+    ('group', 'rate')
+    """
+    output_group = transform['output'].get(
+        'data-group', input_data_set_config['data_group'])
+    output_type = transform['output']['data-type']
+
+    return output_group, output_type
+
+
+def _reaches(steps, start, target):
+    """Whether target is start or downstream of it"""
+    pending = [start]
+    seen = set()
+    while pending:
+        index = pending.pop()
+        if index == target:
+            return True
+        if index not in seen:
+            seen.add(index)
+            pending.extend(steps[index]['children'])
+    return False
+
+
+def build_transform_graph(admin_api, data_set_config, transforms):
+    """
+    Return the steps needed to run the given transforms of a data set and
+    every transform downstream of them.
+
+    Each step holds the input data set config, the transform, the indexes
+    of its parent and child steps and the number of parents still to
+    finish before it can run. Edges that would form a cycle are dropped.
+    """
+    steps = []
+    steps_by_data_set = {}
+    queue = [(data_set_config, transforms, None)]
+
+    while queue:
+        config, config_transforms, parent = queue.pop(0)
+
+        expand = config['name'] not in steps_by_data_set
+        if expand:
+            if config_transforms is None:
+                config_transforms = admin_api.get_data_set_transforms(
+                    config['name'])
+            steps_by_data_set[config['name']] = []
+            for transform in config_transforms:
+                steps_by_data_set[config['name']].append(len(steps))
+                steps.append({
+                    'data_set': config,
+                    'transform': transform,
+                    'parents': [],
+                    'children': [],
+                })
+
+        if parent is not None:
+            for index in steps_by_data_set[config['name']]:
+                if not _reaches(steps, index, parent):
+                    steps[parent]['children'].append(index)
+                    steps[index]['parents'].append(parent)
+
+        if expand:
+            for index in steps_by_data_set[config['name']]:
+                output_config = admin_api.get_data_set(
+                    *get_output_group_and_type(steps[index]['transform'],
+                                               config))
+                # Output data sets that don't exist yet have no transforms
+                if output_config:
+                    queue.append((output_config, None, index))
+
+    for step in steps:
+        step['pending'] = len(step['parents'])
+        step['status'] = 'waiting'
+        step['output_window'] = None
+
+    return steps
@@ -0,0 +1,172 @@
+"""
+Stagecraft access for transformer workers.
+
+Each worker process shares one admin API client, which keeps its HTTP
+connections alive in a requests session and caches the data set, transform
+and dashboard config it reads for STAGECRAFT_CACHE_TTL seconds.
+"""
+import copy
+import os
+import threading
+import time
+
+import requests
+
+from performanceplatform.client import AdminAPI
+from performanceplatform.client import base
+
+from backdrop import statsd
+
+from .worker import config
+
+
+class _SessionRequests(object):
+
+    """Stands in for the requests module in the performanceplatform client,
+    sending its requests through the session of the PooledAdminAPI making
+    them on this thread, if any"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    def request(self, *args, **kwargs):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            return requests.request(*args, **kwargs)
+        return session.request(*args, **kwargs)
+
+    def using(self, session):
+        return _UsingSession(self._local, session)
+
+
+class _UsingSession(object):
+
+    def __init__(self, local, session):
+        self._local = local
+        self._session = session
+
+    def __enter__(self):
+        self._previous = getattr(self._local, 'session', None)
+        self._local.session = self._session
+
+    def __exit__(self, *exc_info):
+        self._local.session = self._previous
+
+
+_session_requests = _SessionRequests()
+base.requests = _session_requests
+
+
+class TTLCache(object):
+
+    def __init__(self, ttl, clock=time.time):
+        self._ttl = ttl
+        self._clock = clock
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+    def get(self, key, fetch):
+        """Return the cached value for key, calling fetch to get it if it
+        is missing or has expired. Callers get their own copy of the value
+        so they are free to modify it."""
+        now = self._clock()
+
+        if key in self._entries and self._entries[key][0] > now:
+            self.hits += 1
+            statsd.incr('transformers.stagecraft.cache.hit')
+            return copy.deepcopy(self._entries[key][1])
+
+        self.misses += 1
+        statsd.incr('transformers.stagecraft.cache.miss')
+        value = fetch()
+        if self._ttl > 0:
+            self._entries[key] = (now + self._ttl, value)
+
+        return copy.deepcopy(value)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+
+class PooledAdminAPI(AdminAPI):
+
+    """AdminAPI that reuses connections across requests"""
+
+    def __init__(self, *args, **kwargs):
+        super(PooledAdminAPI, self).__init__(*args, **kwargs)
+        self._session = requests.Session()
+
+    def _request(self, *args, **kwargs):
+        with _session_requests.using(self._session):
+            return super(PooledAdminAPI, self)._request(*args, **kwargs)
+
+
+class CachedAdminAPI(PooledAdminAPI):
+
+    """PooledAdminAPI that caches the config transformers read"""
+
+    def __init__(self, base_url, token, ttl, **kwargs):
+        super(CachedAdminAPI, self).__init__(base_url, token, **kwargs)
+        self.cache = TTLCache(ttl)
+
+    def get_data_set(self, data_group, data_type):
+        return self.cache.get(
+            ('data_set', data_group, data_type),
+            lambda: super(CachedAdminAPI, self).get_data_set(
+                data_group, data_type))
+
+    def get_data_set_by_name(self, name):
+        return self.cache.get(
+            ('data_set_by_name', name),
+            lambda: super(CachedAdminAPI, self).get_data_set_by_name(name))
+
+    def get_data_set_transforms(self, name):
+        return self.cache.get(
+            ('data_set_transforms', name),
+            lambda: super(CachedAdminAPI, self).get_data_set_transforms(name))
+
+    def get_data_set_dashboard(self, name):
+        return self.cache.get(
+            ('data_set_dashboard', name),
+            lambda: super(CachedAdminAPI, self).get_data_set_dashboard(name))
+
+    def list_data_sets(self):
+        return self.cache.get(
+            ('data_sets',),
+            lambda: super(CachedAdminAPI, self).list_data_sets())
+
+    def create_data_set(self, data):
+        data_set = super(CachedAdminAPI, self).create_data_set(data)
+        self.cache.invalidate(
+            ('data_set', data['data_group'], data['data_type']))
+        return data_set
+
+
+_admin_api = None
+_admin_api_pid = None
+
+
+def get_admin_api():
+    """Return the admin API client for this worker process.
+
+    Celery forks its workers, so a client is created per process rather
+    than sharing one connection pool between them.
+    """
+    global _admin_api, _admin_api_pid
+    if _admin_api is None or _admin_api_pid != os.getpid():
+        _admin_api = CachedAdminAPI(
+            config.STAGECRAFT_URL,
+            config.STAGECRAFT_OAUTH_TOKEN,
+            config.STAGECRAFT_CACHE_TTL,
+        )
+        _admin_api_pid = os.getpid()
+    return _admin_api
@@ -0,0 +1,100 @@
+"""
+Column oriented helpers for transform tasks.
+
+Query results arrive as a list of rows. Transforms that classify and sum
+them read each key they need out into a column once, run their regular
+expressions once per distinct value rather than once per row, and group
+rows as lists of row indexes rather than lists of rows.
+"""
+from collections import OrderedDict
+
+
+class Table(object):
+
+    def __init__(self, data, keys):
+        self.length = len(data)
+        self.columns = dict(
+            (key, [datum.get(key) for datum in data]) for key in keys)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        return self.columns[key]
+
+    def rows(self, keys):
+        """
+        >>> Table([{'a': 1, 'b': 2}, {'a': 3}], ['a', 'b']).rows(['a', 'b'])
+        [(1, 2), (3, None)]
+        """
+        return zip(*[self.columns[key] for key in keys])
+
+    def group(self, keys):
+        """Return the row indexes for each distinct combination of values
+        of the given keys, in the order the combinations first appear.
+
+        >>> table = Table([{'a': 'x'}, {'a': 'y'}, {'a': 'x'}], ['a'])
+        >>> table.group(['a']).items()
+        [(('x',), [0, 2]), (('y',), [1])]
+        """
+        groups = OrderedDict()
+        for index, values in enumerate(self.rows(keys)):
+            try:
+                groups[values].append(index)
+            except KeyError:
+                groups[values] = [index]
+
+        return groups
+
+
+def classify(values, classifier):
+    """Apply classifier to each value, calling it once per distinct value.
+
+    >>> calls = []
+    >>> classify(['a', 'b', 'a'], lambda value: calls.append(value) or value)
+    ['a', 'b', 'a']
+    >>> calls
+    ['a', 'b']
+    """
+    classified = {}
+    result = []
+    for value in values:
+        try:
+            result.append(classified[value])
+        except KeyError:
+            classified[value] = classifier(value)
+            result.append(classified[value])
+        except TypeError:
+            # Unhashable values can't be shared so are classified each time
+            result.append(classifier(value))
+
+    return result
+
+
+def matches(values, pattern):
+    """
+    Whether each value is present and matched by the compiled pattern.
+
+    >>> import re
+    >>> matches(['digital', 'non-digital', None, 'digital'],
+    ...         re.compile('^digital$'))
+    [True, False, False, True]
+    """
+    return classify(
+        values, lambda value: bool(value) and bool(pattern.search(value)))
+
+
+def sum_where(values, indexes, mask):
+    """
+    Sum the values at indexes selected by mask, or None if none are.
+
+    >>> sum_where([1, 2, 3], [0, 1], [True, True, False])
+    3
+    >>> sum_where([1, 2, 3], [0, 1], [False, False, True]) is None
+    True
+    """
+    selected = [values[index] for index in indexes if mask[index]]
+    if not selected:
+        return None
+
+    return reduce(lambda total, value: total + value, selected, 0)
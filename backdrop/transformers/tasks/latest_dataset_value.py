@@ -1,9 +1,11 @@
 import string
 
 from .util import encode_id
+from ..direct import DirectDataSet
+from ..stagecraft import get_admin_api
 from ..worker import config
 
-from performanceplatform.client import AdminAPI, DataSet
+from performanceplatform.client import DataSet
 
 data_type_to_value_mappings = {
     'completion-rate': 'rate',
@@ -20,6 +22,7 @@ def get_read_params(transform_params, latest_timestamp):
     else:
         read_params['start_at'] = latest_timestamp
     read_params['sort_by'] = '_timestamp:descending'
+    read_params['read_from_primary'] = 'true'
     return read_params
 
 
@@ -28,11 +31,14 @@ def is_latest_data(data_set_config, transform, latest_datum):
     Read from backdrop to determine if new data is the latest.
     """
 
-    data_set = DataSet.from_group_and_type(
-        config.BACKDROP_READ_URL,
-        data_set_config['data_group'],
-        data_set_config['data_type']
-    )
+    if config.TRANSFORMER_DIRECT_STORAGE:
+        data_set = DirectDataSet.from_config(data_set_config)
+    else:
+        data_set = DataSet.from_group_and_type(
+            config.BACKDROP_READ_URL,
+            data_set_config['data_group'],
+            data_set_config['data_type']
+        )
 
     transform_params = transform.get('query_parameters', {})
     read_params = get_read_params(transform_params, latest_datum['_timestamp'])
@@ -63,7 +69,7 @@ def compute(new_data, transform, data_set_config):
 
     # A dataset may be present on multiple dashboards. Produce a
     # latest value for each published dashboard, keyed by slug.
-    admin_api = AdminAPI(config.STAGECRAFT_URL, config.STAGECRAFT_OAUTH_TOKEN)
+    admin_api = get_admin_api()
     latest_values = []
     configs = admin_api.get_data_set_dashboard(data_set_config['name'])
 
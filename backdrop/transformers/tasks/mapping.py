@@ -1,6 +1,8 @@
 import re
 
-from .util import group_by
+from collections import OrderedDict
+
+from .columnar import Table, classify
 
 
 def compile_mappings(mappings):
@@ -20,43 +22,36 @@ def match_mapping(values, mappings):
     return None
 
 
-def map_data(grouped_data, mappings, mapped_attribute, other_mapping, value_attribute):
-    mapped_data = {}
-
-    for grouped_values, data in grouped_data.iteritems():
-        start_at = grouped_values[0]
-        end_at = grouped_values[1]
-        mapping_values = grouped_values[2:]
-
-        mapping = match_mapping(mapping_values, mappings) or other_mapping
-
-        if mapping is not None:
-            period_mapping_key = (start_at, end_at, mapping)
-            summed_value = reduce(
-                lambda sum, datum: sum + datum[value_attribute], data, 0)
-
-            if period_mapping_key in mapped_data:
-                mapped_data[period_mapping_key][
-                    value_attribute] += summed_value
-            else:
-                mapped_data[period_mapping_key] = {
-                    "_start_at": start_at,
-                    "_end_at": end_at,
-                    mapped_attribute: mapping,
-                    value_attribute: summed_value,
-                }
-
-    return mapped_data.values()
-
-
 def compute(data, options):
-    grouped = group_by(
-        ['_start_at', '_end_at'] + options['mapping-keys'], data)
+    mapping_keys = options['mapping-keys']
+    mapped_attribute = options['mapped-attribute']
+    other_mapping = options.get('other-mapping', None)
+    value_attribute = options['value-attribute']
     compiled_mappings = compile_mappings(options['mappings'])
-    mapped_data = map_data(
-        grouped, compiled_mappings,
-        options['mapped-attribute'],
-        options.get('other-mapping', None),
-        options['value-attribute'])
 
-    return mapped_data
+    table = Table(
+        data, ['_start_at', '_end_at', value_attribute] + mapping_keys)
+    mapped = classify(
+        table.rows(mapping_keys),
+        lambda values: match_mapping(values, compiled_mappings) or
+        other_mapping)
+
+    mapped_data = OrderedDict()
+    for start_at, end_at, mapping, value in zip(
+            table['_start_at'], table['_end_at'], mapped,
+            table[value_attribute]):
+        if mapping is None:
+            continue
+
+        period_mapping_key = (start_at, end_at, mapping)
+        if period_mapping_key in mapped_data:
+            mapped_data[period_mapping_key][value_attribute] += value
+        else:
+            mapped_data[period_mapping_key] = {
+                "_start_at": start_at,
+                "_end_at": end_at,
+                mapped_attribute: mapping,
+                value_attribute: value,
+            }
+
+    return mapped_data.values()
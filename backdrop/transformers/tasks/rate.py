@@ -1,64 +1,43 @@
 import re
-import functools
 
-from .util import encode_id, group_by
-
-
-def pattern_filter(key, pattern, datum):
-    return key in datum and datum[key] and pattern.search(datum[key])
-
-
-def sum_matching(data, matchKey, pattern, valueKey):
-    matching_data = filter(
-        functools.partial(pattern_filter, matchKey, pattern), data)
-    if len(matching_data) > 0:
-        denominator = reduce(
-            lambda total, d: total + d[valueKey],
-            matching_data, 0
-        )
-    else:
-        denominator = None
-
-    return denominator
-
-
-def compute_for_date(matchingAttribute, valueAttribute, denominatorRe, numeratorRe, entry):
-    (start_at, end_at), data = entry
-
-    data_with_values = filter(
-        lambda datum: datum.get(valueAttribute, False), data)
-    denominator = sum_matching(
-        data_with_values, matchingAttribute, denominatorRe, valueAttribute)
-    numerator = sum_matching(
-        data_with_values, matchingAttribute, numeratorRe, valueAttribute)
-
-    if numerator is None or denominator is None:
-        rate = None
-    else:
-        rate = numerator / denominator if denominator > 0 else None
-
-    return {
-        '_id': encode_id(start_at, end_at),
-        '_timestamp': start_at,
-        '_start_at': start_at,
-        '_end_at': end_at,
-        'rate': rate,
-    }
+from .columnar import Table, matches, sum_where
+from .util import encode_id
 
 
 def compute(data, transform, data_set_config=None):
     options = transform['options']
-    groupped = group_by(['_start_at', '_end_at'], data)
+    matching_attribute = options['matchingAttribute']
+    value_attribute = options['valueAttribute']
     denominatorRe = re.compile(options['denominatorMatcher'])
     numeratorRe = re.compile(options['numeratorMatcher'])
 
-    return map(
-        functools.partial(
-            compute_for_date,
-            options['matchingAttribute'],
-            options['valueAttribute'],
-            denominatorRe,
-            numeratorRe,
-        ),
-        groupped.items()
-    )
+    table = Table(
+        data, ['_start_at', '_end_at', matching_attribute, value_attribute])
+    values = table[value_attribute]
+    denominator_rows = [
+        bool(value) and matched for value, matched
+        in zip(values, matches(table[matching_attribute], denominatorRe))]
+    numerator_rows = [
+        bool(value) and matched for value, matched
+        in zip(values, matches(table[matching_attribute], numeratorRe))]
+
+    computed = []
+    for (start_at, end_at), indexes in \
+            table.group(['_start_at', '_end_at']).iteritems():
+        denominator = sum_where(values, indexes, denominator_rows)
+        numerator = sum_where(values, indexes, numerator_rows)
+
+        if numerator is None or denominator is None:
+            rate = None
+        else:
+            rate = numerator / denominator if denominator > 0 else None
+
+        computed.append({
+            '_id': encode_id(start_at, end_at),
+            '_timestamp': start_at,
+            '_start_at': start_at,
+            '_end_at': end_at,
+            'rate': rate,
+        })
+
+    return computed
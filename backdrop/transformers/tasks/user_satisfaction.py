@@ -1,38 +1,42 @@
+from .columnar import Table
 from .util import encode_id
 
 
-def calculate_rating(datum):
+RATING_KEYS = ['rating_{0}:sum'.format(rating) for rating in range(1, 6)]
+
+
+def calculate_rating(ratings, total):
     # See
     # https://github.com/alphagov/spotlight/blob/ca291ffcc86a5397003be340ec263a2466b72cfe/app/common/collections/user-satisfaction.js
-    if not datum['total:sum']:
+    if not total:
         return None
     min_score = 1
     max_score = 5
     score = 0
-    for rating in range(min_score, max_score + 1):
-        rating_key = 'rating_{0}:sum'.format(rating)
-        score += datum[rating_key] * rating
-        # Set rating key that spotlight expects.
-        datum['rating_{0}'.format(rating)] = datum[rating_key]
-    mean = score / (datum['total:sum'])
+    for rating, count in enumerate(ratings, min_score):
+        score += count * rating
+    mean = score / total
     return (mean - min_score) / (max_score - min_score)
 
 
 def compute(data, transform, data_set_config=None):
     # Calculate rating and set keys that spotlight expects.
+    table = Table(data, ['_start_at', '_end_at', 'total:sum'] + RATING_KEYS)
     computed = []
-    for datum in data:
+    for start_at, end_at, total, ratings in zip(
+            table['_start_at'], table['_end_at'], table['total:sum'],
+            table.rows(RATING_KEYS)):
         computed.append({
-            '_id': encode_id(datum['_start_at'], datum['_end_at']),
-            '_timestamp': datum['_start_at'],
-            '_start_at': datum['_start_at'],
-            '_end_at': datum['_end_at'],
-            'rating_1': datum['rating_1:sum'],
-            'rating_2': datum['rating_2:sum'],
-            'rating_3': datum['rating_3:sum'],
-            'rating_4': datum['rating_4:sum'],
-            'rating_5': datum['rating_5:sum'],
-            'num_responses': datum['total:sum'],
-            'score': calculate_rating(datum),
+            '_id': encode_id(start_at, end_at),
+            '_timestamp': start_at,
+            '_start_at': start_at,
+            '_end_at': end_at,
+            'rating_1': ratings[0],
+            'rating_2': ratings[1],
+            'rating_3': ratings[2],
+            'rating_4': ratings[3],
+            'rating_5': ratings[4],
+            'num_responses': total,
+            'score': calculate_rating(ratings, total),
         })
     return computed
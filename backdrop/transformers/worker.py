@@ -1,4 +1,5 @@
 from celery import Celery
+from kombu import Queue
 
 # Load the appropriate config file as a python module
 import importlib
@@ -13,6 +14,16 @@ app = Celery(
     broker=config.TRANSFORMER_AMQP_URL,
     include=['backdrop.transformers.dispatch'])
 
+# Run separate workers with -Q for each queue so that backfills don't
+# hold up routine runs.
+app.conf.update(
+    CELERY_DEFAULT_QUEUE=config.TRANSFORMER_REALTIME_QUEUE,
+    CELERY_QUEUES=(
+        Queue(config.TRANSFORMER_REALTIME_QUEUE),
+        Queue(config.TRANSFORMER_BACKFILL_QUEUE),
+    ),
+)
+
 
 if __name__ == '__main__':
     app.start()
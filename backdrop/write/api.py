@@ -1,5 +1,6 @@
 import datetime
 import pytz
+import uuid
 
 from os import getenv
 from celery import Celery
@@ -10,9 +11,12 @@ from flask_featureflags import FeatureFlag
 from backdrop import statsd
 from backdrop.core.data_set import DataSet
 from backdrop.core.flaskutils import DataSetConverter
+from backdrop.core.timeseries import parse_period
+from backdrop.core.timeutils import as_utc
 from backdrop.write.decompressing_request import DecompressingRequest
 
-from ..core.errors import ParseError, ValidationError
+from ..core.errors import (ParseError, ValidationError,
+                           StorageUnavailableError)
 from ..core import log_handler, cache_control
 from ..core.flaskutils import generate_request_id
 
@@ -80,6 +84,14 @@ def uncaught_error_handler(e):
     return (jsonify(status='error', message=error_message), 500)
 
 
+@app.errorhandler(StorageUnavailableError)
+def storage_unavailable_handler(e):
+    app.logger.warning(e)
+    return (jsonify(status='error', message='Storage is unavailable'),
+            503,
+            [('Retry-After', str(e.retry_after))])
+
+
 @app.errorhandler(400)
 @app.errorhandler(401)
 @app.errorhandler(403)
@@ -215,6 +227,9 @@ def transform_data_set(data_group, data_type):
     """
     Runs all transforms on the specified data. _start_at and _end_at
     are specify the date range to be used. _end_at defaults to now.
+    If backfill is true the range is split into chunks of chunk_period
+    (a month by default) which are transformed in parallel; progress can
+    be followed at the URL of the returned job.
     TODO: allow the transform to be specified.
     """
 
@@ -232,11 +247,49 @@ def transform_data_set(data_group, data_type):
     if start_at is None:
         abort(400, 'You must specify a _start_at timestamp')
 
-    trigger_transforms(data_set_config, earliest=start_at, latest=end_at)
+    if data.get('backfill'):
+        period = parse_period(data.get(
+            'chunk_period', app.config['TRANSFORM_BACKFILL_CHUNK_PERIOD']))
+        if period is None:
+            abort(400, 'Unrecognised chunk_period')
+
+        job_id, chunks = trigger_backfill(
+            data_set_config, as_utc(start_at), as_utc(end_at), period)
+
+        return jsonify(status='ok', job_id=job_id, chunks=chunks)
+
+    # Explicitly requested runs recompute every period in the range.
+    trigger_transforms(data_set_config, earliest=start_at, latest=end_at,
+                       incremental=False)
 
     return jsonify(status='ok')
 
 
+@app.route('/data/<data_group>/<data_type>/transform/<job_id>',
+           methods=['GET'])
+@cache_control.nocache
+def transform_job_progress(data_group, data_type, job_id):
+    """
+    Reports the progress of a backfill started through the transform
+    endpoint.
+    """
+    data_set_config = admin_api.get_data_set(data_group, data_type)
+    _validate_config(data_set_config)
+    _validate_auth(data_set_config)
+
+    job = storage.get_job(job_id)
+    if job is None or job['data_set'] != data_set_config['name']:
+        abort(404, 'No transform job exists with id "{}"'.format(job_id))
+
+    return jsonify(status='ok',
+                   job_id=job_id,
+                   finished=job['completed'] + job['failed'] == job['total'],
+                   total=job['total'],
+                   completed=job['completed'],
+                   failed=job['failed'],
+                   errors=job['errors'])
+
+
 def _allow_modify_collection(auth_header):
     token = extract_bearer_token(auth_header)
     if token == app.config['STAGECRAFT_COLLECTION_ENDPOINT_TOKEN']:
@@ -330,13 +383,72 @@ def parse_bounding_dates(data):
     return (start_at, end_at)
 
 
-def trigger_transforms(data_set_config, data=[], earliest=None, latest=None):
+def trigger_transforms(data_set_config, data=[], earliest=None, latest=None,
+                       incremental=True):
     if len(data) > 0:
         earliest, latest = bounding_dates(data)
 
+    # Full recomputes go to their own queue so they can't hold up the
+    # transforms triggered by routine writes
+    if incremental:
+        queue = None
+    else:
+        queue = app.config['TRANSFORMER_BACKFILL_QUEUE']
+
     if earliest is not None and latest is not None:
         celery_app.send_task('backdrop.transformers.dispatch.entrypoint',
-                             args=(data_set_config['name'], earliest, latest))
+                             args=(data_set_config['name'], earliest, latest),
+                             kwargs={'incremental': incremental},
+                             queue=queue)
+
+
+def backfill_chunks(start_at, end_at, period):
+    """
+    Split a range into chunks aligned to the boundaries of period,
+    clamped to the range.
+
+    >>> from backdrop.core.timeseries import MONTH
+    >>> from backdrop.core.timeutils import utc
+    >>> chunks = backfill_chunks(utc(datetime.datetime(2014, 1, 15)),
+    ...                          utc(datetime.datetime(2014, 3, 1)), MONTH)
+    >>> [(start.isoformat(), end.isoformat()) for start, end in chunks]
+    ...     # doctest: +NORMALIZE_WHITESPACE
+    [('2014-01-15T00:00:00+00:00', '2014-02-01T00:00:00+00:00'),
+     ('2014-02-01T00:00:00+00:00', '2014-03-01T00:00:00+00:00')]
+    """
+    return [(max(start_at, chunk_start), min(end_at, chunk_end))
+            for chunk_start, chunk_end in period.range(start_at, end_at)]
+
+
+def trigger_backfill(data_set_config, start_at, end_at, period):
+    """
+    Record a backfill job and send its first chunks to the transformers.
+    Each chunk sends the next one when it finishes, so at most
+    TRANSFORM_BACKFILL_CONCURRENCY chunks are running at any time.
+    """
+    chunks = backfill_chunks(start_at, end_at, period)
+    concurrency = min(app.config['TRANSFORM_BACKFILL_CONCURRENCY'],
+                      len(chunks))
+
+    job_id = uuid.uuid4().hex
+    storage.create_job(job_id, {
+        'type': 'transform-backfill',
+        'data_set': data_set_config['name'],
+        'chunks': chunks,
+        'total': len(chunks),
+        'completed': 0,
+        'failed': 0,
+        'errors': [],
+        'next_chunk': concurrency,
+    })
+
+    for index in range(concurrency):
+        celery_app.send_task(
+            'backdrop.transformers.dispatch.run_backfill_chunk',
+            args=(job_id, index),
+            queue=app.config['TRANSFORMER_BACKFILL_QUEUE'])
+
+    return job_id, len(chunks)
 
 
 def start(port):
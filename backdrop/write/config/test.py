@@ -10,7 +10,11 @@ DATA_SET_AUTO_ID_KEYS = {
     "evl_volumetrics": ["_timestamp", "service", "transaction"],
 }
 TRANSFORMER_AMQP_URL = 'memory://'
+TRANSFORMER_BACKFILL_QUEUE = 'transformations.backfill'
 
 from development import (STAGECRAFT_COLLECTION_ENDPOINT_TOKEN, STAGECRAFT_URL,
                          STAGECRAFT_DATA_SET_QUERY_TOKEN, SIGNON_API_USER_TOKEN)
 from test_environment import *
+
+TRANSFORM_BACKFILL_CHUNK_PERIOD = 'month'
+TRANSFORM_BACKFILL_CONCURRENCY = 4
@@ -1,13 +1,16 @@
 from functools import wraps
 from mock import patch
 
+from tests.admin.support.fake_clamd import FakeClamd
+
 
 def stub_clamscan(is_virus=False):
     def decorator(func):
         @wraps(func)
         def wrapped_stub_clamscan(*args, **kwargs):
-            with patch('backdrop.admin.scanned_file.ScannedFile._clamscan') as clamscan:
-                clamscan.return_value = is_virus
-                func(*args, **kwargs)
+            with FakeClamd(is_virus=is_virus) as clamd:
+                with patch.dict('backdrop.admin.app.app.config',
+                                {'CLAMD_ADDRESS': clamd.address}):
+                    func(*args, **kwargs)
         return wrapped_stub_clamscan
     return decorator
@@ -0,0 +1,73 @@
+import os
+import SocketServer
+import struct
+import tempfile
+import threading
+
+EICAR = 'X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*'
+
+
+class _Handler(SocketServer.BaseRequestHandler):
+
+    def handle(self):
+        command = ''
+        while not command.endswith('\0'):
+            command += self._recv(1)
+        if command != 'zINSTREAM\0':
+            self.request.sendall('UNKNOWN COMMAND\0')
+            return
+
+        data = ''
+        while True:
+            length, = struct.unpack('!L', self._recv(4))
+            if length == 0:
+                break
+            data += self._recv(length)
+
+        self.server.scanned.append(data)
+        if self.server.is_virus or EICAR in data:
+            self.request.sendall('stream: Eicar-Test-Signature FOUND\0')
+        else:
+            self.request.sendall('stream: OK\0')
+
+    def _recv(self, size):
+        data = ''
+        while len(data) < size:
+            received = self.request.recv(size - len(data))
+            if not received:
+                raise EOFError('Client hung up')
+            data += received
+        return data
+
+
+class _Server(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+class FakeClamd(object):
+
+    """Answers INSTREAM scans on a unix socket, finding a virus in every
+    stream if is_virus is set, or otherwise in streams holding the EICAR
+    test string"""
+
+    def __init__(self, is_virus=False):
+        self.address = os.path.join(tempfile.mkdtemp(), 'clamd.sock')
+        self._server = _Server(self.address, _Handler)
+        self._server.is_virus = is_virus
+        self._server.scanned = []
+
+    @property
+    def scanned(self):
+        return self._server.scanned
+
+    def __enter__(self):
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+        os.remove(self.address)
+        os.rmdir(os.path.dirname(self.address))
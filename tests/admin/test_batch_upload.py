@@ -0,0 +1,107 @@
+import threading
+import unittest
+
+from hamcrest import assert_that, is_, contains, contains_inanyorder
+from mock import Mock
+from requests import Response
+from requests.exceptions import ConnectionError, HTTPError
+
+from backdrop.admin.batch_upload import post_batches, UploadInterrupted
+from backdrop.core.errors import ParseError
+
+
+def _http_error(status_code):
+    response = Response()
+    response.status_code = status_code
+    return HTTPError('{} Error'.format(status_code), response=response)
+
+
+class PostBatchesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.data_set = Mock()
+
+    def test_records_are_posted_in_batches(self):
+        results = post_batches(self.data_set, range(5), 2, workers=3)
+
+        assert_that(self.data_set.post.call_args_list, contains_inanyorder(
+            (([0, 1],), {}), (([2, 3],), {}), (([4],), {})))
+        assert_that([(r.number, r.first_record, r.last_record, r.ok)
+                     for r in results], contains(
+            (1, 1, 2, True), (2, 3, 4, True), (3, 5, 5, True)))
+
+    def test_batches_are_posted_concurrently(self):
+        posting = []
+        released = threading.Event()
+
+        def post(batch):
+            posting.append(batch)
+            if len(posting) == 2:
+                released.set()
+            assert released.wait(5)
+
+        self.data_set.post.side_effect = post
+        results = post_batches(self.data_set, range(4), 2, workers=2)
+
+        assert_that(all(result.ok for result in results), is_(True))
+
+    def test_connection_errors_are_retried(self):
+        self.data_set.post.side_effect = [ConnectionError(), None]
+
+        result, = post_batches(self.data_set, range(2), 2, retries=2,
+                               retry_delay=0)
+
+        assert_that(result.ok, is_(True))
+        assert_that(result.attempts, is_(2))
+
+    def test_server_errors_are_retried_until_retries_run_out(self):
+        self.data_set.post.side_effect = _http_error(500)
+
+        result, = post_batches(self.data_set, range(2), 2, retries=2,
+                               retry_delay=0)
+
+        assert_that(result.ok, is_(False))
+        assert_that(result.attempts, is_(3))
+        assert_that(result.error, is_('500 Error'))
+
+    def test_client_errors_are_not_retried(self):
+        self.data_set.post.side_effect = [_http_error(400), None]
+
+        failed, passed = post_batches(self.data_set, range(4), 2, retries=2,
+                                      retry_delay=0)
+
+        assert_that(failed.attempts, is_(1))
+        assert_that(failed.ok, is_(False))
+        assert_that(passed.ok, is_(True))
+
+    def test_errors_reading_records_are_raised_after_posting(self):
+        def records():
+            yield 1
+            yield 2
+            raise ParseError('bad row')
+
+        with self.assertRaises(UploadInterrupted) as raised:
+            post_batches(self.data_set, records(), 2, workers=2)
+
+        self.data_set.post.assert_called_once_with([1, 2])
+        assert_that(raised.exception.error, is_(ParseError))
+        assert_that([result.number for result in raised.exception.results],
+                    contains(1))
+        assert_that(raised.exception.message, is_(
+            'Only part of your data was saved: records 1 to 2 were saved '
+            'and the rest were not. bad row'))
+
+    def test_errors_before_the_first_batch_are_raised_as_they_are(self):
+        def records():
+            raise ParseError('bad row')
+            yield
+
+        self.assertRaises(ParseError, post_batches, self.data_set, records(),
+                          2)
+        assert_that(self.data_set.post.called, is_(False))
+
+    def test_an_empty_upload_posts_one_empty_batch(self):
+        result, = post_batches(self.data_set, [], 2)
+
+        self.data_set.post.assert_called_once_with([])
+        assert_that(result.size, is_(0))
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from hamcrest import assert_that, is_
+from mock import Mock
+
+from backdrop.admin.clamd import BackgroundScan, ClamdError, ClamdScanner
+from tests.admin.support.fake_clamd import EICAR, FakeClamd
+
+
+class ClamdScannerTestCase(unittest.TestCase):
+
+    def test_clean_streams_have_no_signature(self):
+        with FakeClamd() as clamd:
+            signature = ClamdScanner(clamd.address).scan(StringIO('a,b\n1,2'))
+
+        assert_that(signature, is_(None))
+        assert_that(clamd.scanned, is_(['a,b\n1,2']))
+
+    def test_signature_found_is_returned(self):
+        with FakeClamd() as clamd:
+            signature = ClamdScanner(clamd.address).scan(StringIO(EICAR))
+
+        assert_that(signature, is_('Eicar-Test-Signature'))
+
+    def test_streams_are_sent_in_chunks(self):
+        contents = 'x' * (ClamdScanner.CHUNK_SIZE * 2 + 1)
+
+        with FakeClamd() as clamd:
+            ClamdScanner(clamd.address).scan(StringIO(contents))
+
+        assert_that(clamd.scanned, is_([contents]))
+
+    def test_unreachable_clamd_is_an_error(self):
+        scanner = ClamdScanner('/tmp/there-is-no-clamd-here.sock')
+
+        self.assertRaises(ClamdError, scanner.scan, StringIO('a'))
+
+
+class BackgroundScanTestCase(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.write(handle, 'contents')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_file_is_scanned(self):
+        scanner = Mock()
+        scanner.scan.side_effect = lambda stream: stream.read()
+
+        scan = BackgroundScan(scanner, self.path)
+
+        assert_that(scan.result(), is_('contents'))
+        assert_that(scan.done, is_(True))
+
+    def test_errors_are_raised_by_result(self):
+        scanner = Mock()
+        scanner.scan.side_effect = ClamdError('clamd is down')
+
+        scan = BackgroundScan(scanner, self.path)
+
+        self.assertRaises(ClamdError, scan.result)
@@ -0,0 +1,145 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import pytz
+from hamcrest import assert_that, is_, contains
+from mock import Mock
+
+from backdrop.admin.dedupe import (ChangedRecords, is_repeat_upload,
+                                   upload_fingerprint)
+
+
+def _utc(*args):
+    return datetime.datetime(*args, tzinfo=pytz.UTC)
+
+
+class UploadFingerprintTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.data_set_config = {'name': 'foo', 'upload_format': 'csv'}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _file(self, contents):
+        path = os.path.join(self.directory, 'data.csv')
+        with open(path, 'w') as f:
+            f.write(contents)
+        return path
+
+    def test_same_file_and_config_give_the_same_fingerprint(self):
+        first = upload_fingerprint(self._file('a\n1'), self.data_set_config)
+        second = upload_fingerprint(self._file('a\n1'),
+                                    dict(self.data_set_config))
+
+        assert_that(first, is_(second))
+
+    def test_fingerprint_changes_with_the_file(self):
+        first = upload_fingerprint(self._file('a\n1'), self.data_set_config)
+        second = upload_fingerprint(self._file('a\n2'), self.data_set_config)
+
+        assert_that(first == second, is_(False))
+
+    def test_fingerprint_changes_with_the_upload_filters(self):
+        path = self._file('a\n1')
+        first = upload_fingerprint(path, self.data_set_config)
+        second = upload_fingerprint(path, dict(
+            self.data_set_config,
+            upload_filters=['backdrop.core.upload.filters.first_sheet_filter']))
+
+        assert_that(first == second, is_(False))
+
+
+class IsRepeatUploadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = Mock()
+        self.storage.get_upload_fingerprint.return_value = {
+            'fingerprint': 'abc',
+            'uploaded_at': _utc(2014, 1, 1, 12),
+        }
+
+    def test_matching_upload_is_a_repeat(self):
+        self.storage.get_last_updated.return_value = _utc(2014, 1, 1, 11)
+
+        assert_that(is_repeat_upload(self.storage, 'foo', 'abc'), is_(True))
+        self.storage.get_upload_fingerprint.assert_called_once_with('foo')
+
+    def test_different_upload_is_not_a_repeat(self):
+        self.storage.get_last_updated.return_value = _utc(2014, 1, 1, 11)
+
+        assert_that(is_repeat_upload(self.storage, 'foo', 'def'), is_(False))
+
+    def test_first_upload_is_not_a_repeat(self):
+        self.storage.get_upload_fingerprint.return_value = None
+
+        assert_that(is_repeat_upload(self.storage, 'foo', 'abc'), is_(False))
+
+    def test_upload_is_not_a_repeat_if_the_data_set_changed_since(self):
+        self.storage.get_last_updated.return_value = _utc(2014, 1, 1, 13)
+
+        assert_that(is_repeat_upload(self.storage, 'foo', 'abc'), is_(False))
+
+    def test_upload_is_not_a_repeat_if_the_data_set_was_emptied(self):
+        self.storage.get_last_updated.return_value = None
+
+        assert_that(is_repeat_upload(self.storage, 'foo', 'abc'), is_(False))
+
+
+class ChangedRecordsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = Mock()
+        self.storage.find_records.return_value = {
+            'a': {'_id': 'a', 'value': 1,
+                  '_updated_at': _utc(2014, 1, 1)},
+            'b': {'_id': 'b', 'value': 2,
+                  '_updated_at': _utc(2014, 1, 1)},
+        }
+
+    def test_unchanged_records_are_skipped(self):
+        records = ChangedRecords(
+            self.storage, {'name': 'foo'},
+            [{'_id': 'a', 'value': 1},
+             {'_id': 'b', 'value': 3},
+             {'_id': 'c', 'value': 1}], 10)
+
+        assert_that(list(records), contains(
+            {'_id': 'b', 'value': 3},
+            {'_id': 'c', 'value': 1}))
+        assert_that(records.unchanged, is_(1))
+        self.storage.find_records.assert_called_once_with(
+            'foo', ['a', 'b', 'c'])
+
+    def test_stored_records_are_looked_up_a_batch_at_a_time(self):
+        records = ChangedRecords(
+            self.storage, {'name': 'foo'},
+            [{'_id': 'a', 'value': 1},
+             {'_id': 'b', 'value': 2},
+             {'_id': 'c', 'value': 1}], 2)
+
+        assert_that(list(records), contains({'_id': 'c', 'value': 1}))
+        assert_that(self.storage.find_records.call_count, is_(2))
+
+    def test_records_without_ids_are_always_posted(self):
+        records = ChangedRecords(
+            self.storage, {'name': 'foo'}, [{'value': 1}], 10)
+
+        assert_that(list(records), contains({'value': 1}))
+        assert_that(self.storage.find_records.called, is_(False))
+
+    def test_auto_ids_are_used_to_find_stored_records(self):
+        self.storage.find_records.return_value = {
+            'MQ==': {'_id': 'MQ==', 'value': 1},
+        }
+        records = ChangedRecords(
+            self.storage, {'name': 'foo', 'auto_ids': ['value']},
+            [{'value': 1}, {'value': 2}], 10)
+
+        assert_that(list(records), contains({'value': 2}))
+        self.storage.find_records.assert_called_once_with(
+            'foo', ['MQ==', 'Mg=='])
@@ -1,14 +1,18 @@
 # -*- coding: utf-8 -*-
 
 from StringIO import StringIO
+import json
 import os
+import shutil
+import tempfile
 import datetime
 from hamcrest import (assert_that, has_entry, is_, has_entries, has_items,
-                      equal_to)
+                      equal_to, contains_inanyorder, contains_string)
 from pymongo import MongoClient
 from tests.support.performanceplatform_client import fake_data_set_exists, stub_user_retrieve_by_email
 from tests.support.test_helpers import has_status
 from tests.admin.support.clamscan import stub_clamscan
+from tests.admin.support.fake_clamd import EICAR
 from tests.admin.support.oauth_test_case import OauthTestCase
 from mock import patch
 from mock import Mock
@@ -82,6 +86,25 @@ class TestFileUploadIntegration(OauthTestCase):
         mock_post.assert_called_once_with([{u'_id': u'hello', u'value': u'some_value'}])
         assert_that(response, has_status(200))
 
+    @fake_data_set_exists("test", upload_format="csv")
+    @stub_user_retrieve_by_email("test@example.com", data_sets=["test"])
+    @stub_clamscan(is_virus=False)
+    @patch("performanceplatform.client.DataSet")
+    def test_records_from_csv_with_virus_are_not_posted(
+            self, mock_client_class):
+        self._sign_in("test@example.com")
+        mock_post = get_mock_post(mock_client_class)
+
+        response = self.client.post(
+            'test/upload',
+            data={
+                'file': (StringIO('value\n' + EICAR), 'data.csv')
+            }
+        )
+
+        assert_that(response, has_status(400))
+        assert_that(mock_post.called, is_(False))
+
     @fake_data_set_exists(
         "test_upload_integration",
         upload_format="csv",
@@ -113,6 +136,138 @@ class TestFileUploadIntegration(OauthTestCase):
             {u'english': u'coffee', u'italian': u'caffè'}])
         assert_that(response, has_status(200))
 
+    @fake_data_set_exists(
+        "test_upload_integration",
+        upload_format="csv",
+        bearer_token="some_nonsense",
+        data_group="test",
+        data_type="upload_integration")
+    @stub_user_retrieve_by_email("test@example.com", data_sets=["test_upload_integration"])
+    @stub_clamscan(is_virus=False)
+    @patch("performanceplatform.client.DataSet")
+    def test_csv_records_are_posted_in_batches(self, mock_client_class):
+        self._sign_in("test@example.com")
+        mock_post = get_mock_post(mock_client_class)
+
+        with patch.dict(self.app.config, {'UPLOAD_BATCH_SIZE': 2}):
+            response = self.client.post(
+                'test_upload_integration/upload',
+                data = {
+                    'file': (StringIO('value\n1\n2\n3'), 'data.csv')
+                }
+            )
+
+        assert_that(mock_post.call_args_list, contains_inanyorder(
+            ((([{u'value': 1}, {u'value': 2}]),), {}),
+            ((([{u'value': 3}]),), {}),
+        ))
+        assert_that(response, has_status(200))
+        assert_that(response.data, contains_string(
+            '3 records were saved in 2 batches'))
+
+    @fake_data_set_exists(
+        "test_upload_integration",
+        upload_format="csv",
+        bearer_token="some_nonsense",
+        data_group="test",
+        data_type="upload_integration")
+    @stub_user_retrieve_by_email("test@example.com", data_sets=["test_upload_integration"])
+    @stub_clamscan(is_virus=False)
+    @patch("performanceplatform.client.DataSet")
+    def test_records_saved_before_a_parse_error_are_reported(
+            self, mock_client_class):
+        self._sign_in("test@example.com")
+        mock_post = get_mock_post(mock_client_class)
+
+        with patch.dict(self.app.config, {'UPLOAD_BATCH_SIZE': 2,
+                                          'UPLOAD_WORKERS': 1}):
+            response = self.client.post(
+                'test_upload_integration/upload',
+                data = {
+                    'file': (StringIO('value\n1\n2\n3,4'), 'data.csv')
+                }
+            )
+
+        mock_post.assert_called_once_with([{u'value': 1}, {u'value': 2}])
+        assert_that(response, has_status(400))
+        assert_that(response.data, contains_string(
+            'Only part of your data was saved: records 1 to 2 were saved'))
+
+    @fake_data_set_exists(
+        "test_upload_integration",
+        upload_format="csv",
+        data_group="test",
+        data_type="upload_integration")
+    @stub_user_retrieve_by_email("test@example.com", data_sets=["test_upload_integration"])
+    @stub_clamscan(is_virus=False)
+    @patch("backdrop.admin.app.storage")
+    @patch("performanceplatform.client.DataSet")
+    def test_unchanged_records_are_not_posted_again(
+            self, mock_client_class, mock_storage):
+        self._sign_in("test@example.com")
+        mock_post = get_mock_post(mock_client_class)
+        mock_storage.get_upload_fingerprint.return_value = None
+        mock_storage.find_records.return_value = {
+            'a': {'_id': 'a', 'value': 1},
+        }
+
+        with patch.dict(self.app.config, {'UPLOAD_SKIP_UNCHANGED': True}):
+            response = self.client.post(
+                'test_upload_integration/upload',
+                data = {
+                    'file': (StringIO('_id,value\na,1\nb,2'), 'data.csv')
+                }
+            )
+
+        mock_post.assert_called_once_with([{u'_id': u'b', u'value': 2}])
+        assert_that(response, has_status(200))
+        assert_that(response.data, contains_string(
+            '1 records were already saved and have not changed'))
+        assert_that(mock_storage.set_upload_fingerprint.call_args[0][0],
+                    is_('test_upload_integration'))
+
+    @fake_data_set_exists(
+        "test_upload_integration",
+        upload_format="csv",
+        data_group="test",
+        data_type="upload_integration")
+    @stub_user_retrieve_by_email("test@example.com", data_sets=["test_upload_integration"])
+    @stub_clamscan(is_virus=False)
+    @patch("backdrop.admin.app.storage")
+    @patch("performanceplatform.client.DataSet")
+    def test_repeated_uploads_are_skipped(
+            self, mock_client_class, mock_storage):
+        self._sign_in("test@example.com")
+        mock_post = get_mock_post(mock_client_class)
+        fingerprints = []
+        mock_storage.set_upload_fingerprint.side_effect = \
+            lambda name, fingerprint: fingerprints.append(fingerprint)
+        mock_storage.find_records.return_value = {}
+
+        def upload():
+            return self.client.post(
+                'test_upload_integration/upload',
+                data = {
+                    'file': (StringIO('value\n1'), 'data.csv')
+                }
+            )
+
+        with patch.dict(self.app.config, {'UPLOAD_SKIP_UNCHANGED': True}):
+            mock_storage.get_upload_fingerprint.return_value = None
+            upload()
+            mock_storage.get_upload_fingerprint.return_value = {
+                'fingerprint': fingerprints[0],
+                'uploaded_at': datetime.datetime(2014, 1, 2),
+            }
+            mock_storage.get_last_updated.return_value = \
+                datetime.datetime(2014, 1, 1)
+            response = upload()
+
+        assert_that(mock_post.call_count, is_(1))
+        assert_that(response, has_status(200))
+        assert_that(response.data, contains_string(
+            'same as the last one uploaded'))
+
     @fake_data_set_exists(
         "integration_test_excel_data_set",
         upload_format="excel",
@@ -151,9 +306,25 @@ class TestFileUploadIntegration(OauthTestCase):
     @patch("performanceplatform.client.DataSet.post")
     def test_error_cases_when_post_to_backdrop_fails(self, mock_post):
         self._sign_in("test@example.com")
-        mock_post.side_effect = RequestException()
+        mock_post.side_effect = RequestException('write API is down')
         response = self.do_simple_file_post()
         assert_that(response, has_status(500))
+        assert_that(response.data, contains_string(
+            'Batch 1 was not saved after 1 attempt(s): write API is down'))
+
+    @fake_data_set_exists("test", upload_format="csv")
+    @stub_user_retrieve_by_email("test@example.com", data_sets=["test"])
+    @patch("performanceplatform.client.DataSet.post")
+    def test_error_cases_when_virus_scanning_is_unavailable(self, mock_post):
+        self._sign_in("test@example.com")
+        with patch.dict(self.app.config, {
+                'CLAMD_ADDRESS': '/tmp/there-is-no-clamd-here.sock'}):
+            response = self.do_simple_file_post()
+
+        assert_that(response, has_status(400))
+        assert_that(response.data, contains_string(
+            'Virus scanning is unavailable, try again later'))
+        assert_that(mock_post.called, is_(False))
 
     @fake_data_set_exists("test", upload_format="csv")
     @stub_user_retrieve_by_email("test@example.com", data_sets=["test"])
@@ -423,6 +594,104 @@ class TestFileUploadIntegration(OauthTestCase):
         )
 
 
+class TestAsyncUploadIntegration(OauthTestCase):
+    def setUp(self):
+        super(TestAsyncUploadIntegration, self).setUp()
+        self.job_dir = tempfile.mkdtemp()
+        self.config = patch.dict(self.app.config, {
+            'UPLOAD_ASYNC': True,
+            'UPLOAD_JOB_DIR': self.job_dir,
+        })
+        self.config.start()
+        self.given_user_is_signed_in_as(email="test@example.com")
+
+    def tearDown(self):
+        self.config.stop()
+        shutil.rmtree(self.job_dir)
+
+    @fake_data_set_exists("test", upload_format="csv")
+    @stub_user_retrieve_by_email("test@example.com", data_sets=["test"])
+    @patch("backdrop.admin.app.storage")
+    @patch("backdrop.admin.app.celery_app")
+    def test_upload_is_queued_as_a_job(self, mock_celery_app, mock_storage):
+        response = self.client.post(
+            'test/upload',
+            data={'file': (StringIO('value\n1'), 'data.csv')})
+
+        job_id, job = mock_storage.create_job.call_args[0]
+        assert_that(response, has_status(303))
+        assert_that(response.headers['Location'],
+                    is_('http://localhost/test/upload/' + job_id))
+        assert_that(job, has_entries({
+            'type': 'upload',
+            'data_set': 'test',
+            'filename': 'data.csv',
+            'state': 'queued',
+        }))
+        assert_that(open(job['path']).read(), is_('value\n1'))
+        mock_celery_app.send_task.assert_called_once_with(
+            'backdrop.admin.tasks.process_upload',
+            args=(job_id,),
+            queue='admin.uploads')
+
+    @fake_data_set_exists("test", upload_format="csv")
+    @stub_user_retrieve_by_email("test@example.com", data_sets=["test"])
+    @patch("backdrop.admin.app.storage")
+    @patch("backdrop.admin.app.celery_app")
+    def test_invalid_files_are_rejected_straight_away(
+            self, mock_celery_app, mock_storage):
+        response = self.client.post(
+            'test/upload',
+            data={'file': (StringIO(''), 'data.csv')})
+
+        assert_that(response, has_status(400))
+        assert_that(mock_celery_app.send_task.called, is_(False))
+        assert_that(os.listdir(self.job_dir), is_([]))
+
+    @stub_user_retrieve_by_email("test@example.com", data_sets=["test"])
+    @patch("backdrop.admin.app.storage")
+    def test_job_progress_is_available_as_json(self, mock_storage):
+        mock_storage.get_job.return_value = {
+            'type': 'upload', 'data_set': 'test', 'state': 'running',
+            'records': 2000, 'batches': 2, 'failed_batches': 0,
+            'errors': [], 'message': None,
+        }
+
+        response = self.client.get('test/upload/abc123.json')
+
+        mock_storage.get_job.assert_called_once_with('abc123')
+        assert_that(json.loads(response.data), has_entries({
+            'state': 'running',
+            'finished': False,
+            'records': 2000,
+        }))
+
+    @stub_user_retrieve_by_email("test@example.com", data_sets=["test"])
+    @patch("backdrop.admin.app.storage")
+    def test_job_progress_page(self, mock_storage):
+        mock_storage.get_job.return_value = {
+            'type': 'upload', 'data_set': 'test', 'state': 'done',
+            'records': 3, 'batches': 1, 'failed_batches': 0,
+            'errors': [], 'message': None,
+        }
+
+        response = self.client.get('test/upload/abc123')
+
+        assert_that(response, has_status(200))
+        assert_that(response.data, contains_string(
+            '3 records have been saved in 1 batches'))
+
+    @stub_user_retrieve_by_email("test@example.com", data_sets=["test"])
+    @patch("backdrop.admin.app.storage")
+    def test_jobs_of_other_data_sets_are_not_found(self, mock_storage):
+        mock_storage.get_job.return_value = {
+            'type': 'upload', 'data_set': 'other'}
+
+        response = self.client.get('test/upload/abc123.json')
+
+        assert_that(response, has_status(404))
+
+
 def get_mock_post(mock_client_class):
     mock_post = Mock()
     client_instance = Mock()
@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from hamcrest import assert_that, is_
+from mock import Mock, patch
+
+from backdrop.admin.batch_upload import (BatchResult, UploadInterrupted,
+                                         UploadSummary)
+from backdrop.admin.clamd import ClamdError
+from backdrop.admin.tasks import process_upload
+from backdrop.core.errors import ParseError
+
+
+@patch('backdrop.admin.tasks.admin_api')
+@patch('backdrop.admin.tasks.storage')
+@patch('backdrop.admin.tasks.post_upload')
+class ProcessUploadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.job_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.job_dir, 'data.csv')
+        with open(self.path, 'w') as f:
+            f.write('value\n1\n2')
+        self.job = {
+            'type': 'upload',
+            'data_set': 'foo',
+            'filename': 'data.csv',
+            'path': self.path,
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.job_dir, ignore_errors=True)
+
+    def _result(self, number, size, error=None):
+        result = BatchResult(number, 1 + (number - 1) * size, size)
+        result.attempts = 1
+        result.error = error
+        return result
+
+    def test_progress_is_recorded_per_batch(
+            self, mock_post_upload, mock_storage, mock_admin_api):
+        mock_storage.get_job.return_value = self.job
+        mock_admin_api.get_data_set_by_name.return_value = {
+            'name': 'foo', 'upload_format': 'csv'}
+
+        def post_upload(data_set_config, parse_file, uploaded_file,
+                        on_result):
+            results = [self._result(1, 2), self._result(2, 2, 'Error')]
+            for result in results:
+                on_result(result)
+            return UploadSummary(results)
+        mock_post_upload.side_effect = post_upload
+
+        process_upload('job123')
+
+        mock_storage.update_job.assert_any_call(
+            'job123', increment={'batches': 1, 'records': 2})
+        mock_storage.update_job.assert_any_call(
+            'job123',
+            increment={'batches': 1, 'failed_batches': 1},
+            append={'errors': {
+                'batch': 2, 'first_record': 3, 'last_record': 4,
+                'attempts': 1, 'message': 'Error'}})
+        mock_storage.update_job.assert_called_with(
+            'job123', state='failed', unchanged=0,
+            message='Some of your data could not be saved')
+
+    def test_finished_jobs_are_done_and_remove_the_file(
+            self, mock_post_upload, mock_storage, mock_admin_api):
+        mock_storage.get_job.return_value = self.job
+        mock_admin_api.get_data_set_by_name.return_value = {
+            'name': 'foo', 'upload_format': 'csv'}
+        mock_post_upload.return_value = UploadSummary(
+            [self._result(1, 2)], unchanged=3)
+
+        process_upload('job123')
+
+        mock_storage.update_job.assert_any_call('job123', state='running')
+        mock_storage.update_job.assert_called_with(
+            'job123', state='done', unchanged=3, repeat=False)
+        assert_that(os.path.exists(self.job_dir), is_(False))
+
+    def test_upload_errors_fail_the_job(
+            self, mock_post_upload, mock_storage, mock_admin_api):
+        mock_storage.get_job.return_value = self.job
+        mock_admin_api.get_data_set_by_name.return_value = {
+            'name': 'foo', 'data_group': 'group', 'data_type': 'type',
+            'upload_format': 'csv'}
+        mock_post_upload.side_effect = ParseError('Bad row')
+
+        process_upload('job123')
+
+        mock_storage.update_job.assert_called_with(
+            'job123', state='failed', message='Bad row')
+        assert_that(os.path.exists(self.job_dir), is_(False))
+
+    def test_jobs_fail_while_virus_scanning_is_unavailable(
+            self, mock_post_upload, mock_storage, mock_admin_api):
+        mock_storage.get_job.return_value = self.job
+        mock_admin_api.get_data_set_by_name.return_value = {
+            'name': 'foo', 'data_group': 'group', 'data_type': 'type',
+            'upload_format': 'csv'}
+        mock_post_upload.side_effect = ClamdError('Could not connect')
+
+        process_upload('job123')
+
+        mock_storage.update_job.assert_called_with(
+            'job123', state='failed',
+            message='Virus scanning is unavailable, try again later')
+
+    def test_jobs_stopped_part_way_say_what_was_saved(
+            self, mock_post_upload, mock_storage, mock_admin_api):
+        mock_storage.get_job.return_value = self.job
+        mock_admin_api.get_data_set_by_name.return_value = {
+            'name': 'foo', 'data_group': 'group', 'data_type': 'type',
+            'upload_format': 'csv'}
+        mock_post_upload.side_effect = UploadInterrupted(
+            ParseError('Bad row'), [self._result(1, 2), self._result(2, 2)])
+
+        process_upload('job123')
+
+        mock_storage.update_job.assert_called_with(
+            'job123', state='failed',
+            message='Only part of your data was saved: records 1 to 4 were '
+                    'saved and the rest were not. Bad row')
+        assert_that(os.path.exists(self.job_dir), is_(False))
+
+    def test_jobs_that_are_not_found_are_dropped(
+            self, mock_post_upload, mock_storage, mock_admin_api):
+        mock_storage.get_job.return_value = None
+
+        process_upload('job123')
+
+        assert_that(mock_storage.update_job.called, is_(False))
+        assert_that(mock_post_upload.called, is_(False))
+
+    def test_unexpected_errors_fail_the_job(
+            self, mock_post_upload, mock_storage, mock_admin_api):
+        mock_storage.get_job.return_value = self.job
+        mock_post_upload.side_effect = Exception('Oops')
+
+        process_upload('job123')
+
+        mock_storage.update_job.assert_called_with(
+            'job123', state='failed',
+            message='The upload could not be processed')
@@ -12,15 +12,23 @@ class TestUploadedFile(FileUploadTestCase):
         upload = self._uploaded_file_wrapper(contents)
         assert_that(upload.file_stream().read(), is_(contents))
 
-    def test_files_under_1000000_octets_are_valid(self):
-        csv_length_999999 = '\n'.join(['aa,bb,ccc' for i in range(100000)])
-        upload = self._uploaded_file_wrapper(contents=csv_length_999999)
+    def test_the_default_size_limit_is_50000000_octets(self):
+        assert_that(UploadedFile.MAX_FILE_SIZE, is_(50000000))
+
+    def _uploaded_file_of_size_limit(self, contents, max_file_size):
+        upload = UploadedFile(
+            self._file_storage_wrapper(contents, browser_filename='a.csv'),
+            max_file_size=max_file_size)
+        upload._is_potential_virus = Mock(return_value=False)
+        return upload
+
+    def test_files_under_the_size_limit_are_valid(self):
+        upload = self._uploaded_file_of_size_limit('aa,bb,cc', 9)
 
         assert_that(upload.valid, is_(True))
 
-    def test_files_over_1000000_octets_are_not_valid(self):
-        csv_length_1000009 = '\n'.join(['aa,bb,ccc' for i in range(100001)])
-        upload = self._uploaded_file_wrapper(contents=csv_length_1000009)
+    def test_files_of_the_size_limit_are_not_valid(self):
+        upload = self._uploaded_file_of_size_limit('aa,bb,ccc', 9)
 
         assert_that(upload.valid, is_(False))
 
@@ -62,3 +70,59 @@ class TestUploadedFileContentTypeValidation(FileUploadTestCase):
     def test_perform_virus_scan(self):
         upload = self._uploaded_file_wrapper('[fake empty content]', is_virus=True)
         assert_that(upload.valid, is_(False))
+
+
+class TestUploadedFileParse(FileUploadTestCase):
+    def _uploaded_file(self, contents, scanner):
+        return UploadedFile(
+            self._file_storage_wrapper(contents, browser_filename='a.csv'),
+            scanner=scanner)
+
+    def test_records_are_returned_when_the_file_is_clean(self):
+        scanner = Mock()
+        scanner.scan.return_value = None
+        upload = self._uploaded_file('a\nb', scanner)
+
+        records = upload.parse(lambda stream: stream.read().split(), 10)
+
+        assert_that(list(records), is_(['a', 'b']))
+        assert_that(scanner.scan.call_count, is_(1))
+
+    def test_no_records_are_returned_when_the_file_has_a_virus(self):
+        scanner = Mock()
+        scanner.scan.return_value = 'Eicar-Test-Signature'
+        upload = self._uploaded_file('a\nb', scanner)
+
+        self.assertRaises(FileUploadError, upload.parse,
+                          lambda stream: iter(stream.read().split()), 10)
+
+    def test_files_failing_other_checks_are_not_scanned(self):
+        scanner = Mock()
+        upload = self._uploaded_file('', scanner)
+
+        self.assertRaises(FileUploadError, upload.parse, Mock(), 10)
+        assert_that(scanner.scan.called, is_(False))
+
+    def test_parsed_file_is_closed_on_exit(self):
+        scanner = Mock()
+        scanner.scan.return_value = None
+        streams = []
+
+        def parse_file(stream):
+            streams.append(stream)
+            return iter(stream.readline, '')
+
+        with self._uploaded_file('a\nb', scanner) as upload:
+            next(upload.parse(parse_file, 0))
+
+        assert_that(streams[0].closed, is_(True))
+
+
+class TestUploadedFileFromSaved(FileUploadTestCase):
+    def test_saved_file_is_closed_on_exit(self):
+        self._file_storage_wrapper('a,b', server_filename='/tmp/saved.csv')
+
+        with UploadedFile.from_saved('/tmp/saved.csv', 'a.csv') as upload:
+            stream = upload.file_storage.stream
+
+        assert_that(stream.closed, is_(True))
@@ -2,7 +2,7 @@ import unittest
 
 from hamcrest import *
 
-from backdrop.contrib.evl_volumetrics import extract_transaction_rows, create_transaction_data, remove_summary_columns
+from backdrop.contrib.evl_volumetrics import TRANSACTIONS, transaction_data
 
 
 class TestEVLVolumetrics(unittest.TestCase):
@@ -46,32 +46,43 @@ class TestEVLVolumetrics(unittest.TestCase):
             ["Ignore"]
         ]
 
-        header, rows = extract_transaction_rows(sheet)
-        assert_that(header, is_(["Channel Descriptions", "", "Transaction", "Apr 2012"]))
-        assert_that(rows, is_not(has_item(["Ignore"])))
-        assert_that(rows, has_items(
-            ["Assisted Digital", "Relicensing", "V-V10 Licence Application Post Office", 1000],
-            ["Assisted Digital", "Relicensing", "V-V11 Licence Renewal Reminder Post Office", 1001],
-            ["Assisted Digital", "SORN", "V-V11 Some transaction", 1003],
-            ["Fully Digital", "Relicensing", "V-V10 Licence Application EVL", 1006],
-            ["Fully Digital", "Relicensing", "V-V11 Fleets", 1007],
-            ["Fully Digital", "Relicensing", "V-V11 Licence Renewal Reminder EVL", 1008],
-            ["Fully Digital", "Relicensing", "V-V85 and V85/1 HGV Licence Application EVL", 1009],
-            ["Fully Digital", "SORN", "V-V11 SORN EVL", 1011],
-            ["Fully Digital", "SORN", "V-V85/1 HGV SORN Declaration EVL", 1012],
-            ["Fully Digital", "SORN", "V-V890 SORN Declaration EVL", 1013],
-            ["Fully Digital", "SORN", "V-V890 SORN Declaration Fleets", 1014],
-            ["Manual", "Relicensing", "V-V890 Another transaction", 1017],
-            ["Manual", "Relicensing", "V-V11 Licence Renewal Reminder Local Office", 1018],
-            ["Manual", "Relicensing", "V-V85 and V85/1 HGV Licence Application", 1019],
-            ["Manual", "SORN", "V-V11 SORN Local Office", 1021],
-            ["Manual", "SORN", "V-V85/1 HGV SORN Declaration", 1022],
-            ["Manual", "SORN", "V-V890 SORN Declaration", 1023],
-            ["Manual", "SORN", "V-V890 SORN Declaration Key from Image", 1024],
-            ["Manual", "SORN", "V-V890 SORN Declaration Refunds Input", 1025],
-            ["Manual", "SORN", "V-V890 SORN Declaration Vehicles Input", 1026],
-            ["Manual", "SORN", "V-V890 SORN Declaration Vehicles Triage", 1027]
-        ))
+        records = [(r["channel"], r["service"], r["transaction"], r["volume"])
+                   for r in TRANSACTIONS.extract(iter(sheet))]
+        assert_that(records, is_([
+            ("Assisted Digital", "Relicensing", "V-V10 Licence Application Post Office", 1000),
+            ("Assisted Digital", "Relicensing", "V-V11 Licence Renewal Reminder Post Office", 1001),
+            ("Assisted Digital", "SORN", "V-V11 Some transaction", 1003),
+            ("Fully Digital", "Relicensing", "V-V10 Licence Application EVL", 1006),
+            ("Fully Digital", "Relicensing", "V-V11 Fleets", 1007),
+            ("Fully Digital", "Relicensing", "V-V11 Licence Renewal Reminder EVL", 1008),
+            ("Fully Digital", "Relicensing", "V-V85 and V85/1 HGV Licence Application EVL", 1009),
+            ("Fully Digital", "SORN", "V-V11 SORN EVL", 1011),
+            ("Fully Digital", "SORN", "V-V85/1 HGV SORN Declaration EVL", 1012),
+            ("Fully Digital", "SORN", "V-V890 SORN Declaration EVL", 1013),
+            ("Fully Digital", "SORN", "V-V890 SORN Declaration Fleets", 1014),
+            ("Manual", "Relicensing", "V-V890 Another transaction", 1017),
+            ("Manual", "Relicensing", "V-V11 Licence Renewal Reminder Local Office", 1018),
+            ("Manual", "Relicensing", "V-V85 and V85/1 HGV Licence Application", 1019),
+            ("Manual", "SORN", "V-V11 SORN Local Office", 1021),
+            ("Manual", "SORN", "V-V85/1 HGV SORN Declaration", 1022),
+            ("Manual", "SORN", "V-V890 SORN Declaration", 1023),
+            ("Manual", "SORN", "V-V890 SORN Declaration Key from Image", 1024),
+            ("Manual", "SORN", "V-V890 SORN Declaration Refunds Input", 1025),
+            ("Manual", "SORN", "V-V890 SORN Declaration Vehicles Input", 1026),
+            ("Manual", "SORN", "V-V890 SORN Declaration Vehicles Triage", 1027),
+        ]))
+
+    def test_stops_reading_after_the_last_transaction_row(self):
+        def sheet():
+            yield ["Ignore"]
+            yield ["Ignore"]
+            yield ["Ignore"]
+            yield ["Channel Descriptions", "", "Transaction", "Apr 2012"]
+            for _ in range(28):
+                yield ["", "", "Some transaction", 1]
+            raise AssertionError("Read past the last transaction row")
+
+        assert_that(len(list(TRANSACTIONS.extract(sheet()))), is_(21))
 
     def test_removes_summary_columns(self):
         sheet = [
@@ -112,25 +123,34 @@ class TestEVLVolumetrics(unittest.TestCase):
             ["_", "_", "_", "_", "_", "_"],
         ]
 
-        assert_that(remove_summary_columns(sheet), has_items(
-            ["Channel Descriptions", "", "Transaction", "Apr 2012", "Mar 2013"],
-            ["", "", "V-V85 and V85/1 HGV Licence Application EVL", 1009, 3008],
+        records = [(r["transaction"], r["month"], r["volume"])
+                   for r in TRANSACTIONS.extract(iter(sheet))]
+        assert_that(records, has_items(
+            ("V-V85 and V85/1 HGV Licence Application EVL", "Apr 2012", 1009),
+            ("V-V85 and V85/1 HGV Licence Application EVL", "Mar 2013", 3008),
         ))
+        assert_that([month for _, month, _ in records],
+                    is_not(has_item("2012/13 Total")))
 
-    def test_creating_transaction_data_from_row_and_header(self):
-        header = ["Channel Descriptions", "", "Transaction", "Apr 2012", "Mar 2013", "May 2013"]
-        row = ["Manual", "Relicensing", "V-V890 Another transaction", 1, 2, 3]
+    def test_creating_transaction_data_from_record(self):
+        record = {"channel": "Manual", "service": "Relicensing",
+                  "transaction": "V-V890 Another transaction",
+                  "month": "Mar 2013", "volume": 2}
 
-        assert_that(create_transaction_data(header, row), has_items(
-            ["2012-04-01T00:00:00+00:00", "tax-disc", "manual", "V-V890 Another transaction", 1],
-            ["2013-03-01T00:00:00+00:00", "tax-disc", "manual", "V-V890 Another transaction", 2],
-            ["2013-05-01T00:00:00+00:00", "tax-disc", "manual", "V-V890 Another transaction", 3],
-        ))
+        assert_that(transaction_data(record), is_(
+            ["2013-03-01T00:00:00+00:00", "tax-disc", "manual", "V-V890 Another transaction", 2]))
 
-    def test_creating_transaction_data_from_row_and_header_maps_channel_and_services(self):
-        header = ["Channel Descriptions", "", "Transaction", "Apr 2012"]
-        row = ["Fully Digital", "SORN", "V-V11 SORN EVL", 10]
+    def test_creating_transaction_data_maps_channel_and_services(self):
+        record = {"channel": "Fully Digital", "service": "SORN",
+                  "transaction": "V-V11 SORN EVL",
+                  "month": "Apr 2012", "volume": 10}
 
-        assert_that(create_transaction_data(header, row), has_items(
-            ["2012-04-01T00:00:00+00:00", "sorn", "fully-digital", "V-V11 SORN EVL", 10],
-        ))
+        assert_that(transaction_data(record), is_(
+            ["2012-04-01T00:00:00+00:00", "sorn", "fully-digital", "V-V11 SORN EVL", 10]))
+
+    def test_creating_transaction_data_counts_missing_volumes_as_zero(self):
+        record = {"channel": "Manual", "service": "SORN",
+                  "transaction": "V-V890 SORN Declaration",
+                  "month": "Apr 2012", "volume": "-"}
+
+        assert_that(transaction_data(record)[-1], is_(0))
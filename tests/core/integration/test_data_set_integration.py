@@ -53,7 +53,9 @@ class TestDataSetIntegration(unittest.TestCase):
         })
 
     def tearDown(self):
-        self.mongo_collection.drop()
+        # Records are saved behind the storage engine's back, so its
+        # metadata for the data set has to go too
+        self.storage.delete_data_set(DATA_SET)
 
     def test_period_queries_get_sorted_by__week_start_at(self):
         self.setup__timestamp_data()
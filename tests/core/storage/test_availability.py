@@ -0,0 +1,124 @@
+import unittest
+
+from hamcrest import assert_that, is_, calling, raises
+from mock import Mock, patch
+
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from backdrop.core.errors import StorageUnavailableError
+from backdrop.core.storage.availability import Availability, CircuitBreaker
+
+
+def _failing(times, result='ok'):
+    return Mock(side_effect=[AutoReconnect('down')] * times + [result])
+
+
+@patch('backdrop.core.storage.availability.time')
+class CircuitBreakerTestCase(unittest.TestCase):
+
+    def _open_breaker(self, time):
+        time.time.return_value = 100
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        breaker.failed()
+        breaker.failed()
+        return breaker
+
+    def test_breaker_opens_after_repeated_failures(self, time):
+        breaker = self._open_breaker(time)
+
+        assert_that(breaker.is_open, is_(True))
+        assert_that(calling(breaker.before_call),
+                    raises(StorageUnavailableError))
+
+    def test_retry_after_counts_down_to_the_reset(self, time):
+        breaker = self._open_breaker(time)
+        time.time.return_value = 103.5
+
+        assert_that(breaker.retry_after(), is_(7))
+
+    def test_one_call_is_let_through_after_the_reset_timeout(self, time):
+        breaker = self._open_breaker(time)
+        time.time.return_value = 110
+
+        breaker.before_call()
+
+        assert_that(calling(breaker.before_call),
+                    raises(StorageUnavailableError))
+
+    def test_breaker_closes_when_the_trial_call_succeeds(self, time):
+        breaker = self._open_breaker(time)
+        time.time.return_value = 110
+        breaker.before_call()
+
+        breaker.succeeded()
+
+        assert_that(breaker.is_open, is_(False))
+        breaker.before_call()
+
+    def test_breaker_opens_again_when_the_trial_call_fails(self, time):
+        breaker = self._open_breaker(time)
+        time.time.return_value = 110
+        breaker.before_call()
+
+        breaker.failed()
+
+        assert_that(breaker.retry_after(), is_(10))
+
+
+@patch('backdrop.core.storage.availability.time')
+class AvailabilityTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.availability = Availability(
+            retries=2, breaker=CircuitBreaker(failure_threshold=10))
+
+    def test_dropped_connections_are_retried(self, time):
+        function = _failing(2)
+
+        assert_that(self.availability.call(function, retry=True), is_('ok'))
+        assert_that(time.sleep.call_count, is_(2))
+
+    def test_gives_up_after_the_retries(self, time):
+        function = _failing(3)
+
+        assert_that(
+            calling(self.availability.call).with_args(function, retry=True),
+            raises(StorageUnavailableError))
+        assert_that(function.call_count, is_(3))
+
+    def test_operations_that_cannot_be_repeated_are_not_retried(self, time):
+        function = _failing(1)
+
+        assert_that(
+            calling(self.availability.call).with_args(function, retry=False),
+            raises(StorageUnavailableError))
+        assert_that(function.call_count, is_(1))
+
+    def test_other_errors_are_raised_as_they_are(self, time):
+        function = Mock(side_effect=OperationFailure('bad query'))
+
+        assert_that(
+            calling(self.availability.call).with_args(function, retry=True),
+            raises(OperationFailure))
+        assert_that(function.call_count, is_(1))
+
+    def test_retries_stop_when_the_breaker_opens(self, time):
+        availability = Availability(
+            retries=5, breaker=CircuitBreaker(failure_threshold=2))
+        function = _failing(5)
+
+        assert_that(
+            calling(availability.call).with_args(function, retry=True),
+            raises(StorageUnavailableError))
+        assert_that(function.call_count, is_(2))
+
+    def test_nested_calls_are_left_to_the_outer_call(self, time):
+        inner = _failing(1)
+
+        def outer():
+            return self.availability.call(inner, retry=True)
+
+        assert_that(
+            calling(self.availability.call).with_args(outer, retry=False),
+            raises(StorageUnavailableError))
+        assert_that(inner.call_count, is_(1))
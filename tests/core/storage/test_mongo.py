@@ -8,14 +8,26 @@ module itself.
 
 from hamcrest import assert_that, is_, has_key
 from nose.tools import assert_raises
-from mock import Mock
+from mock import Mock, MagicMock
 
 import datetime
+import pytz
 
-from pymongo.errors import AutoReconnect
+from pymongo.errors import AutoReconnect, CollectionInvalid, ExecutionTimeout
+from pymongo.read_preferences import ReadPreference
 
-from backdrop.core.storage.mongo import MongoStorageEngine, reconnecting_save, time_as_utc
+from backdrop.core.storage.mongo import MongoStorageEngine, reconnecting_save, time_as_utc, \
+    JOB_TTL
 from backdrop.core.data_set import DataSet
+from backdrop.core.deadline import Deadline
+from backdrop.core.errors import DataSetCreationError, StorageUnavailableError, \
+    QueryTimeoutError
+from backdrop.core.storage.availability import Availability
+from backdrop.core.query import Query
+from backdrop.core.records import add_period_keys
+from backdrop.core.timeseries import WEEK
+
+from tests.support.test_helpers import d_tz
 
 from .test_storage import BaseStorageTest
 
@@ -52,10 +64,365 @@ class TestMongoStorageEngine(BaseStorageTest):
         assert_that(last_updated.minute, is_(timestamp.minute))
         assert_that(last_updated.second, is_(timestamp.second))
 
+    def test_batch_last_updated_after_emptying(self):
+        self.engine.create_data_set('some_data', 0)
+        self.engine.save_record('some_data', {'foo': 'bar'})
+        self.engine.empty_data_set('some_data')
+
+        data_set = DataSet(self.engine, {'name': 'some_data'})
+        self.engine.batch_last_updated([data_set])
+
+        assert_that(data_set.get_last_updated(),
+                    is_(time_as_utc(datetime.datetime.min)))
+
+    def test_batch_last_updated_without_metadata(self):
+        timestamp = d_tz(2014, 11, 1)
+        self.engine.create_data_set('some_data', 0)
+        self.engine._collection('some_data').save({
+            '_timestamp': timestamp, '_updated_at': d_tz(2014, 12, 1)})
+
+        data_set = DataSet(self.engine, {'name': 'some_data'})
+        self.engine.batch_last_updated([data_set])
+
+        assert_that(data_set.get_last_updated(), is_(timestamp))
+        assert_that(
+            self.engine._db['data_set_meta'].find_one('some_data'),
+            has_key('latest_timestamp'))
+
+    def test_data_set_meta_is_kept_as_records_are_saved(self):
+        self.engine.create_data_set('some_data', 0)
+        self.engine.save_records('some_data', [
+            {'_id': 'a', '_timestamp': d_tz(2014, 12, 2)},
+            {'_id': 'b', '_timestamp': d_tz(2014, 12, 1)},
+        ])
+        self.engine.save_record('some_data', {
+            '_id': 'a', '_timestamp': d_tz(2014, 12, 3)})
+
+        meta = self.engine.get_data_set_meta('some_data')
+
+        assert_that(meta['record_count'], is_(2))
+        assert_that(meta['earliest_timestamp'], is_(d_tz(2014, 12, 1)))
+        assert_that(meta['latest_timestamp'], is_(d_tz(2014, 12, 3)))
+        assert_that(meta['last_updated'], is_(time_as_utc(
+            self.engine._collection('some_data').find_one('a')['_updated_at'])))
+        assert_that(meta['version'], is_(3))
+
+    def test_data_set_meta_is_reset_when_emptied(self):
+        self.engine.create_data_set('some_data', 0)
+        self.engine.save_record('some_data', {'_timestamp': d_tz(2014, 12, 1)})
+        version = self.engine.get_data_set_meta('some_data')['version']
+
+        self.engine.empty_data_set('some_data')
+        self.engine.save_record('some_data', {'_timestamp': d_tz(2014, 12, 5)})
+
+        meta = self.engine.get_data_set_meta('some_data')
+        assert_that(meta['record_count'], is_(1))
+        assert_that(meta['earliest_timestamp'], is_(d_tz(2014, 12, 5)))
+        assert_that(meta['version'], is_(version + 2))
+
+    def test_data_set_meta_is_worked_out_for_untracked_data_sets(self):
+        collection = self.engine._collection('some_data')
+        collection.save({'_timestamp': d_tz(2014, 12, 1),
+                         '_updated_at': d_tz(2014, 12, 20)})
+        collection.save({'_timestamp': d_tz(2014, 12, 8),
+                         '_updated_at': d_tz(2014, 12, 10)})
+        self.engine.save_record('some_data', {'_timestamp': d_tz(2014, 12, 9)})
+
+        meta = self.engine.get_data_set_meta('some_data')
+
+        assert_that(meta['record_count'], is_(3))
+        assert_that(meta['earliest_timestamp'], is_(d_tz(2014, 12, 1)))
+        assert_that(meta['latest_timestamp'], is_(d_tz(2014, 12, 9)))
+
+    def test_get_period_last_updated(self):
+        self.engine.create_data_set('some_data', 0)
+        for day in [1, 2, 9]:
+            self.engine.save_record('some_data', add_period_keys({
+                '_timestamp': d_tz(2014, 12, day),
+            }))
+
+        last_updated = self.engine.get_period_last_updated(
+            'some_data', WEEK, d_tz(2014, 12, 1), d_tz(2014, 12, 15))
+
+        assert_that(sorted(last_updated.keys()),
+                    is_([d_tz(2014, 12, 1), d_tz(2014, 12, 8)]))
+
+    def test_transform_watermarks(self):
+        watermarks = {
+            d_tz(2014, 12, 1): d_tz(2014, 12, 20),
+            d_tz(2014, 12, 8): d_tz(2014, 12, 21),
+        }
+
+        self.engine.set_transform_watermarks('transform', 'some_data',
+                                             watermarks)
+        self.engine.set_transform_watermarks('transform', 'some_data', {
+            d_tz(2014, 12, 8): d_tz(2014, 12, 22),
+        })
+
+        assert_that(
+            self.engine.get_transform_watermarks('transform', 'some_data'),
+            is_({
+                d_tz(2014, 12, 1): d_tz(2014, 12, 20),
+                d_tz(2014, 12, 8): d_tz(2014, 12, 22),
+            }))
+
+    def test_transform_watermarks_are_empty_if_never_set(self):
+        assert_that(
+            self.engine.get_transform_watermarks('transform', 'some_data'),
+            is_({}))
+
+    def test_create_and_update_job(self):
+        self.engine.create_job('job123', {
+            'total': 2, 'completed': 0, 'errors': []})
+
+        job = self.engine.update_job(
+            'job123',
+            increment={'completed': 1},
+            append={'errors': 'oops'},
+            status='running')
+
+        assert_that(job['completed'], is_(1))
+        assert_that(job['errors'], is_(['oops']))
+        assert_that(self.engine.get_job('job123')['status'], is_('running'))
+
+    def test_get_missing_job(self):
+        assert_that(self.engine.get_job('job123'), is_(None))
+
+    def test_set_and_get_upload_fingerprint(self):
+        self.engine.set_upload_fingerprint('foo_bar', 'abc')
+        self.engine.set_upload_fingerprint('foo_bar', 'def')
+
+        fingerprint = self.engine.get_upload_fingerprint('foo_bar')
+        assert_that(fingerprint['fingerprint'], is_('def'))
+        assert_that(fingerprint['uploaded_at'].tzinfo, is_(pytz.UTC))
+
+    def test_missing_upload_fingerprint(self):
+        assert_that(self.engine.get_upload_fingerprint('foo_bar'), is_(None))
+
+    def test_find_records(self):
+        self._save_all('foo_bar', {'_id': 'a', 'value': 1},
+                       {'_id': 'b', 'value': 2})
+
+        records = self.engine.find_records('foo_bar', ['a', 'c'])
+
+        assert_that(records.keys(), is_(['a']))
+        assert_that(records['a']['value'], is_(1))
+
+    def test_claim_task(self):
+        assert_that(self.engine.claim_task('key', 60), is_(True))
+        assert_that(self.engine.claim_task('key', 60), is_(False))
+
+        self.engine.release_task('key')
+
+        assert_that(self.engine.claim_task('key', 60), is_(True))
+
+    def test_expired_task_claims_can_be_claimed(self):
+        self.engine.claim_task('key', -1)
+
+        assert_that(self.engine.claim_task('key', 60), is_(True))
+
     def teardown(self):
         self.engine._mongo.drop_database('backdrop_test')
 
 
+class TestCollectionNames(object):
+    def setup(self):
+        self.mongo = MagicMock()
+        self.db = self.mongo['backdrop_test']
+        self.db.collection_names.return_value = ['foo']
+        self.engine = MongoStorageEngine(self.mongo, 'backdrop_test')
+
+    def test_collections_are_listed_once(self):
+        assert_that(self.engine.data_set_exists('foo'), is_(True))
+        assert_that(self.engine.data_set_exists('foo'), is_(True))
+
+        assert_that(self.db.collection_names.call_count, is_(1))
+
+    def test_unknown_collections_are_looked_for_again(self):
+        self.engine.data_set_exists('foo')
+        self.db.collection_names.return_value = ['foo', 'bar']
+
+        assert_that(self.engine.data_set_exists('bar'), is_(True))
+
+    def test_created_and_deleted_collections_are_known(self):
+        self.engine.data_set_exists('foo')
+
+        self.engine.create_data_set('bar', 0)
+        assert_that(self.engine.data_set_exists('bar'), is_(True))
+        self.engine.delete_data_set('foo')
+        self.db.collection_names.return_value = ['bar']
+        assert_that(self.engine.data_set_exists('foo'), is_(False))
+
+        assert_that(self.db.collection_names.call_count, is_(2))
+
+    def test_collections_are_listed_again_after_a_failed_create(self):
+        self.engine.data_set_exists('foo')
+        self.db.create_collection.side_effect = CollectionInvalid('exists')
+
+        assert_raises(DataSetCreationError,
+                      self.engine.create_data_set, 'bar', 0)
+        self.engine.data_set_exists('foo')
+
+        assert_that(self.db.collection_names.call_count, is_(2))
+
+
+class TestRecordCount(object):
+    def setup(self):
+        self.mongo = MagicMock()
+        self.db = self.mongo['backdrop_test']
+        self.engine = MongoStorageEngine(self.mongo, 'backdrop_test')
+
+    def _meta_update(self):
+        return self.db['data_set_meta'].update.call_args_list[0][0][1]
+
+    def test_inserted_records_are_counted(self):
+        self.db['foo'].options.return_value = {}
+
+        self.engine.save_records('foo', [{'a': 1}, {'a': 2}])
+
+        assert_that(self._meta_update()['$inc']['record_count'], is_(2))
+
+    def test_capped_data_sets_are_counted_again(self):
+        self.db['foo'].options.return_value = {'capped': True}
+        self.db['foo'].count.return_value = 10
+
+        self.engine.save_records('foo', [{'a': 1}])
+
+        update = self._meta_update()
+        assert_that(update['$set']['record_count'], is_(10))
+        assert_that('record_count' in update['$inc'], is_(False))
+
+
+class TestBatchLastUpdated(object):
+    def setup(self):
+        self.mongo = MagicMock()
+        self.meta = self.mongo['backdrop_test']['data_set_meta']
+        self.engine = MongoStorageEngine(self.mongo, 'backdrop_test')
+
+    def test_latest_timestamp_is_used(self):
+        self.meta.find.return_value = [{
+            '_id': 'foo', 'version': 2,
+            'last_updated': d_tz(2014, 12, 8),
+            'latest_timestamp': d_tz(2014, 12, 1)}]
+        data_set = DataSet(self.engine, {'name': 'foo'})
+
+        self.engine.batch_last_updated([data_set])
+
+        assert_that(data_set.get_last_updated(), is_(d_tz(2014, 12, 1)))
+
+    def test_data_sets_without_records_are_out_of_date(self):
+        self.meta.find.return_value = [{'_id': 'foo', 'version': 1}]
+        data_set = DataSet(self.engine, {
+            'name': 'foo', 'max_age_expected': 60})
+
+        self.engine.batch_last_updated([data_set])
+
+        assert_that(data_set.is_recent_enough(), is_(False))
+
+
+class TestJobs(object):
+    def test_jobs_expire(self):
+        mongo = MagicMock()
+        engine = MongoStorageEngine(mongo, 'backdrop_test')
+
+        engine.create_job('job123', {'type': 'test'})
+
+        mongo['backdrop_test']['jobs'].ensure_index.assert_called_with(
+            '_updated_at', expireAfterSeconds=JOB_TTL)
+
+
+class TestQueryReadPreference(object):
+    def setup(self):
+        self.mongo = MagicMock()
+        self.collection = self.mongo['backdrop_test']['foo']
+
+    def test_queries_use_the_query_read_preference(self):
+        engine = MongoStorageEngine(
+            self.mongo, 'backdrop_test', 'secondaryPreferred', 20)
+
+        engine.execute_query('foo', Query.create())
+
+        assert_that(self.collection.read_preference,
+                    is_(ReadPreference.SECONDARY_PREFERRED))
+        assert_that(self.collection.secondary_acceptable_latency_ms, is_(20))
+
+    def test_queries_use_the_client_read_preference_by_default(self):
+        self.collection.read_preference = ReadPreference.PRIMARY
+        engine = MongoStorageEngine(self.mongo, 'backdrop_test')
+
+        engine.execute_query('foo', Query.create())
+
+        assert_that(self.collection.read_preference,
+                    is_(ReadPreference.PRIMARY))
+
+    def test_queries_can_be_read_from_the_primary(self):
+        self.collection.read_preference = ReadPreference.PRIMARY
+        engine = MongoStorageEngine(
+            self.mongo, 'backdrop_test', 'secondaryPreferred', 20)
+
+        engine.execute_query('foo', Query.create(), primary=True)
+
+        assert_that(self.collection.read_preference,
+                    is_(ReadPreference.PRIMARY))
+
+    def test_unknown_read_preferences_are_rejected(self):
+        assert_raises(ValueError, MongoStorageEngine,
+                      self.mongo, 'backdrop_test', 'secondaryMaybe')
+
+
+class TestQueryTimeLimits(object):
+    def setup(self):
+        self.mongo = MagicMock()
+        self.collection = self.mongo['backdrop_test']['foo']
+        self.engine = MongoStorageEngine(self.mongo, 'backdrop_test')
+
+    def test_queries_are_given_the_time_left(self):
+        self.engine.execute_query('foo', Query.create(), Deadline(10))
+
+        max_time_ms = self.collection.find.return_value.max_time_ms
+        assert_that(0 < max_time_ms.call_args[0][0] <= 10000, is_(True))
+
+    def test_grouped_queries_are_given_the_time_left(self):
+        self.engine.execute_query(
+            'foo', Query.create(group_by=['a']), Deadline(10))
+
+        max_time_ms = self.collection.group.call_args[1]['maxTimeMS']
+        assert_that(0 < max_time_ms <= 10000, is_(True))
+
+    def test_queries_without_a_deadline_have_no_time_limit(self):
+        self.engine.execute_query('foo', Query.create(group_by=['a']))
+
+        assert_that('maxTimeMS' in self.collection.group.call_args[1],
+                    is_(False))
+
+    def test_queries_that_run_out_of_time_raise_query_timeout(self):
+        self.collection.group.side_effect = ExecutionTimeout('too slow')
+
+        assert_raises(QueryTimeoutError, self.engine.execute_query,
+                      'foo', Query.create(group_by=['a']), Deadline(10))
+
+
+class TestAvailability(object):
+    def setup(self):
+        self.mongo = MagicMock()
+        self.db = self.mongo['backdrop_test']
+        self.engine = MongoStorageEngine(
+            self.mongo, 'backdrop_test',
+            availability=Availability(base_delay=0))
+
+    def test_reads_are_retried_when_the_connection_drops(self):
+        self.db['foo'].find.side_effect = [AutoReconnect('down'), []]
+
+        assert_that(self.engine.find_records('foo', ['a']), is_({}))
+
+    def test_saves_are_not_retried(self):
+        self.db['foo'].insert.side_effect = AutoReconnect('down')
+
+        assert_raises(StorageUnavailableError,
+                      self.engine.save_records, 'foo', [{'a': 1}])
+        assert_that(self.db['foo'].insert.call_count, is_(1))
+
+
 class TestReconnectingSave(object):
     def test_reconnecting_save_retries(self):
         collection = Mock()
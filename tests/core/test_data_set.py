@@ -8,7 +8,7 @@ from freezegun import freeze_time
 from backdrop.core import data_set
 from backdrop.core.query import Query
 from backdrop.core.timeseries import WEEK, MONTH
-from backdrop.core.errors import ValidationError
+from backdrop.core.errors import ValidationError, QueryTimeoutError
 from jsonschema import ValidationError as SchemaValidationError
 from tests.support.test_helpers import d, d_tz, match
 
@@ -52,6 +52,12 @@ class TestNewDataSet_attributes(BaseDataSetTest):
         self.mock_storage.get_last_updated.return_value = d_tz(2014, 7, 1)
         assert_that(self.data_set.get_seconds_out_of_date(), is_(int))
 
+    def test_last_updated_can_be_given(self):
+        self.data_set.set_last_updated(None)
+
+        assert_that(self.data_set.get_last_updated(), is_(None))
+        assert_that(self.mock_storage.get_last_updated.called, is_(False))
+
     def test_seconds_out_of_date_shows_correct_number_of_seconds_out_of_date(self):
         with freeze_time('2014-01-28'):
             # We expect it to be 0 seconds out of date
@@ -87,14 +93,14 @@ class TestDataSet_store(BaseDataSetTest):
 
     def test_storing_a_simple_record(self):
         self.data_set.store([{'foo': 'bar'}])
-        self.mock_storage.save_record.assert_called_with(
-            'test_data_set', {'foo': 'bar'})
+        self.mock_storage.save_records.assert_called_with(
+            'test_data_set', [{'foo': 'bar'}])
 
     def test_id_gets_automatically_generated_if_auto_ids_are_set(self):
         self.setup_config({'auto_ids': ['foo']})
         self.data_set.store([{'foo': 'bar'}])
-        self.mock_storage.save_record.assert_called_with(
-            'test_data_set', match(has_entry('_id', 'YmFy')))
+        self.mock_storage.save_records.assert_called_with(
+            'test_data_set', match(contains(has_entry('_id', 'YmFy'))))
 
     def test_timestamp_gets_parsed(self):
         """Test that timestamps get parsed
@@ -102,9 +108,9 @@ class TestDataSet_store(BaseDataSetTest):
         see the backdrop.core.records module
         """
         self.data_set.store([{'_timestamp': '2012-12-12T00:00:00+00:00'}])
-        self.mock_storage.save_record.assert_called_with(
+        self.mock_storage.save_records.assert_called_with(
             'test_data_set',
-            match(has_entry('_timestamp',  d_tz(2012, 12, 12))))
+            match(contains(has_entry('_timestamp',  d_tz(2012, 12, 12)))))
 
     def test_record_gets_validated(self):
         errors = self.data_set.store([{'_foo': 'bar'}])
@@ -123,16 +129,16 @@ class TestDataSet_store(BaseDataSetTest):
 
     def test_period_keys_are_added(self):
         self.data_set.store([{'_timestamp': '2012-12-12T00:00:00+00:00'}])
-        self.mock_storage.save_record.assert_called_with(
+        self.mock_storage.save_records.assert_called_with(
             'test_data_set',
-            match(has_entry('_day_start_at', d_tz(2012, 12, 12))))
+            match(contains(has_entry('_day_start_at', d_tz(2012, 12, 12)))))
 
-    @patch('backdrop.core.storage.mongo.MongoStorageEngine.save_record')
+    @patch('backdrop.core.storage.mongo.MongoStorageEngine.save_records')
     @patch('backdrop.core.records.add_period_keys')
     def test_store_returns_array_of_errors_if_errors(
             self,
             add_period_keys_patch,
-            save_record_patch):
+            save_records_patch):
         self.setup_config({
             'schema': self.schema,
             'auto_ids': ["_timestamp", "that"]})
@@ -177,14 +183,14 @@ class TestDataSet_store(BaseDataSetTest):
             is_(8)
         )
         assert_that(add_period_keys_patch.called, is_(False))
-        assert_that(save_record_patch.called, is_(False))
+        assert_that(save_records_patch.called, is_(False))
 
-    @patch('backdrop.core.storage.mongo.MongoStorageEngine.save_record')
+    @patch('backdrop.core.storage.mongo.MongoStorageEngine.save_records')
     @patch('backdrop.core.records.add_period_keys')
     def test_store_does_not_get_auto_id_type_error_due_to_datetime(
             self,
             add_period_keys_patch,
-            save_record_patch):
+            save_records_patch):
         self.setup_config({
             'schema': self.schema,
             'auto_ids': ["_timestamp", "that"]})
@@ -217,7 +223,7 @@ class TestDataSet_store(BaseDataSetTest):
             is_(5)
         )
         assert_that(add_period_keys_patch.called, is_(False))
-        assert_that(save_record_patch.called, is_(False))
+        assert_that(save_records_patch.called, is_(False))
 
 
 class TestDataSet_execute_query(BaseDataSetTest):
@@ -234,6 +240,29 @@ class TestDataSet_execute_query(BaseDataSetTest):
             Query.create(period=WEEK)
         )
 
+    def test_data_set_query_time_limit_is_used_over_the_default(self):
+        self.setup_config({'query_time_limit': 5})
+        self.mock_storage.execute_query.return_value = []
+
+        self.data_set.execute_query(Query.create(), 20)
+
+        deadline = self.mock_storage.execute_query.call_args[0][2]
+        assert_that(deadline.seconds, is_(5))
+
+    @patch('backdrop.core.deadline.time')
+    def test_query_fails_when_putting_results_together_runs_late(self, time):
+        time.time.return_value = 0
+
+        def slow_query(name, query, deadline, primary):
+            time.time.return_value = 30
+            return [{"_week_start_at": d(2013, 1, 7), "_count": 1}]
+        self.mock_storage.execute_query.side_effect = slow_query
+
+        assert_raises(
+            QueryTimeoutError,
+            self.data_set.execute_query,
+            Query.create(period=WEEK), 20)
+
     def test_last_updated_only_queries_once(self):
         self.mock_storage.get_last_updated.return_value = 3
 
@@ -0,0 +1,132 @@
+import unittest
+
+from hamcrest import assert_that, is_, contains, calling, raises
+
+from backdrop.core.upload.extraction import (
+    SheetTemplate, RowRecords, ColumnRecords, HeaderColumns, Melt, nth_sheet)
+
+
+def _rows_then_fail(rows):
+    for row in rows:
+        yield row
+    raise AssertionError("Read past the rows the template needs")
+
+
+class SheetTemplateTestCase(unittest.TestCase):
+
+    def test_cells_give_a_single_record(self):
+        template = SheetTemplate(cells={'a': (0, 1), 'b': (2, 0)})
+
+        records = list(template.extract(_rows_then_fail([
+            ['x', 1],
+            ['y', 2],
+            [3, 'z'],
+        ])))
+
+        assert_that(records, is_([{'a': 1, 'b': 3}]))
+
+    def test_row_records_are_read_until_the_condition_is_met(self):
+        template = SheetTemplate(
+            cells={'when': (0, 0)},
+            records=RowRecords(first_row=1, columns={'value': 1},
+                               until=lambda record: record['value'] == 0))
+
+        records = list(template.extract(_rows_then_fail([
+            ['today'],
+            ['a', 1],
+            ['b', 2],
+            ['c', 0],
+        ])))
+
+        assert_that(records, contains(
+            {'when': 'today', 'value': 1},
+            {'when': 'today', 'value': 2}))
+
+    def test_given_rows_are_labelled(self):
+        template = SheetTemplate(records=RowRecords(
+            rows={1: {'group': 'a'}, 3: {'group': 'b'}},
+            columns={'value': 0}))
+
+        records = list(template.extract(_rows_then_fail([
+            ['ignored'], [1], ['ignored'], [2],
+        ])))
+
+        assert_that(records, contains(
+            {'group': 'a', 'value': 1},
+            {'group': 'b', 'value': 2}))
+
+    def test_column_records(self):
+        template = SheetTemplate(records=ColumnRecords(
+            first_column=1, rows={'name': 0, 'value': 2}))
+
+        records = list(template.extract(_rows_then_fail([
+            ['Name', 'a', 'b'],
+            ['Ignored', None, None],
+            ['Value', 1, 2],
+        ])))
+
+        assert_that(records, contains(
+            {'name': 'a', 'value': 1},
+            {'name': 'b', 'value': 2}))
+
+    def test_column_records_stop_at_the_last_column(self):
+        template = SheetTemplate(records=ColumnRecords(
+            first_column=1, last_column=1, rows={'value': 0}))
+
+        records = list(template.extract([['Value', 1, 2]]))
+
+        assert_that(records, is_([{'value': 1}]))
+
+    def test_melt_gives_a_record_per_column(self):
+        template = SheetTemplate(
+            records=RowRecords(first_row=0, columns={'name': 0}),
+            melt=Melt({'x': 1, 'y': 3}, 'axis', 'value'))
+
+        records = list(template.extract([['a', 1, 'ignored', 2]]))
+
+        assert_that(records, contains(
+            {'name': 'a', 'axis': 'x', 'value': 1},
+            {'name': 'a', 'axis': 'y', 'value': 2}))
+
+    def test_melt_header_columns(self):
+        template = SheetTemplate(
+            header_row=0,
+            records=RowRecords(first_row=1, columns={'name': 0}),
+            melt=Melt(HeaderColumns(1, lambda h: h != 'Total'),
+                      'month', 'value'))
+
+        records = list(template.extract([
+            ['Name', 'Jan', 'Total', 'Feb'],
+            ['a', 1, 3, 2],
+        ]))
+
+        assert_that(records, contains(
+            {'name': 'a', 'month': 'Jan', 'value': 1},
+            {'name': 'a', 'month': 'Feb', 'value': 2}))
+
+    def test_missing_rows_are_an_error(self):
+        template = SheetTemplate(cells={'a': (2, 0)})
+
+        assert_that(calling(list).with_args(template.extract([[1]])),
+                    raises(IndexError))
+
+    def test_cells_after_the_records_are_rejected(self):
+        assert_that(
+            calling(SheetTemplate).with_args(
+                cells={'a': (5, 0)},
+                records=RowRecords(first_row=1, columns={'b': 0})),
+            raises(ValueError))
+
+    def test_column_records_cannot_be_melted(self):
+        assert_that(
+            calling(SheetTemplate).with_args(
+                records=ColumnRecords(first_column=0, rows={'a': 0}),
+                melt=Melt({'x': 1}, 'axis', 'value')),
+            raises(ValueError))
+
+
+class NthSheetTestCase(unittest.TestCase):
+
+    def test_missing_sheet_is_an_error(self):
+        assert_that(calling(nth_sheet).with_args(iter([[]]), 1),
+                    raises(IndexError))
@@ -3,9 +3,12 @@
 from cStringIO import StringIO
 import unittest
 from hamcrest import assert_that, only_contains, is_, contains
+from mock import patch
 
-from backdrop.core.upload.parse_csv import parse_csv, lines
+from backdrop.core.upload.parse_csv import (parse_csv, lines,
+                                            parse_as_number, SAMPLE_SIZE)
 from backdrop.core.errors import ParseError
+from backdrop.core.upload import create_parser
 
 
 class ParseCsvTestCase(unittest.TestCase):
@@ -133,12 +136,94 @@ class ParseCsvTestCase(unittest.TestCase):
 
         data = parse_csv(csv_stream)
 
-        print(list(data[0]))
         assert_that(data, only_contains(only_contains(
             ["int", "float", "string"],
             [12, 12.1, "a string"],
         )))
 
+    def test_rows_are_read_as_they_are_consumed(self):
+        def stream():
+            yield "a,b\n"
+            for _ in range(SAMPLE_SIZE):
+                yield "1,2\n"
+            raise AssertionError("read past the sample of rows")
+
+        rows = parse_csv(stream())[0]
+
+        assert_that(next(rows), is_(["a", "b"]))
+        assert_that(next(rows), is_([1, 2]))
+
+    def test_columns_parse_like_cells(self):
+        cells = [u"12", u"-3", u" 4 ", u"1.5", u"1e3", u"-inf",
+                 u".5", u"", u"n/a", u"foo", u"12 apples", u"0x1"]
+        for first in cells:
+            for second in cells:
+                csv = u"a\n{}\n{}".format(first, second)
+
+                data = _traverse(parse_csv(_string_io(csv, "utf-8")))
+
+                expected = [parse_as_number(cell)
+                            for cell in (first, second) if cell != u""]
+                assert_that([row[0] for row in data[0][1:]], is_(expected))
+
+    def test_cells_not_matching_their_column_fall_back(self):
+        csv = u"a\n" + u"1\n" * SAMPLE_SIZE + u"n/a\n2.5\n3"
+
+        data = _traverse(parse_csv(_string_io(csv, "utf-8")))
+
+        assert_that(data[0][-3:], is_([["n/a"], [2.5], [3]]))
+
+    def test_schema_types_columns(self):
+        csv = u"code,count,rate\n0123,1,2\n4567,3,4.5"
+        schema = {"properties": {
+            "code": {"type": "string"},
+            "count": {"type": ["integer", "null"]},
+            "rate": {"type": "number"},
+        }}
+
+        data = _traverse(parse_csv(_string_io(csv, "utf-8"), schema))
+
+        assert_that(data, is_([[
+            ["code", "count", "rate"],
+            ["0123", 1, 2],
+            ["4567", 3, 4.5],
+        ]]))
+
+    def test_rows_of_the_wrong_length_are_passed_on(self):
+        csv = u"a,b\n1,2\n3,4,5"
+
+        data = _traverse(parse_csv(_string_io(csv, "utf-8")))
+
+        assert_that(data[0][-1], is_([3, 4, 5]))
+
+
+class CreateParserStatsTestCase(unittest.TestCase):
+    @patch('backdrop.core.upload.statsd')
+    def test_stats_are_sent_once_the_upload_is_read(self, mock_statsd):
+        stats = mock_statsd.aggregator.return_value
+        parser = create_parser({'name': 'foo', 'upload_format': 'csv'})
+
+        records = parser(_string_io("a,b\n1,2\n3,4"))
+        assert_that(stats.flush.called, is_(False))
+        list(records)
+
+        mock_statsd.aggregator.assert_called_once_with(data_set='foo')
+        stats.incr.assert_any_call('parse_csv.rows')
+        stats.incr.assert_any_call('upload.records')
+        stats.flush.assert_called_once_with()
+
+    @patch('backdrop.statsd.aggregator')
+    def test_stats_are_sent_without_an_aggregator_once_read(self,
+                                                            aggregator):
+        stats = aggregator.return_value
+        stats.__enter__.return_value = stats
+
+        rows = parse_csv(_string_io("a,b\n1,2\n3,4"))[0]
+        list(rows)
+
+        stats.incr.assert_any_call('parse_csv.rows')
+        assert_that(stats.__exit__.called, is_(True))
+
 
 class LinesGeneratorTest(unittest.TestCase):
     def test_handles_CR_LF_and_CRLF(self):
@@ -1,5 +1,6 @@
 import unittest
-from hamcrest import assert_that, contains, instance_of
+from hamcrest import assert_that, contains, instance_of, is_
+from mock import MagicMock, call, patch
 
 from backdrop.core.upload.parse_excel import parse_excel, EXCEL_ERROR
 from tests.support.test_helpers import fixture_path
@@ -63,3 +64,25 @@ class ParseExcelTestCase(unittest.TestCase):
         data = map(list, self._parse_excel("xlsfile.xls"))
 
         assert_that(data[0][1][2], instance_of(int))
+
+    def test_counts_are_added_to_stats(self):
+        stats = MagicMock()
+        sheets = parse_excel(open(fixture_path("multiple_sheets.xlsx")), stats)
+        for sheet in sheets:
+            list(sheet)
+
+        stats.incr.assert_any_call('parse_excel.sheets')
+        assert_that(stats.incr.call_args_list.count(
+            call('parse_excel.rows')), is_(6))
+
+    @patch('backdrop.statsd.aggregator')
+    def test_stats_are_sent_without_an_aggregator_once_read(self,
+                                                            aggregator):
+        stats = aggregator.return_value
+        stats.__enter__.return_value = stats
+
+        for sheet in self._parse_excel("multiple_sheets.xlsx"):
+            list(sheet)
+
+        stats.incr.assert_any_call('parse_excel.sheets')
+        assert_that(stats.__exit__.call_count, is_(aggregator.call_count))
@@ -0,0 +1,109 @@
+import unittest
+import zipfile
+from StringIO import StringIO
+
+import xlrd
+from hamcrest import assert_that, is_
+
+from backdrop.core.upload.parse_excel import parse_excel
+from backdrop.core.upload.parse_xlsx import open_workbook, is_xlsx
+from tests.support.test_helpers import fixture_path
+
+NAMESPACES = (
+    'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/'
+    'relationships"')
+RELATIONSHIP = (
+    '<Relationship Id="rId{0}" Target="worksheets/sheet{0}.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+    'relationships/worksheet"/>')
+
+
+def _workbook(*sheets):
+    """Build an xlsx file with sheets of the given sheetData contents"""
+    stream = StringIO()
+    workbook = zipfile.ZipFile(stream, 'w')
+    workbook.writestr('xl/_rels/workbook.xml.rels', (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/'
+        '2006/relationships">{}</Relationships>').format(''.join(
+            RELATIONSHIP.format(index + 1) for index in range(len(sheets)))))
+    workbook.writestr('xl/workbook.xml', (
+        '<workbook {}><sheets>{}</sheets></workbook>').format(
+            NAMESPACES, ''.join(
+                '<sheet name="Sheet{0}" sheetId="{0}" r:id="rId{0}"/>'.format(
+                    index + 1) for index in range(len(sheets)))))
+    for index, sheet in enumerate(sheets):
+        workbook.writestr(
+            'xl/worksheets/sheet{}.xml'.format(index + 1),
+            '<worksheet {}>{}</worksheet>'.format(NAMESPACES, sheet))
+    workbook.close()
+    stream.seek(0)
+    return stream
+
+
+def _values(rows):
+    return [[(cell.ctype, cell.value) for cell in row] for row in rows]
+
+
+class ParseXlsxTestCase(unittest.TestCase):
+
+    def assert_rows_match_xlrd(self, stream):
+        expected = [
+            _values(sheet.row(i) for i in range(sheet.nrows))
+            for sheet in xlrd.open_workbook(
+                file_contents=stream.getvalue()).sheets()]
+
+        workbook = open_workbook(stream)
+
+        assert_that([_values(sheet.rows()) for sheet in workbook.sheets()],
+                    is_(expected))
+
+    def test_rows_match_xlrd_for_fixtures(self):
+        for name in ['data.xlsx', 'dates.xlsx', 'error.xlsx',
+                     'multiple_sheets.xlsx', 'empty_cell_and_row.xlsx']:
+            with open(fixture_path(name)) as fixture:
+                self.assert_rows_match_xlrd(StringIO(fixture.read()))
+
+    def test_missing_rows_and_cells_are_filled_in(self):
+        self.assert_rows_match_xlrd(_workbook(
+            '<sheetData>'
+            '<row r="2"><c r="B2" t="inlineStr"><is><t>a</t></is></c></row>'
+            '<row r="3"><c r="A3"/></row>'
+            '<row r="5"><c r="D5" t="b"><v>1</v></c></row>'
+            '</sheetData>'))
+
+    def test_merged_cells_extend_the_sheet(self):
+        rows = list(parse_excel(_workbook(
+            '<sheetData><row r="1"><c r="A1"><v>1</v></c></row></sheetData>'
+            '<mergeCells><mergeCell ref="B3:C4"/></mergeCells>')))[0]
+
+        # xlrd leaves the first row unpadded here
+        assert_that(list(rows), is_([
+            [1, None, None],
+            [None, None, None],
+            [None, None, None],
+            [None, None, None],
+        ]))
+
+    def test_rows_out_of_order(self):
+        self.assert_rows_match_xlrd(_workbook(
+            '<sheetData>'
+            '<row r="3"><c r="A3"><v>3</v></c></row>'
+            '<row r="1"><c r="B1"><v>1</v></c></row>'
+            '</sheetData>'))
+
+    def test_sheets_are_only_read_when_their_rows_are(self):
+        stream = _workbook(
+            '<sheetData><row r="1"><c r="A1"><v>1</v></c></row></sheetData>',
+            '<sheetData><row r="1"><c r="A1"><v>not a number</v></c></row>'
+            '</sheetData>')
+
+        sheets = list(parse_excel(stream))
+
+        assert_that(list(sheets[0]), is_([[1]]))
+        self.assertRaises(ValueError, list, sheets[1])
+
+    def test_xls_files_are_not_xlsx(self):
+        with open(fixture_path('xlsfile.xls')) as fixture:
+            assert_that(is_xlsx(fixture), is_(False))
+            assert_that(fixture.tell(), is_(0))
@@ -1,5 +1,6 @@
+import itertools
 import unittest
-from hamcrest import only_contains, assert_that
+from hamcrest import only_contains, assert_that, is_
 from backdrop.core.errors import ParseError
 from backdrop.core.upload.utils import make_dicts
 
@@ -62,7 +63,8 @@ class TestMakeRecords(unittest.TestCase):
             ["val1", 123],
             ["", ""],
             [None, None],
-            ["val2", 456]
+            ["val2", 456],
+            [789, ""]
         ]
 
         records = list(make_dicts(rows))
@@ -70,4 +72,12 @@ class TestMakeRecords(unittest.TestCase):
         assert_that(records, only_contains(
             {"name": "val1", "size": 123},
             {"name": "val2", "size": 456},
+            {"name": 789, "size": ""},
         ))
+
+    def test_rows_are_consumed_lazily(self):
+        rows = itertools.chain([["name"]], itertools.repeat(["value"]))
+
+        records = list(itertools.islice(make_dicts(rows), 2))
+
+        assert_that(records, is_([{"name": "value"}, {"name": "value"}]))
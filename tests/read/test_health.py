@@ -0,0 +1,83 @@
+import datetime
+import unittest
+
+from freezegun import freeze_time
+from hamcrest import assert_that, is_, contains, has_entries
+from mock import Mock
+
+from backdrop.core.storage.mongo import time_as_utc
+from backdrop.read.health import DataSetHealth, health_report
+from tests.support.test_helpers import d_tz
+
+
+def _batch_last_updated(last_updated):
+    def set_last_updated(data_sets):
+        for data_set in data_sets:
+            data_set.set_last_updated(last_updated.get(data_set.name))
+    return set_last_updated
+
+
+class HealthReportTestCase(unittest.TestCase):
+
+    @freeze_time('2014-01-01T12:00:00')
+    def test_out_of_date_data_sets_are_reported(self):
+        storage = Mock()
+        storage.batch_last_updated.side_effect = _batch_last_updated({
+            'fresh': d_tz(2014, 1, 1, 11, 59),
+            'stale': d_tz(2014, 1, 1, 11),
+            'never_updated': time_as_utc(datetime.datetime.min),
+        })
+
+        report = health_report(storage, [
+            {'name': 'fresh', 'max_age_expected': 300},
+            {'name': 'stale', 'max_age_expected': 300},
+            {'name': 'never_updated', 'max_age_expected': 300},
+        ])
+
+        assert_that(report, contains(has_entries({
+            'name': 'stale',
+            'seconds-out-of-date': 3300,
+            'last-updated': d_tz(2014, 1, 1, 11),
+            'max-age-expected': 300,
+        }), has_entries({
+            'name': 'never_updated',
+        })))
+        assert_that(storage.get_last_updated.called, is_(False))
+
+
+class DataSetHealthTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = Mock()
+        self.storage.batch_last_updated.side_effect = _batch_last_updated({
+            'stale': d_tz(2014, 1, 1),
+        })
+        self.list_data_sets = Mock(return_value=[
+            {'name': 'stale', 'max_age_expected': 60}])
+
+    def test_report_is_worked_out_every_time_without_an_interval(self):
+        health = DataSetHealth(self.storage, self.list_data_sets, 0)
+
+        health.report()
+        report = health.report()
+
+        assert_that(self.list_data_sets.call_count, is_(2))
+        assert_that(report, contains(has_entries({'name': 'stale'})))
+
+    def test_report_is_kept_between_refreshes(self):
+        health = DataSetHealth(self.storage, self.list_data_sets, 3600)
+
+        first = health.report()
+        second = health.report()
+
+        assert_that(self.list_data_sets.call_count, is_(1))
+        assert_that(second, is_(first))
+
+    def test_refresh_replaces_the_report(self):
+        health = DataSetHealth(self.storage, self.list_data_sets, 3600)
+        health.report()
+        self.list_data_sets.return_value = []
+
+        health.refresh()
+
+        assert_that(health.report(), is_([]))
@@ -31,7 +31,8 @@ class QueryingApiTestCase(unittest.TestCase):
         mock_query.return_value = NoneData()
         self.app.get('/foo?filter_by=zombies:yes')
         mock_query.assert_called_with(
-            Query.create(filter_by=[[u'zombies', u'yes']]))
+            Query.create(filter_by=[[u'zombies', u'yes']]),
+            api.app.config['QUERY_TIME_LIMIT'], primary=False)
 
     @fake_data_set_exists("foo")
     @patch('backdrop.core.data_set.DataSet.execute_query')
@@ -39,7 +40,8 @@ class QueryingApiTestCase(unittest.TestCase):
         mock_query.return_value = NoneData()
         self.app.get('/foo?group_by=zombies')
         mock_query.assert_called_with(
-            Query.create(group_by=[u'zombies']))
+            Query.create(group_by=[u'zombies']),
+            api.app.config['QUERY_TIME_LIMIT'], primary=False)
 
     @fake_data_set_exists("foo", raw_queries_allowed=True)
     @patch('backdrop.core.data_set.DataSet.execute_query')
@@ -54,7 +56,8 @@ class QueryingApiTestCase(unittest.TestCase):
             '&end_at=' + urllib.quote("2012-12-12T08:12:43+00:00")
         )
         mock_query.assert_called_with(
-            Query.create(start_at=expected_start_at, end_at=expected_end_at))
+            Query.create(start_at=expected_start_at, end_at=expected_end_at),
+            api.app.config['QUERY_TIME_LIMIT'], primary=False)
 
     @fake_data_set_exists("foo", raw_queries_allowed=True)
     @patch('backdrop.core.data_set.DataSet.execute_query')
@@ -64,13 +67,15 @@ class QueryingApiTestCase(unittest.TestCase):
             '/foo?sort_by=value:ascending'
         )
         mock_query.assert_called_with(
-            Query.create(sort_by=["value", "ascending"]))
+            Query.create(sort_by=["value", "ascending"]),
+            api.app.config['QUERY_TIME_LIMIT'], primary=False)
 
         self.app.get(
             '/foo?sort_by=value:descending'
         )
         mock_query.assert_called_with(
-            Query.create(sort_by=["value", "descending"]))
+            Query.create(sort_by=["value", "descending"]),
+            api.app.config['QUERY_TIME_LIMIT'], primary=False)
 
     @fake_data_set_exists("data_set", queryable=False)
     def test_returns_404_when_data_set_is_not_queryable(self):
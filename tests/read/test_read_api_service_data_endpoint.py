@@ -7,6 +7,7 @@ import pytz
 from backdrop.core.timeseries import WEEK
 from backdrop.read import api
 from backdrop.core.query import Query
+from backdrop.core.errors import StorageUnavailableError, QueryTimeoutError
 from tests.support.performanceplatform_client import fake_data_set_exists, fake_no_data_sets_exist
 from tests.support.test_helpers import has_status, has_header, d_tz
 
@@ -34,7 +35,8 @@ class QueryingApiTestCase(unittest.TestCase):
         mock_query.assert_called_with(
             Query.create(period=WEEK,
                          start_at=d_tz(2012, 11, 5),
-                         end_at=d_tz(2012, 12, 3)))
+                         end_at=d_tz(2012, 12, 3)),
+            api.app.config['QUERY_TIME_LIMIT'], primary=False)
 
     @fake_data_set_exists("foo", data_group="some-group", data_type="some-type", raw_queries_allowed=True)
     @patch('backdrop.core.data_set.DataSet.execute_query')
@@ -42,7 +44,8 @@ class QueryingApiTestCase(unittest.TestCase):
         mock_query.return_value = NoneData()
         self.app.get('/data/some-group/some-type?filter_by=zombies:yes')
         mock_query.assert_called_with(
-            Query.create(filter_by=[[u'zombies', u'yes']]))
+            Query.create(filter_by=[[u'zombies', u'yes']]),
+            api.app.config['QUERY_TIME_LIMIT'], primary=False)
 
     @fake_data_set_exists("foo", data_group="some-group", data_type="some-type")
     @patch('backdrop.core.data_set.DataSet.execute_query')
@@ -50,7 +53,8 @@ class QueryingApiTestCase(unittest.TestCase):
         mock_query.return_value = NoneData()
         self.app.get('/data/some-group/some-type?group_by=zombies')
         mock_query.assert_called_with(
-            Query.create(group_by=[u'zombies']))
+            Query.create(group_by=[u'zombies']),
+            api.app.config['QUERY_TIME_LIMIT'], primary=False)
 
     @fake_data_set_exists("foo", data_group="some-group", data_type="some-type", raw_queries_allowed=True)
     @patch('backdrop.core.data_set.DataSet.execute_query')
@@ -66,7 +70,8 @@ class QueryingApiTestCase(unittest.TestCase):
             '&end_at=' + urllib.quote("2012-12-12T08:12:43+00:00")
         )
         mock_query.assert_called_with(
-            Query.create(start_at=expected_start_at, end_at=expected_end_at))
+            Query.create(start_at=expected_start_at, end_at=expected_end_at),
+            api.app.config['QUERY_TIME_LIMIT'], primary=False)
 
     @fake_data_set_exists("foo", data_group="some-group", data_type="some-type")
     @patch('backdrop.core.data_set.DataSet.execute_query')
@@ -82,7 +87,8 @@ class QueryingApiTestCase(unittest.TestCase):
             Query.create(period=WEEK,
                          group_by=['stuff'],
                          start_at=d_tz(2012, 11, 5),
-                         end_at=d_tz(2012, 12, 3)))
+                         end_at=d_tz(2012, 12, 3)),
+            api.app.config['QUERY_TIME_LIMIT'], primary=False)
 
     @fake_data_set_exists("foo", data_group="some-group", data_type="some-type", raw_queries_allowed=True)
     @patch('backdrop.core.data_set.DataSet.execute_query')
@@ -92,13 +98,25 @@ class QueryingApiTestCase(unittest.TestCase):
             '/data/some-group/some-type?sort_by=value:ascending'
         )
         mock_query.assert_called_with(
-            Query.create(sort_by=["value", "ascending"]))
+            Query.create(sort_by=["value", "ascending"]),
+            api.app.config['QUERY_TIME_LIMIT'], primary=False)
 
         self.app.get(
             '/data/some-group/some-type?sort_by=value:descending'
         )
         mock_query.assert_called_with(
-            Query.create(sort_by=["value", "descending"]))
+            Query.create(sort_by=["value", "descending"]),
+            api.app.config['QUERY_TIME_LIMIT'], primary=False)
+
+    @fake_data_set_exists("foo", data_group="some-group", data_type="some-type")
+    @patch('backdrop.core.data_set.DataSet.execute_query')
+    def test_queries_can_be_read_from_the_primary(self, mock_query):
+        mock_query.return_value = NoneData()
+        self.app.get(
+            '/data/some-group/some-type?group_by=zombies&read_from_primary=true')
+        mock_query.assert_called_with(
+            Query.create(group_by=[u'zombies']),
+            api.app.config['QUERY_TIME_LIMIT'], primary=True)
 
     @fake_data_set_exists("data_set", data_group="some-group", data_type="some-type", queryable=False)
     def test_returns_404_when_data_set_is_not_queryable(self):
@@ -110,6 +128,21 @@ class QueryingApiTestCase(unittest.TestCase):
         response = self.app.get('/data/no-group/no-type')
         assert_that(response, has_status(404))
 
+    @fake_data_set_exists("foo", data_group="some-group", data_type="some-type", raw_queries_allowed=True)
+    @patch('backdrop.core.data_set.DataSet.execute_query')
+    def test_returns_503_while_storage_is_unavailable(self, mock_query):
+        mock_query.side_effect = StorageUnavailableError(7)
+        response = self.app.get('/data/some-group/some-type')
+        assert_that(response, has_status(503))
+        assert_that(response, has_header('Retry-After', '7'))
+
+    @fake_data_set_exists("foo", data_group="some-group", data_type="some-type", raw_queries_allowed=True)
+    @patch('backdrop.core.data_set.DataSet.execute_query')
+    def test_returns_503_when_the_query_takes_too_long(self, mock_query):
+        mock_query.side_effect = QueryTimeoutError('too slow')
+        response = self.app.get('/data/some-group/some-type')
+        assert_that(response, has_status(503))
+
 
 class PreflightChecksApiTestCase(unittest.TestCase):
 
@@ -29,6 +29,13 @@ class TestRequestValidation(TestCase):
         assert_that(validation_result, is_invalid_with_message(
             "inclusive can be used only with either ['start_at', 'end_at']"))
 
+    def test_that_read_from_primary_must_be_a_bool(self):
+        validation_result = validate_request_args({
+            'read_from_primary': 'yes',
+        })
+        assert_that(validation_result, is_invalid_with_message(
+            "read_from_primary must be either 'true' or 'false'"))
+
     def test_that_inclusive_queries_with_not_a_bool(self):
         validation_result = validate_request_args({
             'inclusive': 'foo',
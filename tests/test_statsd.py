@@ -1,4 +1,5 @@
-from mock import Mock
+from hamcrest import assert_that, is_
+from mock import Mock, patch
 from backdrop import StatsClient
 
 
@@ -30,3 +31,46 @@ class TestStatsd(object):
     def test_should_prefix_unknown_when_no_data_set_is_provided(self):
         self.wrapper.incr('foo.bar')
         self.client.incr.assert_called_with('unknown.foo.bar')
+
+    def test_aggregator_sends_totals_once_when_flushed(self):
+        aggregator = self.wrapper.aggregator(data_set='monkey')
+        aggregator.incr('foo.bar')
+        aggregator.incr('foo.bar', 2)
+        aggregator.timing('foo.time', 10)
+        aggregator.timing('foo.time', 5)
+
+        assert not self.client.incr.called
+
+        aggregator.flush()
+        self.client.incr.assert_called_once_with('monkey.foo.bar', 3)
+        self.client.timing.assert_called_once_with('monkey.foo.time', 15)
+
+    def test_aggregator_is_emptied_when_flushed(self):
+        aggregator = self.wrapper.aggregator()
+        aggregator.incr('foo.bar')
+        aggregator.flush()
+        aggregator.flush()
+
+        self.client.incr.assert_called_once_with('unknown.foo.bar', 1)
+
+    def test_aggregator_flushes_at_end_of_with_block(self):
+        with self.wrapper.aggregator(data_set='monkey') as aggregator:
+            aggregator.incr('foo.bar')
+
+        self.client.incr.assert_called_once_with('monkey.foo.bar', 1)
+
+    @patch('backdrop.random')
+    def test_sampled_timers_are_scaled_up(self, mock_random):
+        aggregator = self.wrapper.aggregator()
+
+        mock_random.random.return_value = 0.5
+        with aggregator.timer('foo.time', rate=0.1):
+            pass
+        assert_that(aggregator._timings, is_({}))
+
+        mock_random.random.return_value = 0.05
+        with patch('backdrop.time') as mock_time:
+            mock_time.time.side_effect = [1.0, 1.002]
+            with aggregator.timer('foo.time', rate=0.1):
+                pass
+        assert_that(round(aggregator._timings['foo.time']), is_(20))
@@ -0,0 +1,65 @@
+import re
+import unittest
+
+from hamcrest import assert_that, is_
+from mock import Mock
+
+from backdrop.transformers.tasks.columnar import (Table, classify, matches,
+                                                  sum_where)
+
+
+data = [
+    {'_start_at': 'a', 'channel': 'digital', 'count': 1},
+    {'_start_at': 'b', 'channel': 'digital', 'count': 2},
+    {'_start_at': 'a', 'channel': 'non-digital', 'count': 3},
+    {'_start_at': 'a', 'count': 4},
+]
+
+
+class TableTestCase(unittest.TestCase):
+
+    def test_missing_values_are_none(self):
+        table = Table(data, ['channel'])
+
+        assert_that(table['channel'],
+                    is_(['digital', 'digital', 'non-digital', None]))
+
+    def test_group_returns_row_indexes(self):
+        groups = Table(data, ['_start_at']).group(['_start_at'])
+
+        assert_that(groups.items(), is_([
+            (('a',), [0, 2, 3]),
+            (('b',), [1]),
+        ]))
+
+
+class ClassifyTestCase(unittest.TestCase):
+
+    def test_classifier_is_called_once_per_distinct_value(self):
+        classifier = Mock(side_effect=lambda value: value.upper())
+
+        classified = classify(['a', 'b', 'a', 'a'], classifier)
+
+        assert_that(classified, is_(['A', 'B', 'A', 'A']))
+        assert_that(classifier.call_count, is_(2))
+
+    def test_unhashable_values_are_classified(self):
+        assert_that(classify([['a'], ['a']], len), is_([1, 1]))
+
+    def test_matches_treats_missing_values_as_not_matching(self):
+        table = Table(data, ['channel'])
+
+        assert_that(matches(table['channel'], re.compile('digital$')),
+                    is_([True, True, True, False]))
+
+
+class SumWhereTestCase(unittest.TestCase):
+
+    def test_sums_selected_rows_in_group(self):
+        values = [row['count'] for row in data]
+
+        assert_that(sum_where(values, [0, 2, 3], [True, True, False, True]),
+                    is_(5))
+
+    def test_nothing_selected_is_none(self):
+        assert_that(sum_where([1, 2], [0, 1], [False, False]), is_(None))
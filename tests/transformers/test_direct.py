@@ -0,0 +1,217 @@
+import pytz
+import unittest
+
+from datetime import datetime
+from hamcrest import assert_that, is_, has_entries, contains
+from mock import Mock, patch
+from nose.tools import assert_raises
+
+from backdrop.core.errors import ValidationError
+from backdrop.transformers import direct
+from backdrop.transformers.direct import DirectDataSet, get_storage
+from backdrop.transformers.dispatch import run_transform
+
+
+data_set_config = {
+    'name': 'group_type',
+    'data_group': 'group',
+    'data_type': 'type',
+    'capped_size': 0,
+}
+
+
+class DirectDataSetTestCase(unittest.TestCase):
+
+    def test_get_queries_storage_with_parsed_parameters(self):
+        storage = Mock()
+        storage.execute_query.return_value = [{
+            '_timestamp': datetime(2014, 12, 10, tzinfo=pytz.utc),
+            'count': 10,
+        }]
+        data_set = DirectDataSet(storage, data_set_config)
+
+        result = data_set.get(query_parameters={
+            'start_at': '2014-12-10T00:00:00+00:00',
+            'end_at': '2014-12-14T00:00:00+00:00',
+            'flatten': 'true',
+        })
+
+        name, query = storage.execute_query.call_args[0][:2]
+        assert_that(name, is_('group_type'))
+        assert_that(query.start_at,
+                    is_(datetime(2014, 12, 10, tzinfo=pytz.utc)))
+        assert_that(query.end_at,
+                    is_(datetime(2014, 12, 14, tzinfo=pytz.utc)))
+        assert_that(result['data'], contains(has_entries({
+            '_timestamp': '2014-12-10T00:00:00+00:00',
+            'count': 10,
+        })))
+
+    def test_post_saves_records(self):
+        storage = Mock()
+        storage.data_set_exists.return_value = True
+        data_set = DirectDataSet(storage, data_set_config)
+
+        data_set.post([{'_timestamp': '2014-12-10T00:00:00+00:00'}])
+
+        assert_that(storage.save_records.call_count, is_(1))
+
+    def test_post_creates_data_set_if_missing(self):
+        storage = Mock()
+        storage.data_set_exists.return_value = False
+        data_set = DirectDataSet(storage, data_set_config)
+
+        data_set.post([])
+
+        storage.create_data_set.assert_called_once_with('group_type', 0)
+
+    def test_changed_skips_records_matching_stored_records(self):
+        storage = Mock()
+        storage.find_records.return_value = {
+            'same': {
+                '_id': 'same',
+                '_timestamp': datetime(2014, 12, 10, tzinfo=pytz.utc),
+                '_updated_at': datetime(2014, 12, 11, tzinfo=pytz.utc),
+                'rate': 0.5,
+            },
+            'different': {'_id': 'different', 'rate': 0.5},
+        }
+        data_set = DirectDataSet(storage, data_set_config)
+        same = {'_id': 'same', '_timestamp': '2014-12-10T00:00:00+00:00',
+                'rate': 0.5}
+        different = {'_id': 'different', 'rate': 0.75}
+        new = {'_id': 'new', 'rate': 0.5}
+        no_id = {'rate': 0.5}
+
+        changed = data_set.changed([same, different, new, no_id])
+
+        assert_that(changed, is_([different, new, no_id]))
+        storage.find_records.assert_called_once_with(
+            'group_type', ['same', 'different', 'new'])
+
+    def test_post_raises_on_invalid_records(self):
+        storage = Mock()
+        data_set = DirectDataSet(storage, data_set_config)
+
+        assert_raises(ValidationError, data_set.post,
+                      [{'_timestamp': 'not a timestamp'}])
+        assert_that(storage.save_records.called, is_(False))
+
+
+class DirectRunTransformTestCase(unittest.TestCase):
+
+    @patch('backdrop.transformers.dispatch.config.TRANSFORMER_DIRECT_STORAGE',
+           True)
+    @patch('backdrop.transformers.dispatch.get_storage')
+    @patch('backdrop.transformers.dispatch.app')
+    @patch('backdrop.transformers.dispatch.get_admin_api')
+    @patch('backdrop.transformers.dispatch.DataSet')
+    @patch('backdrop.transformers.dispatch.DirectDataSet')
+    @patch('backdrop.transformers.tasks.debug.logging')
+    def test_run_transform_uses_storage(
+            self,
+            mock_logging_task,
+            mock_direct_data_set,
+            mock_data_set,
+            mock_adminAPI,
+            mock_app,
+            mock_get_storage):
+        mock_logging_task.return_value = [
+            {'_timestamp': '2014-12-10T00:00:00+00:00'}]
+        mock_adminAPI.return_value.get_data_set.return_value = {
+            'name': 'other_group_other_type',
+            'bearer_token': 'foo2',
+        }
+        data_set_instance = mock_direct_data_set.from_config.return_value
+        data_set_instance.name = 'other_group_other_type'
+        data_set_instance.get.return_value = {'data': []}
+        data_set_instance.changed.side_effect = lambda records: records
+        storage = mock_get_storage.return_value
+        storage.get_period_last_updated.return_value = {
+            datetime(2014, 12, 10, tzinfo=pytz.utc):
+                datetime(2014, 12, 15, tzinfo=pytz.utc),
+        }
+        storage.get_transform_watermarks.return_value = {}
+
+        earliest = datetime(2014, 12, 10, 12, 00, 00, tzinfo=pytz.utc)
+        latest = datetime(2014, 12, 14, 12, 00, 00, tzinfo=pytz.utc)
+
+        run_transform(data_set_config, {
+            'type': {
+                'function': 'backdrop.transformers.tasks.debug.logging',
+            },
+            'options': {},
+            'output': {
+                'data-group': 'other-group',
+                'data-type': 'other-type',
+            },
+        }, earliest, latest)
+
+        assert_that(mock_data_set.from_group_and_type.called, is_(False))
+        mock_direct_data_set.from_config.assert_any_call(data_set_config)
+        data_set_instance.post.assert_called_with(
+            [{'_timestamp': '2014-12-10T00:00:00+00:00'}])
+        mock_app.send_task.assert_called_once_with(
+            'backdrop.transformers.dispatch.entrypoint',
+            args=('other_group_other_type',
+                  datetime(2014, 12, 10, tzinfo=pytz.utc),
+                  datetime(2014, 12, 10, tzinfo=pytz.utc)))
+
+    @patch('backdrop.transformers.dispatch.config.TRANSFORMER_DIRECT_STORAGE',
+           True)
+    @patch('backdrop.transformers.dispatch.get_storage')
+    @patch('backdrop.transformers.dispatch.app')
+    @patch('backdrop.transformers.dispatch.get_admin_api')
+    @patch('backdrop.transformers.dispatch.DirectDataSet')
+    @patch('backdrop.transformers.tasks.debug.logging')
+    def test_unchanged_output_is_not_written_or_propagated(
+            self,
+            mock_logging_task,
+            mock_direct_data_set,
+            mock_adminAPI,
+            mock_app,
+            mock_get_storage):
+        mock_logging_task.return_value = [
+            {'_id': 'foo', '_timestamp': '2014-12-10T00:00:00+00:00'}]
+        mock_adminAPI.return_value.get_data_set.return_value = {
+            'name': 'other_group_other_type',
+        }
+        data_set_instance = mock_direct_data_set.from_config.return_value
+        data_set_instance.name = 'other_group_other_type'
+        data_set_instance.get.return_value = {'data': []}
+        data_set_instance.changed.return_value = []
+
+        output_window = run_transform(data_set_config, {
+            'type': {
+                'function': 'backdrop.transformers.tasks.debug.logging',
+            },
+            'options': {},
+            'output': {
+                'data-type': 'other-type',
+            },
+        }, datetime(2014, 12, 10, tzinfo=pytz.utc),
+            datetime(2014, 12, 14, tzinfo=pytz.utc), incremental=False)
+
+        assert_that(output_window, is_(None))
+        data_set_instance.post.assert_called_once_with([])
+        assert_that(mock_app.send_task.called, is_(False))
+
+
+@patch('backdrop.transformers.direct.MongoStorageEngine')
+class GetStorageTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        direct._storage = None
+
+    def test_storage_is_shared_within_a_process(self, mock_engine):
+        assert_that(get_storage(), is_(get_storage()))
+
+    @patch('backdrop.transformers.direct.os')
+    def test_storage_is_not_shared_with_forked_processes(self, mock_os,
+                                                         mock_engine):
+        mock_engine.create.side_effect = lambda *args: Mock()
+        mock_os.getpid.return_value = 1
+        first = get_storage()
+        mock_os.getpid.return_value = 2
+
+        assert_that(get_storage() is first, is_(False))
@@ -5,17 +5,19 @@ from datetime import datetime
 from hamcrest import assert_that, is_, has_entries, equal_to
 from mock import patch, MagicMock
 
+from backdrop.transformers.incremental import ComputedWindows
 from backdrop.transformers.dispatch import (
     entrypoint,
     run_transform,
     get_query_parameters,
-    get_or_get_and_create_output_dataset
+    get_or_get_and_create_output_dataset,
+    run_backfill_chunk
 )
 
 
 class DispatchTestCase(unittest.TestCase):
 
-    @patch('backdrop.transformers.dispatch.AdminAPI')
+    @patch('backdrop.transformers.dispatch.get_admin_api')
     @patch('backdrop.transformers.dispatch.app')
     def test_entrypoint(self, mock_app, mock_adminAPI):
         adminAPI_instance = mock_adminAPI.return_value
@@ -38,16 +40,115 @@ class DispatchTestCase(unittest.TestCase):
                 {"group": "foo", "type": "bar"},
                 {'type': 1},
                 earliest,
-                latest))
+                latest),
+            kwargs={'incremental': True},
+            queue='celery')
         mock_app.send_task.assert_any_call(
             'backdrop.transformers.dispatch.run_transform',
             args=(
                 {"group": "foo", "type": "bar"},
                 {'type': 2},
                 earliest,
-                latest))
+                latest),
+            kwargs={'incremental': True},
+            queue='celery')
 
-    @patch('backdrop.transformers.dispatch.AdminAPI')
+    @patch('backdrop.transformers.dispatch.get_admin_api')
+    @patch('backdrop.transformers.dispatch.app')
+    def test_entrypoint_sends_full_recomputes_to_backfill_queue(
+            self, mock_app, mock_adminAPI):
+        adminAPI_instance = mock_adminAPI.return_value
+        adminAPI_instance.get_data_set_transforms.return_value = [{'type': 1}]
+        adminAPI_instance.get_data_set_by_name.return_value = {'name': 'foo'}
+
+        earliest = datetime(2014, 12, 10, 12, 00, 00, tzinfo=pytz.utc)
+        latest = datetime(2014, 12, 14, 12, 00, 00, tzinfo=pytz.utc)
+        entrypoint('dataset123', earliest, latest, incremental=False)
+
+        mock_app.send_task.assert_called_once_with(
+            'backdrop.transformers.dispatch.run_transform',
+            args=({'name': 'foo'}, {'type': 1}, earliest, latest),
+            kwargs={'incremental': False},
+            queue='transformations.backfill')
+
+    @patch('backdrop.transformers.dispatch.config.TRANSFORMER_DEDUPE_TTL', 60)
+    @patch('backdrop.transformers.dispatch.get_storage')
+    @patch('backdrop.transformers.dispatch.get_admin_api')
+    @patch('backdrop.transformers.dispatch.app')
+    def test_entrypoint_skips_transforms_already_queued(
+            self, mock_app, mock_adminAPI, mock_get_storage):
+        adminAPI_instance = mock_adminAPI.return_value
+        adminAPI_instance.get_data_set_transforms.return_value = [
+            {'id': 'queued'}, {'id': 'not-queued'}
+        ]
+        adminAPI_instance.get_data_set_by_name.return_value = {'name': 'foo'}
+        storage = mock_get_storage.return_value
+        storage.claim_task.side_effect = lambda key, ttl: 'not-queued' in key
+
+        earliest = datetime(2014, 12, 10, 12, 00, 00, tzinfo=pytz.utc)
+        latest = datetime(2014, 12, 14, 12, 00, 00, tzinfo=pytz.utc)
+        entrypoint('dataset123', earliest, latest)
+
+        assert_that(storage.claim_task.call_count, is_(2))
+        mock_app.send_task.assert_called_once_with(
+            'backdrop.transformers.dispatch.run_transform',
+            args=({'name': 'foo'}, {'id': 'not-queued'}, earliest, latest),
+            kwargs={
+                'incremental': True,
+                'task_key': 'run_transform:foo:not-queued:'
+                            '2014-12-10T12:00:00+00:00:'
+                            '2014-12-14T12:00:00+00:00:incremental',
+            },
+            queue='celery')
+
+    @patch('backdrop.transformers.dispatch.config.TRANSFORMER_DEDUPE_TTL', 60)
+    @patch('backdrop.transformers.dispatch.get_storage')
+    @patch('backdrop.transformers.dispatch.get_admin_api')
+    @patch('backdrop.transformers.dispatch.app')
+    def test_entrypoint_snaps_windows_to_periods(
+            self, mock_app, mock_adminAPI, mock_get_storage):
+        transform = {'id': 'abc', 'query-parameters': {'period': 'week'}}
+        adminAPI_instance = mock_adminAPI.return_value
+        adminAPI_instance.get_data_set_transforms.return_value = [transform]
+        adminAPI_instance.get_data_set_by_name.return_value = {'name': 'foo'}
+        storage = mock_get_storage.return_value
+        claimed = set()
+        storage.claim_task.side_effect = \
+            lambda key, ttl: key not in claimed and not claimed.add(key)
+
+        entrypoint('foo', datetime(2014, 12, 9, 10, tzinfo=pytz.utc),
+                   datetime(2014, 12, 10, 10, tzinfo=pytz.utc))
+        entrypoint('foo', datetime(2014, 12, 11, 15, tzinfo=pytz.utc),
+                   datetime(2014, 12, 11, 15, tzinfo=pytz.utc))
+
+        mock_app.send_task.assert_called_once_with(
+            'backdrop.transformers.dispatch.run_transform',
+            args=({'name': 'foo'}, transform,
+                  datetime(2014, 12, 8, tzinfo=pytz.utc),
+                  datetime(2014, 12, 15, tzinfo=pytz.utc)),
+            kwargs={
+                'incremental': True,
+                'task_key': 'run_transform:foo:abc:'
+                            '2014-12-08T00:00:00+00:00:'
+                            '2014-12-15T00:00:00+00:00:incremental',
+            },
+            queue='celery')
+
+    @patch('backdrop.transformers.dispatch.get_storage')
+    @patch('backdrop.transformers.dispatch.transform_window')
+    def test_run_transform_releases_its_task_key(
+            self, mock_transform_window, mock_get_storage):
+        mock_transform_window.return_value = None
+
+        run_transform({'name': 'foo'}, {'id': 'abc'},
+                      datetime(2014, 12, 10, tzinfo=pytz.utc),
+                      datetime(2014, 12, 14, tzinfo=pytz.utc),
+                      task_key='key')
+
+        mock_get_storage.return_value.release_task.assert_called_once_with(
+            'key')
+
+    @patch('backdrop.transformers.dispatch.get_admin_api')
     @patch('backdrop.transformers.dispatch.DataSet')
     @patch('backdrop.transformers.tasks.debug.logging')
     def test_run_transform(
@@ -96,8 +197,9 @@ class DispatchTestCase(unittest.TestCase):
             query_parameters={
                 'period': 'day',
                 'flatten': 'true',
-                'start_at': '2014-12-10T12:00:00+00:00',
-                'end_at': '2014-12-14T12:00:00+00:00',
+                'read_from_primary': 'true',
+                'start_at': '2014-12-10T00:00:00+00:00',
+                'end_at': '2014-12-15T00:00:00+00:00',
             },
         )
         mock_data_set.from_group_and_type.assert_any_call(
@@ -105,7 +207,7 @@ class DispatchTestCase(unittest.TestCase):
         )
         data_set_instance.post.assert_called_with([{'new-data': 'point'}])
 
-    @patch('backdrop.transformers.dispatch.AdminAPI')
+    @patch('backdrop.transformers.dispatch.get_admin_api')
     @patch('backdrop.transformers.dispatch.DataSet')
     @patch('backdrop.transformers.tasks.debug.logging')
     def test_run_transform_no_output_group(
@@ -150,7 +252,7 @@ class DispatchTestCase(unittest.TestCase):
             'http://backdrop/data', 'group', 'other-type', token='foo2',
         )
 
-    @patch('backdrop.transformers.dispatch.AdminAPI')
+    @patch('backdrop.transformers.dispatch.get_admin_api')
     @patch('backdrop.transformers.dispatch.DataSet')
     def test_get_or_get_and_create_dataset_when_data_set_exists(
             self,
@@ -191,7 +293,7 @@ class DispatchTestCase(unittest.TestCase):
             'http://backdrop/data', 'floop', 'wibble', token='foo2',
         )
 
-    @patch('backdrop.transformers.dispatch.AdminAPI')
+    @patch('backdrop.transformers.dispatch.get_admin_api')
     @patch('backdrop.transformers.dispatch.DataSet')
     def test_get_and_get_or_create_dataset_when_get_finds_nothing(
             self,
@@ -255,6 +357,67 @@ class DispatchTestCase(unittest.TestCase):
         )
 
 
+@patch('backdrop.transformers.dispatch.get_admin_api')
+@patch('backdrop.transformers.dispatch.DataSet')
+@patch('backdrop.transformers.tasks.debug.logging')
+class ComputedWindowsTestCase(unittest.TestCase):
+
+    data_set_config = {'name': 'group_type', 'data_group': 'group',
+                       'data_type': 'type'}
+    transform = {
+        'type': {'function': 'backdrop.transformers.tasks.debug.logging'},
+        'query-parameters': {'period': 'week'},
+        'options': {},
+        'output': {'data-type': 'other-type'},
+    }
+
+    def setUp(self):
+        patcher = patch('backdrop.transformers.dispatch.computed_windows',
+                        ComputedWindows(60))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_transform(self, day, **kwargs):
+        run_transform(self.data_set_config, self.transform,
+                      datetime(2014, 12, day, tzinfo=pytz.utc),
+                      datetime(2014, 12, day, tzinfo=pytz.utc), **kwargs)
+
+    def test_window_is_not_recomputed_from_the_same_input(
+            self, mock_logging_task, mock_data_set, mock_adminAPI):
+        mock_logging_task.return_value = [{'new-data': 'point'}]
+        data_set_instance = mock_data_set.from_group_and_type.return_value
+        data_set_instance.get.return_value = {'data': [{'count': 1}]}
+
+        self.run_transform(9)
+        self.run_transform(11)
+
+        assert_that(mock_logging_task.call_count, is_(1))
+        assert_that(data_set_instance.post.call_count, is_(1))
+
+    def test_window_is_recomputed_when_input_changes(
+            self, mock_logging_task, mock_data_set, mock_adminAPI):
+        mock_logging_task.return_value = [{'new-data': 'point'}]
+        data_set_instance = mock_data_set.from_group_and_type.return_value
+        data_set_instance.get.return_value = {'data': [{'count': 1}]}
+
+        self.run_transform(9)
+        data_set_instance.get.return_value = {'data': [{'count': 2}]}
+        self.run_transform(11)
+
+        assert_that(data_set_instance.post.call_count, is_(2))
+
+    def test_full_recomputes_are_not_skipped(
+            self, mock_logging_task, mock_data_set, mock_adminAPI):
+        mock_logging_task.return_value = [{'new-data': 'point'}]
+        data_set_instance = mock_data_set.from_group_and_type.return_value
+        data_set_instance.get.return_value = {'data': [{'count': 1}]}
+
+        self.run_transform(9)
+        self.run_transform(11, incremental=False)
+
+        assert_that(data_set_instance.post.call_count, is_(2))
+
+
 class GetQueryParametersTestCase(unittest.TestCase):
 
     def test_same_timestamps_period(self):
@@ -289,3 +452,72 @@ class GetQueryParametersTestCase(unittest.TestCase):
             'end_at': '2014-12-14T12:00:00+00:00',
             'inclusive': 'true',
         }))
+
+
+@patch('backdrop.transformers.dispatch.run_transform')
+@patch('backdrop.transformers.dispatch.app')
+@patch('backdrop.transformers.dispatch.get_admin_api')
+@patch('backdrop.transformers.dispatch.get_storage')
+class RunBackfillChunkTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.earliest = datetime(2014, 1, 1, tzinfo=pytz.utc)
+        self.latest = datetime(2014, 2, 1, tzinfo=pytz.utc)
+        self.job = {
+            'data_set': 'group_type',
+            'chunks': [[self.earliest, self.latest]] * 6,
+            'total': 6,
+        }
+
+    def test_runs_transforms_and_dispatches_next_chunk(
+            self, mock_get_storage, mock_adminAPI, mock_app,
+            mock_run_transform):
+        storage = mock_get_storage.return_value
+        storage.get_job.return_value = self.job
+        storage.update_job.return_value = dict(self.job, next_chunk=5)
+        adminAPI_instance = mock_adminAPI.return_value
+        adminAPI_instance.get_data_set_by_name.return_value = {
+            'name': 'group_type'}
+        adminAPI_instance.get_data_set_transforms.return_value = [
+            {'type': 1}, {'type': 2}]
+
+        run_backfill_chunk('job123', 0)
+
+        assert_that(mock_run_transform.call_count, is_(2))
+        mock_run_transform.assert_any_call(
+            {'name': 'group_type'}, {'type': 1},
+            self.earliest, self.latest, incremental=False)
+        storage.update_job.assert_any_call(
+            'job123', increment={'completed': 1})
+        mock_app.send_task.assert_called_once_with(
+            'backdrop.transformers.dispatch.run_backfill_chunk',
+            args=('job123', 4),
+            queue='transformations.backfill')
+
+    def test_records_failures(
+            self, mock_get_storage, mock_adminAPI, mock_app,
+            mock_run_transform):
+        storage = mock_get_storage.return_value
+        storage.get_job.return_value = self.job
+        storage.update_job.return_value = dict(self.job, next_chunk=7)
+        mock_adminAPI.return_value.get_data_set_transforms.return_value = [
+            {'type': 1}]
+        mock_run_transform.side_effect = ValueError('oops')
+
+        run_backfill_chunk('job123', 5)
+
+        storage.update_job.assert_any_call(
+            'job123',
+            increment={'failed': 1},
+            append={'errors': {'chunk': 5, 'message': "ValueError('oops',)"}})
+        assert_that(mock_app.send_task.called, is_(False))
+
+    def test_expired_jobs_are_not_run(
+            self, mock_get_storage, mock_adminAPI, mock_app,
+            mock_run_transform):
+        mock_get_storage.return_value.get_job.return_value = None
+
+        run_backfill_chunk('job123', 0)
+
+        assert_that(mock_run_transform.called, is_(False))
+        assert_that(mock_app.send_task.called, is_(False))
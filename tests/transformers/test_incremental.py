@@ -0,0 +1,167 @@
+import pytz
+import unittest
+
+from datetime import datetime
+from hamcrest import assert_that, is_
+from mock import Mock, patch
+
+from backdrop.transformers.dispatch import run_transform
+from backdrop.transformers.incremental import (changed_periods,
+                                               ComputedWindows, snap_window)
+
+
+def d(day, month=12):
+    return datetime(2014, month, day, tzinfo=pytz.utc)
+
+
+data_set_config = {
+    'name': 'group_type',
+    'data_group': 'group',
+    'data_type': 'type',
+}
+
+transform = {
+    'id': 'transform-id',
+    'type': {
+        'function': 'backdrop.transformers.tasks.debug.logging',
+    },
+    'query-parameters': {
+        'period': 'week',
+    },
+    'options': {},
+    'output': {
+        'data-type': 'other-type',
+    },
+}
+
+
+class ChangedPeriodsTestCase(unittest.TestCase):
+
+    def test_periods_without_watermarks_have_changed(self):
+        storage = Mock()
+        storage.get_transform_watermarks.return_value = {}
+
+        changed = changed_periods(
+            storage, transform, data_set_config, {d(1): d(20)})
+
+        assert_that(changed, is_({d(1): d(20)}))
+        storage.get_transform_watermarks.assert_called_once_with(
+            'transform-id', 'group_type')
+
+    def test_periods_updated_since_watermark_have_changed(self):
+        storage = Mock()
+        storage.get_transform_watermarks.return_value = {
+            d(1): d(20),
+            d(8): d(20),
+        }
+
+        changed = changed_periods(
+            storage, transform, data_set_config, {d(1): d(20), d(8): d(21)})
+
+        assert_that(changed, is_({d(8): d(21)}))
+
+
+class SnapWindowTestCase(unittest.TestCase):
+
+    def test_windows_in_the_same_periods_snap_to_the_same_window(self):
+        first = snap_window(transform, datetime(2014, 12, 2, 9, 30),
+                            datetime(2014, 12, 10, 17))
+        second = snap_window(transform, datetime(2014, 12, 1, 0, 5),
+                             datetime(2014, 12, 14, 23, 59))
+
+        assert_that(first, is_((datetime(2014, 12, 1),
+                                datetime(2014, 12, 15))))
+        assert_that(second, is_(first))
+
+    def test_timezone_is_kept(self):
+        window = snap_window(
+            {'query-parameters': {'period': 'month'}},
+            datetime(2014, 11, 3, 12, tzinfo=pytz.utc),
+            datetime(2014, 11, 20, tzinfo=pytz.utc))
+
+        assert_that(window, is_((d(1, month=11), d(1, month=12))))
+
+
+class ComputedWindowsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000
+        self.windows = ComputedWindows(60, clock=lambda: self.now)
+
+    def test_versions_expire(self):
+        self.windows.record('window', 'v1')
+        self.now += 61
+
+        assert_that(self.windows.is_current('window', 'v1'), is_(False))
+
+    def test_zero_ttl_remembers_nothing(self):
+        windows = ComputedWindows(0)
+        windows.record('window', 'v1')
+
+        assert_that(windows.is_current('window', 'v1'), is_(False))
+
+    def test_expired_versions_are_dropped_when_full(self):
+        for index in range(ComputedWindows.MAX_SIZE):
+            self.windows.record(index, 'v1')
+        self.now += 61
+        self.windows.record('window', 'v1')
+
+        assert_that(len(self.windows._versions), is_(1))
+
+
+@patch('backdrop.transformers.dispatch.config.TRANSFORMER_DIRECT_STORAGE',
+       True)
+@patch('backdrop.transformers.dispatch.transform_window')
+@patch('backdrop.transformers.dispatch.get_storage')
+class IncrementalRunTransformTestCase(unittest.TestCase):
+
+    def test_only_changed_periods_are_transformed(
+            self, mock_get_storage, mock_transform_window):
+        mock_transform_window.return_value = None
+        storage = mock_get_storage.return_value
+        storage.get_period_last_updated.return_value = {
+            d(1): d(20),
+            d(8): d(20),
+            d(15): d(21),
+        }
+        storage.get_transform_watermarks.return_value = {
+            d(1): d(19),
+            d(8): d(20),
+        }
+
+        run_transform(data_set_config, transform, d(1), d(22))
+
+        assert_that(mock_transform_window.call_count, is_(2))
+        mock_transform_window.assert_any_call(
+            data_set_config, transform, d(1), d(8), True, incremental=True)
+        mock_transform_window.assert_any_call(
+            data_set_config, transform, d(15), d(22), True, incremental=True)
+        storage.set_transform_watermarks.assert_called_once_with(
+            'transform-id', 'group_type', {d(1): d(20), d(15): d(21)})
+
+    def test_nothing_is_transformed_without_changes(
+            self, mock_get_storage, mock_transform_window):
+        mock_transform_window.return_value = None
+        storage = mock_get_storage.return_value
+        storage.get_period_last_updated.return_value = {d(1): d(20)}
+        storage.get_transform_watermarks.return_value = {d(1): d(20)}
+
+        run_transform(data_set_config, transform, d(1), d(8))
+
+        assert_that(mock_transform_window.called, is_(False))
+        assert_that(storage.set_transform_watermarks.called, is_(False))
+
+    def test_non_incremental_runs_transform_whole_window(
+            self, mock_get_storage, mock_transform_window):
+        mock_transform_window.return_value = None
+        storage = mock_get_storage.return_value
+        storage.get_period_last_updated.return_value = {d(1): d(20)}
+        storage.get_transform_watermarks.return_value = {d(1): d(20)}
+
+        run_transform(data_set_config, transform, d(1), d(8),
+                      incremental=False)
+
+        mock_transform_window.assert_called_once_with(
+            data_set_config, transform, d(1), d(8), True, incremental=False)
+        storage.set_transform_watermarks.assert_called_once_with(
+            'transform-id', 'group_type', {d(1): d(20)})
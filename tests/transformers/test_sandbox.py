@@ -0,0 +1,129 @@
+import os
+import time
+import unittest
+
+from billiard.exceptions import TimeLimitExceeded
+from hamcrest import assert_that, is_, greater_than
+from mock import Mock, patch
+from nose.tools import assert_raises
+
+from backdrop.transformers.sandbox import (Sandbox, CPUTimeLimitExceeded,
+                                           call_transform_function)
+
+
+def double(value):
+    return value * 2
+
+
+def get_pid():
+    return os.getpid()
+
+
+def sleep():
+    time.sleep(30)
+
+
+def spin():
+    while True:
+        pass
+
+
+def allocate():
+    return len('x' * (2048 * 1024 * 1024))
+
+
+def allocate_some():
+    return len('x' * (256 * 1024 * 1024))
+
+
+class SandboxTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.sandbox = Sandbox(max_tasks=2, cpu_seconds=1, memory_mb=1024,
+                               timeout=5)
+
+    def tearDown(self):
+        self.sandbox.terminate()
+
+    def test_run_returns_result_runtime_and_peak_memory(self):
+        result, runtime, peak_memory = self.sandbox.run(double, 2)
+
+        assert_that(result, is_(4))
+        assert_that(runtime < 1, is_(True))
+        assert_that(peak_memory, greater_than(0))
+
+    def test_peak_memory_is_measured_per_call(self):
+        heavy_peak = self.sandbox.run(allocate_some)[2]
+        light_peak = self.sandbox.run(double, 2)[2]
+
+        assert_that(heavy_peak, greater_than(256 * 1024 * 1024))
+        assert_that(light_peak < 128 * 1024 * 1024, is_(True))
+
+    def test_calls_run_in_another_process(self):
+        pid, _, _ = self.sandbox.run(get_pid)
+
+        assert_that(pid == os.getpid(), is_(False))
+
+    def test_processes_are_replaced_after_max_tasks(self):
+        pids = [self.sandbox.run(get_pid)[0] for _ in range(3)]
+
+        assert_that(pids[0], is_(pids[1]))
+        assert_that(pids[2] == pids[0], is_(False))
+
+    def test_calls_are_stopped_after_timeout(self):
+        assert_raises(TimeLimitExceeded, self.sandbox.run, sleep)
+        assert_that(self.sandbox.run(double, 2)[0], is_(4))
+
+    def test_calls_are_stopped_after_cpu_time_limit(self):
+        assert_raises(CPUTimeLimitExceeded, self.sandbox.run, spin)
+        assert_that(self.sandbox.run(double, 2)[0], is_(4))
+
+    def test_calls_are_limited_in_memory(self):
+        assert_raises(MemoryError, self.sandbox.run, allocate)
+
+
+@patch('backdrop.transformers.sandbox.statsd')
+class CallTransformFunctionTestCase(unittest.TestCase):
+
+    transform = {
+        'type': {'function': 'backdrop.transformers.tasks.rate.compute'},
+    }
+
+    def test_runtime_is_recorded(self, mock_statsd):
+        function = Mock(return_value=[{'rate': 0.5}])
+
+        result = call_transform_function(
+            function, [], self.transform, {'name': 'foo'})
+
+        assert_that(result, is_([{'rate': 0.5}]))
+        function.assert_called_once_with([], self.transform, {'name': 'foo'})
+        assert_that(mock_statsd.timing.call_args[0][0],
+                    is_('transformers.backdrop.transformers.tasks.rate.'
+                        'compute.runtime'))
+
+    @patch('backdrop.transformers.sandbox.config.TRANSFORMER_SANDBOX', True)
+    @patch('backdrop.transformers.sandbox.get_sandbox')
+    def test_sandbox_is_used_when_enabled(self, mock_get_sandbox,
+                                          mock_statsd):
+        mock_get_sandbox.return_value.run.return_value = ([], 0.5, 1024)
+
+        call_transform_function(double, [], self.transform, {'name': 'foo'})
+
+        mock_get_sandbox.return_value.run.assert_called_once_with(
+            double, [], self.transform, {'name': 'foo'})
+        mock_statsd.gauge.assert_called_once_with(
+            'transformers.backdrop.transformers.tasks.rate.compute.'
+            'peak_memory', 1024, data_set='foo')
+        mock_statsd.timing.assert_called_once_with(
+            'transformers.backdrop.transformers.tasks.rate.compute.runtime',
+            500, data_set='foo')
+
+    @patch('backdrop.transformers.sandbox.config.TRANSFORMER_SANDBOX', True)
+    @patch('backdrop.transformers.sandbox.get_sandbox')
+    def test_unmeasured_peak_memory_is_not_recorded(self, mock_get_sandbox,
+                                                    mock_statsd):
+        mock_get_sandbox.return_value.run.return_value = ([], 0.5, None)
+
+        call_transform_function(double, [], self.transform, {'name': 'foo'})
+
+        assert_that(mock_statsd.gauge.called, is_(False))
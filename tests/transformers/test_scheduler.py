@@ -0,0 +1,246 @@
+import pytz
+import unittest
+
+from datetime import datetime
+from hamcrest import assert_that, is_
+from mock import Mock, patch
+
+from backdrop.transformers.dispatch import (entrypoint, finish_scheduled_step,
+                                            run_scheduled_step)
+from backdrop.transformers.scheduler import build_transform_graph
+
+
+def data_set(name):
+    return {'name': name, 'data_group': 'group', 'data_type': name}
+
+
+def transform(output_type):
+    return {'id': output_type, 'output': {'data-type': output_type}}
+
+
+class FakeAdminAPI(object):
+    """Stagecraft stand-in with data sets named after their data type"""
+
+    def __init__(self, transforms):
+        self.transforms = transforms
+
+    def get_data_set(self, data_group, data_type):
+        if data_type in self.transforms:
+            return data_set(data_type)
+
+    def get_data_set_by_name(self, name):
+        return data_set(name)
+
+    def get_data_set_transforms(self, name):
+        return [transform(output) for output in self.transforms[name]]
+
+
+class BuildTransformGraphTestCase(unittest.TestCase):
+
+    def build(self, transforms):
+        admin_api = FakeAdminAPI(transforms)
+        return build_transform_graph(
+            admin_api, data_set('raw'),
+            admin_api.get_data_set_transforms('raw'))
+
+    def test_chain(self):
+        steps = self.build({
+            'raw': ['mapped'],
+            'mapped': ['rate'],
+            'rate': ['latest'],
+        })
+
+        assert_that([step['data_set']['name'] for step in steps],
+                    is_(['raw', 'mapped', 'rate']))
+        assert_that([step['children'] for step in steps],
+                    is_([[1], [2], []]))
+        assert_that([step['pending'] for step in steps], is_([0, 1, 1]))
+
+    def test_independent_branches_start_together(self):
+        steps = self.build({
+            'raw': ['rate', 'satisfaction'],
+            'rate': ['latest'],
+            'satisfaction': [],
+        })
+
+        assert_that([step['pending'] for step in steps], is_([0, 0, 1]))
+        assert_that(steps[2]['parents'], is_([0]))
+
+    def test_step_waits_for_every_input(self):
+        steps = self.build({
+            'raw': ['left', 'right'],
+            'left': ['joined'],
+            'right': ['joined'],
+            'joined': ['final'],
+        })
+
+        assert_that([step['data_set']['name'] for step in steps],
+                    is_(['raw', 'raw', 'left', 'right', 'joined']))
+        assert_that(steps[4]['parents'], is_([2, 3]))
+        assert_that(steps[4]['pending'], is_(2))
+
+    def test_cycles_are_broken(self):
+        steps = self.build({
+            'raw': ['other'],
+            'other': ['raw'],
+        })
+
+        assert_that(len(steps), is_(2))
+        assert_that(steps[0]['pending'], is_(0))
+        assert_that(steps[1]['children'], is_([]))
+
+
+def step(children=[], parents=[], pending=0, status='waiting',
+         output_window=None):
+    return {
+        'data_set': data_set('raw'),
+        'transform': transform('rate'),
+        'children': children,
+        'parents': parents,
+        'pending': pending,
+        'status': status,
+        'output_window': output_window,
+    }
+
+
+@patch('backdrop.transformers.dispatch.app')
+class FinishScheduledStepTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.earliest = datetime(2014, 12, 1, tzinfo=pytz.utc)
+        self.latest = datetime(2014, 12, 8, tzinfo=pytz.utc)
+        self.storage = Mock()
+
+    def test_starts_child_once_all_parents_are_done(self, mock_app):
+        job = {'incremental': True, 'steps': [
+            step(children=[1], status='done',
+                 output_window=[self.earliest, self.latest]),
+            step(parents=[0], pending=0),
+        ]}
+        self.storage.update_job.return_value = job
+
+        finish_scheduled_step(self.storage, 'job123', 0, 'done',
+                              (self.earliest, self.latest))
+
+        self.storage.update_job.assert_any_call(
+            'job123', increment={'steps.1.pending': -1})
+        mock_app.send_task.assert_called_once_with(
+            'backdrop.transformers.dispatch.run_scheduled_step',
+            args=('job123', 1, self.earliest, self.latest),
+            kwargs={'task_key': None},
+            queue='celery')
+
+    def test_waits_for_other_parents(self, mock_app):
+        job = {'incremental': True, 'steps': [
+            step(children=[2], status='done',
+                 output_window=[self.earliest, self.latest]),
+            step(children=[2]),
+            step(parents=[0, 1], pending=1),
+        ]}
+        self.storage.update_job.return_value = job
+
+        finish_scheduled_step(self.storage, 'job123', 0, 'done',
+                              (self.earliest, self.latest))
+
+        assert_that(mock_app.send_task.called, is_(False))
+
+    def test_skips_children_of_failed_steps(self, mock_app):
+        job = {'incremental': True, 'steps': [
+            step(children=[1], status='failed'),
+            step(parents=[0], children=[2]),
+            step(parents=[1]),
+        ]}
+        self.storage.update_job.return_value = job
+
+        finish_scheduled_step(self.storage, 'job123', 0, 'failed', None)
+
+        assert_that(mock_app.send_task.called, is_(False))
+        self.storage.update_job.assert_any_call('job123', **{
+            'steps.2.status': 'skipped',
+            'steps.2.output_window': None,
+        })
+
+
+class ScheduledEntrypointTestCase(unittest.TestCase):
+
+    @patch('backdrop.transformers.dispatch.config.TRANSFORMER_DIRECT_STORAGE',
+           True)
+    @patch('backdrop.transformers.dispatch.get_storage')
+    @patch('backdrop.transformers.dispatch.app')
+    @patch('backdrop.transformers.dispatch.get_admin_api')
+    def test_entrypoint_starts_independent_steps(
+            self, mock_adminAPI, mock_app, mock_get_storage):
+        fake_admin_api = FakeAdminAPI({
+            'raw': ['rate', 'satisfaction'],
+            'rate': ['latest'],
+        })
+        mock_adminAPI.return_value = fake_admin_api
+
+        earliest = datetime(2014, 12, 1, tzinfo=pytz.utc)
+        latest = datetime(2014, 12, 8, tzinfo=pytz.utc)
+        job_id = entrypoint('raw', earliest, latest)
+
+        assert_that(mock_get_storage.return_value.create_job.called,
+                    is_(True))
+        assert_that(mock_app.send_task.call_count, is_(2))
+        mock_app.send_task.assert_any_call(
+            'backdrop.transformers.dispatch.run_scheduled_step',
+            args=(job_id, 0, earliest, latest),
+            kwargs={'task_key': None},
+            queue='celery')
+        mock_app.send_task.assert_any_call(
+            'backdrop.transformers.dispatch.run_scheduled_step',
+            args=(job_id, 1, earliest, latest),
+            kwargs={'task_key': None},
+            queue='celery')
+
+    @patch('backdrop.transformers.dispatch.config.TRANSFORMER_DIRECT_STORAGE',
+           True)
+    @patch('backdrop.transformers.dispatch.get_storage')
+    @patch('backdrop.transformers.dispatch.app')
+    @patch('backdrop.transformers.dispatch.get_admin_api')
+    def test_entrypoint_without_transforms_creates_no_job(
+            self, mock_adminAPI, mock_app, mock_get_storage):
+        mock_adminAPI.return_value = FakeAdminAPI({'raw': []})
+
+        entrypoint('raw', datetime(2014, 12, 1, tzinfo=pytz.utc),
+                   datetime(2014, 12, 8, tzinfo=pytz.utc))
+
+        assert_that(mock_get_storage.return_value.create_job.called,
+                    is_(False))
+        assert_that(mock_app.send_task.called, is_(False))
+
+    @patch('backdrop.transformers.dispatch.config.TRANSFORMER_DEDUPE_TTL', 60)
+    @patch('backdrop.transformers.dispatch.config.TRANSFORMER_DIRECT_STORAGE',
+           True)
+    @patch('backdrop.transformers.dispatch.get_storage')
+    @patch('backdrop.transformers.dispatch.app')
+    @patch('backdrop.transformers.dispatch.get_admin_api')
+    def test_entrypoint_skips_steps_already_queued(
+            self, mock_adminAPI, mock_app, mock_get_storage):
+        mock_adminAPI.return_value = FakeAdminAPI({'raw': ['rate']})
+        storage = mock_get_storage.return_value
+        storage.claim_task.return_value = False
+
+        job_id = entrypoint('raw', datetime(2014, 12, 1, tzinfo=pytz.utc),
+                            datetime(2014, 12, 8, tzinfo=pytz.utc))
+
+        assert_that(mock_app.send_task.called, is_(False))
+        storage.update_job.assert_any_call(job_id, **{
+            'steps.0.status': 'skipped',
+            'steps.0.output_window': None,
+        })
+
+
+class RunScheduledStepTestCase(unittest.TestCase):
+
+    @patch('backdrop.transformers.dispatch.run_transform')
+    @patch('backdrop.transformers.dispatch.get_storage')
+    def test_expired_jobs_are_not_run(self, mock_get_storage,
+                                      mock_run_transform):
+        mock_get_storage.return_value.get_job.return_value = None
+
+        run_scheduled_step('job123', 0, datetime(2014, 12, 1, tzinfo=pytz.utc),
+                           datetime(2014, 12, 8, tzinfo=pytz.utc))
+
+        assert_that(mock_run_transform.called, is_(False))
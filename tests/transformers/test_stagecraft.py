@@ -0,0 +1,119 @@
+import unittest
+
+from hamcrest import assert_that, is_
+from mock import Mock, patch
+
+from backdrop.transformers.stagecraft import (TTLCache, CachedAdminAPI,
+                                              get_admin_api)
+
+
+class TTLCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000
+        self.cache = TTLCache(60, clock=lambda: self.now)
+
+    def test_values_are_cached(self):
+        fetch = Mock(return_value={'name': 'foo'})
+
+        self.cache.get('key', fetch)
+        value = self.cache.get('key', fetch)
+
+        assert_that(value, is_({'name': 'foo'}))
+        assert_that(fetch.call_count, is_(1))
+        assert_that(self.cache.hit_rate, is_(0.5))
+
+    def test_values_expire(self):
+        fetch = Mock(return_value={'name': 'foo'})
+
+        self.cache.get('key', fetch)
+        self.now += 61
+        self.cache.get('key', fetch)
+
+        assert_that(fetch.call_count, is_(2))
+        assert_that(self.cache.misses, is_(2))
+
+    def test_cached_values_are_copies(self):
+        self.cache.get('key', lambda: {'name': 'foo'})['name'] = 'bar'
+
+        assert_that(self.cache.get('key', Mock()), is_({'name': 'foo'}))
+
+    def test_zero_ttl_does_not_cache(self):
+        cache = TTLCache(0)
+        fetch = Mock(return_value='value')
+
+        cache.get('key', fetch)
+        cache.get('key', fetch)
+
+        assert_that(fetch.call_count, is_(2))
+
+    @patch('backdrop.transformers.stagecraft.statsd')
+    def test_hits_and_misses_are_counted(self, mock_statsd):
+        self.cache.get('key', lambda: 'value')
+        self.cache.get('key', lambda: 'value')
+
+        mock_statsd.incr.assert_any_call('transformers.stagecraft.cache.miss')
+        mock_statsd.incr.assert_any_call('transformers.stagecraft.cache.hit')
+
+
+class CachedAdminAPITestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.admin_api = CachedAdminAPI('http://stagecraft', 'token', 60)
+        self.admin_api._session = Mock()
+        self.admin_api._session.request.__name__ = 'request'
+        self.response = self.admin_api._session.request.return_value
+        self.response.status_code = 200
+
+    def test_requests_share_a_session(self):
+        self.response.json.return_value = [{'name': 'foo'}]
+
+        self.admin_api.get_data_set_transforms('foo')
+        self.admin_api.get_data_set_dashboard('foo')
+
+        assert_that(self.admin_api._session.request.call_count, is_(2))
+
+    def test_config_is_cached(self):
+        self.response.json.return_value = {'name': 'foo'}
+
+        self.admin_api.get_data_set_by_name('foo')
+        data_set = self.admin_api.get_data_set_by_name('foo')
+
+        assert_that(data_set, is_({'name': 'foo'}))
+        assert_that(self.admin_api._session.request.call_count, is_(1))
+
+    def test_creating_a_data_set_invalidates_lookup(self):
+        self.response.json.return_value = []
+        assert_that(self.admin_api.get_data_set('group', 'type'), is_(None))
+
+        self.response.json.return_value = {'name': 'group_type'}
+        self.admin_api.create_data_set(
+            {'data_group': 'group', 'data_type': 'type'})
+
+        self.response.json.return_value = [{'name': 'group_type'}]
+        assert_that(self.admin_api.get_data_set('group', 'type'),
+                    is_({'name': 'group_type'}))
+
+    def test_dry_run_sends_nothing(self):
+        admin_api = CachedAdminAPI('http://stagecraft', 'token', 60,
+                                   dry_run=True)
+        admin_api._session = Mock()
+
+        admin_api.create_data_set(
+            {'data_group': 'group', 'data_type': 'type'})
+
+        assert_that(admin_api._session.request.called, is_(False))
+
+
+class GetAdminAPITestCase(unittest.TestCase):
+
+    def test_client_is_shared_within_a_process(self):
+        assert_that(get_admin_api(), is_(get_admin_api()))
+
+    @patch('backdrop.transformers.stagecraft.os')
+    def test_client_is_not_shared_with_forked_processes(self, mock_os):
+        mock_os.getpid.return_value = 1
+        first = get_admin_api()
+        mock_os.getpid.return_value = 2
+
+        assert_that(get_admin_api() is first, is_(False))
@@ -3,14 +3,14 @@ import json
 import unittest
 import pytz
 
-from hamcrest import assert_that, is_
+from hamcrest import assert_that, is_, has_entries
 from mock import patch
 
 from backdrop.write import api
 from backdrop.write.api import bounding_dates, trigger_transforms, parse_bounding_dates
 
 from tests.support.performanceplatform_client import fake_data_set_exists, fake_no_data_sets_exist
-from tests.support.test_helpers import is_ok
+from tests.support.test_helpers import is_ok, is_bad_request, is_not_found
 
 
 class BoundingDatesTestCase(unittest.TestCase):
@@ -62,7 +62,9 @@ class TriggerTransformsTestCase(unittest.TestCase):
 
         mock_celery_app.send_task.assert_called_with(
             'backdrop.transformers.dispatch.entrypoint',
-            args=('dataset', earliest, latest))
+            args=('dataset', earliest, latest),
+            kwargs={'incremental': True},
+            queue=None)
 
     @patch('backdrop.write.api.celery_app')
     def test_trigger_transforms_no_data(self, mock_celery_app):
@@ -82,7 +84,27 @@ class TriggerTransformsTestCase(unittest.TestCase):
 
         mock_celery_app.send_task.assert_called_with(
             'backdrop.transformers.dispatch.entrypoint',
-            args=('dataset', earliest, latest))
+            args=('dataset', earliest, latest),
+            kwargs={'incremental': True},
+            queue=None)
+
+    @patch('backdrop.write.api.celery_app')
+    def test_trigger_transforms_not_incremental(self, mock_celery_app):
+        earliest = datetime.datetime(2014, 9, 3)
+        latest = datetime.datetime(2014, 9, 10)
+
+        trigger_transforms(
+            {'name': 'dataset'},
+            earliest=earliest,
+            latest=latest,
+            incremental=False
+        )
+
+        mock_celery_app.send_task.assert_called_with(
+            'backdrop.transformers.dispatch.entrypoint',
+            args=('dataset', earliest, latest),
+            kwargs={'incremental': False},
+            queue='transformations.backfill')
 
 
 class TriggerTransformsEndpointTestCase(unittest.TestCase):
@@ -128,4 +150,85 @@ class TriggerTransformsEndpointTestCase(unittest.TestCase):
                                                     'data_type': 'some-type',
                                                     'data_group': 'some-group'},
                                                    earliest=earliest,
-                                                   latest=latest)
+                                                   latest=latest,
+                                                   incremental=False)
+
+    @fake_data_set_exists("foo", data_group="some-group", data_type="some-type", bearer_token="foo-bearer-token")
+    @patch('backdrop.write.api.storage')
+    @patch('backdrop.write.api.celery_app')
+    def test_endpoint_starts_backfill(self, mock_celery_app, mock_storage):
+        data = json.dumps({
+            "_start_at": "2014-01-15T00:00:00Z",
+            "_end_at": "2014-07-01T00:00:00Z",
+            "backfill": True,
+        })
+
+        response = self.app.post(
+            '/data/some-group/some-type/transform',
+            data=data,
+            content_type='application/json',
+            headers=[('Authorization', 'Bearer foo-bearer-token')],
+        )
+
+        assert_that(response, is_ok())
+        assert_that(json.loads(response.data)['chunks'], is_(6))
+        job_id, job = mock_storage.create_job.call_args[0]
+        assert_that(job['total'], is_(6))
+        assert_that(job['next_chunk'], is_(4))
+        assert_that(mock_celery_app.send_task.call_count, is_(4))
+        mock_celery_app.send_task.assert_any_call(
+            'backdrop.transformers.dispatch.run_backfill_chunk',
+            args=(job_id, 0),
+            queue='transformations.backfill')
+
+    @fake_data_set_exists("foo", data_group="some-group", data_type="some-type", bearer_token="foo-bearer-token")
+    def test_endpoint_rejects_unknown_chunk_period(self):
+        data = json.dumps({
+            "_start_at": "2014-01-15T00:00:00Z",
+            "backfill": True,
+            "chunk_period": "fortnight",
+        })
+
+        response = self.app.post(
+            '/data/some-group/some-type/transform',
+            data=data,
+            content_type='application/json',
+            headers=[('Authorization', 'Bearer foo-bearer-token')],
+        )
+
+        assert_that(response, is_bad_request())
+
+    @fake_data_set_exists("foo", data_group="some-group", data_type="some-type", bearer_token="foo-bearer-token")
+    @patch('backdrop.write.api.storage')
+    def test_job_progress(self, mock_storage):
+        mock_storage.get_job.return_value = {
+            'data_set': 'foo',
+            'total': 6,
+            'completed': 4,
+            'failed': 1,
+            'errors': [{'chunk': 2, 'message': 'oops'}],
+        }
+
+        response = self.app.get(
+            '/data/some-group/some-type/transform/abc123',
+            headers=[('Authorization', 'Bearer foo-bearer-token')],
+        )
+
+        assert_that(response, is_ok())
+        assert_that(json.loads(response.data), has_entries({
+            'finished': False,
+            'completed': 4,
+            'failed': 1,
+        }))
+
+    @fake_data_set_exists("foo", data_group="some-group", data_type="some-type", bearer_token="foo-bearer-token")
+    @patch('backdrop.write.api.storage')
+    def test_job_progress_for_other_data_set(self, mock_storage):
+        mock_storage.get_job.return_value = {'data_set': 'bar'}
+
+        response = self.app.get(
+            '/data/some-group/some-type/transform/abc123',
+            headers=[('Authorization', 'Bearer foo-bearer-token')],
+        )
+
+        assert_that(response, is_not_found())